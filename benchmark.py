@@ -0,0 +1,351 @@
+# coding: UTF-8
+
+"""
+benchmark
+Benchmarks of stages of pyFileRenamer (walk, match, render, validate and
+rename) on synthetic folder trees generated in a temporary folder.
+Renaming is measured with full paths (rename) and, after renaming files
+back, relative to folder descriptors (renameDirFD; see DirRenamer).
+Peak and retained memory of the rename plan (match, render and validate
+with tracemalloc) is measured as 'planMemory', and memory of the same 
+paths as lists of full path strings as 'pathStrings', for comparison.
+Results are written to a JSON file, so that results of different
+versions on the same machine can be compared ('--compare').
+
+Usage:
+    python benchmark.py [-o benchmark.json] [--scale 0.01]
+                        [--shapes flat deep wide] [--compare OLD.json]
+
+Jinook Oh, Cognitive Biology department, University of Vienna
+September 2019.
+
+------------------------------------------------------------------------
+Copyright (C) 2019 Jinook Oh, W. Tecumseh Fitch
+- Contact: jinook.oh@univie.ac.at, tecumseh.fitch@univie.ac.at
+
+This program is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by the
+Free Software Foundation, either version 3 of the License, or (at your
+option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program.  If not, see <http://www.gnu.org/licenses/>.
+------------------------------------------------------------------------
+"""
+
+import sys
+import json
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+from os import path, makedirs
+from shutil import rmtree
+from time import perf_counter
+from datetime import datetime
+
+from fileRenEngine import walkFolders, getNameMatcher, planNewPaths
+from fileRenEngine import NewNameTemplate, findConflicts, orderRenames
+from fileRenEngine import RenameRunner, runRenaming, DIR_FD_RENAME
+from fileRenEngine import PathList
+
+DEBUG = False
+BENCH_VERSION = 1 # version of the result format
+SHAPES = dict(
+    flat = dict(nFiles=1000000, depth=0, fanOut=0),
+    deep = dict(nFiles=100000, depth=200, fanOut=1),
+    wide = dict(nFiles=100000, depth=2, fanOut=100),
+    ) # shapes of synthetic trees with the full scale
+TARGET_FN = "*.jpg"
+NEW_FN = "[folderN]_[incNum]"
+
+#-----------------------------------------------------------------------
+
+def makeTree(root, nFiles, depth=0, fanOut=0):
+    """ Make a synthetic folder tree with empty files.
+    Files are distributed evenly to folders; 'depth' levels of folders
+    with 'fanOut' sub-folders in each folder. Every fourth file doesn't
+    match with TARGET_FN.
+
+    Args:
+        root (str): Folder to make the tree in.
+        nFiles (int): Number of files.
+        depth (int, optional): Depth of folders under root.
+        fanOut (int, optional): Number of sub-folders of each folder.
+
+    Returns:
+        folders (list): Made folders.
+    """
+    if DEBUG: print("makeTree()")
+
+    folders = [root]
+    level = [root]
+    for d in range(depth):
+        nextLevel = []
+        for dp in level:
+            for k in range(fanOut):
+                sdp = path.join(dp, "d%i_%i"%(d, k))
+                makedirs(sdp)
+                nextLevel.append(sdp)
+        folders += nextLevel
+        level = nextLevel
+    nPerFolder = -(-nFiles // len(folders)) # ceiling
+    i = 0
+    for dp in folders:
+        for j in range(min(nPerFolder, nFiles-i)):
+            if i % 4 == 3: ext = "txt"
+            else: ext = "jpg"
+            open(path.join(dp, "IMG_%07i.%s"%(i, ext)), 'x').close()
+            i += 1
+    return folders
+
+#-----------------------------------------------------------------------
+
+def timeIt(func, *args):
+    """ Return result of a function and its elapsed time.
+
+    Args:
+        func (function): Function to call.
+        *args: Arguments of the function.
+
+    Returns:
+        ret: Returned value of the function.
+        elapsed (float): Elapsed time in seconds.
+    """
+    t = perf_counter()
+    ret = func(*args)
+    return ret, perf_counter() - t
+
+#-----------------------------------------------------------------------
+
+def measureMemory(func, *args):
+    """ Return result of a function with peak memory allocated while it
+    ran and memory still allocated (mostly by the result) after it, 
+    traced with tracemalloc.
+
+    Args:
+        func (function): Function to call.
+        *args: Arguments of the function.
+
+    Returns:
+        ret: Returned value of the function.
+        elapsed (float): Elapsed time in seconds (slower with tracing).
+        peak (int): Peak bytes.
+        retained (int): Bytes allocated after the call.
+    """
+    tracemalloc.start()
+    try:
+        ret, elapsed = timeIt(func, *args)
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return ret, elapsed, peak, retained
+
+#-----------------------------------------------------------------------
+
+def benchShape(root, shape, nFiles, depth, fanOut):
+    """ Run benchmarks of all stages on a tree of a shape.
+
+    Args:
+        root (str): Temporary folder for the tree, journal and log.
+        shape (str): Name of the shape.
+        nFiles (int): Number of files.
+        depth (int): Depth of folders.
+        fanOut (int): Number of sub-folders of each folder.
+
+    Returns:
+        results (list): Result (dict) of each stage.
+    """
+    if DEBUG: print("benchShape()")
+
+    treeDir = path.join(root, shape)
+    makedirs(treeDir)
+    folders, tMake = timeIt(makeTree, treeDir, nFiles, depth, fanOut)
+    print("%s: made %i files in %i folders (%.2f s)"%(shape, nFiles,
+                                                     len(folders), tMake),
+          flush=True)
+    results = []
+    def add(stage, elapsed, nItems, peak=None, retained=None):
+        if elapsed > 0: ips = nItems / elapsed
+        else: ips = None
+        r = dict(shape=shape, stage=stage, nItems=nItems,
+                 seconds=round(elapsed, 6),
+                 itemsPerSec=ips and round(ips, 1))
+        msg = "  %-11s %9i items %9.3f s"%(stage, nItems, elapsed)
+        if peak != None:
+            r.update(peakBytes=peak, retainedBytes=retained)
+            msg += " (peak %.1f MB, retained %.1f MB)"%(peak / 2**20, 
+                                                       retained / 2**20)
+        results.append(r)
+        print(msg, flush=True)
+
+    walked, elapsed = timeIt(lambda: list(walkFolders([treeDir], True)))
+    add("walk", elapsed, sum([len(fnL) for dp, fnL in walked]))
+
+    def match():
+        m = getNameMatcher(TARGET_FN)
+        fL = PathList()
+        for dp, fnL in walked: fL.addFolder(dp, [fn for fn in fnL if m(fn)])
+        return fL
+    fileList, elapsed = timeIt(match)
+    add("match", elapsed, len(fileList))
+
+    nFileList, elapsed = timeIt(planNewPaths, fileList,
+                                NewNameTemplate(NEW_FN))
+    add("render", elapsed, len(fileList))
+
+    def validate():
+        return findConflicts(fileList, nFileList), \
+               orderRenames(fileList, nFileList)
+    (conflicts, steps), elapsed = timeIt(validate)
+    add("validate", elapsed, len(fileList))
+
+    def plan(): # rename plan, as made for the preview and renaming
+        fL = match()
+        nFL = planNewPaths(fL, NewNameTemplate(NEW_FN))
+        findConflicts(fL, nFL)
+        orderRenames(fL, nFL)
+        return fL, nFL
+    ret, elapsed, peak, retained = measureMemory(plan)
+    add("planMemory", elapsed, len(ret[0]), peak, retained)
+    del ret
+    ret, elapsed, peak, retained = measureMemory(
+                                    lambda: (list(fileList), list(nFileList)))
+    add("pathStrings", elapsed, len(ret[0]), peak, retained)
+    del ret
+
+    runner = RenameRunner(fileList,
+                          nFileList,
+                          path.join(root, "log_%s.txt"%(shape)),
+                          path.join(root, "journal_%s.txt"%(shape)),
+                          dirFD=False)
+    ret, elapsed = timeIt(runner.run)
+    add("rename", elapsed, len(runner.renamed))
+
+    if DIR_FD_RENAME:
+        runRenaming(nFileList, # rename files back
+                    fileList,
+                    path.join(root, "log_%s.txt"%(shape)),
+                    path.join(root, "journal_%s.txt"%(shape)))
+        runner = RenameRunner(fileList,
+                              nFileList,
+                              path.join(root, "log_%s.txt"%(shape)),
+                              path.join(root, "journal_%s.txt"%(shape)),
+                              dirFD=True)
+        ret, elapsed = timeIt(runner.run)
+        add("renameDirFD", elapsed, len(runner.renamed))
+    rmtree(treeDir)
+    return results
+
+#-----------------------------------------------------------------------
+
+def getGitCommit():
+    """ Return the current git commit of the program, if available.
+
+    Args: None
+
+    Returns:
+        (str): Commit hash or None.
+    """
+    try:
+        ret = subprocess.run(["git", "rev-parse", "HEAD"],
+                             cwd=path.dirname(path.abspath(__file__)),
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.DEVNULL,
+                             universal_newlines=True)
+    except OSError:
+        return None
+    if ret.returncode != 0: return None
+    return ret.stdout.strip()
+
+#-----------------------------------------------------------------------
+
+def compareResults(old, new):
+    """ Print ratios of elapsed times of new results to old results.
+
+    Args:
+        old (dict): Old benchmark results.
+        new (dict): New benchmark results.
+
+    Returns: None
+    """
+    oldT = {}
+    for r in old["results"]:
+        oldT[(r["shape"], r["stage"], r["nItems"])] = r["seconds"]
+    print("Compared to %s (%s)"%(old["commit"], old["date"]))
+    oldM = {}
+    for r in old["results"]:
+        if "peakBytes" in r:
+            oldM[(r["shape"], r["stage"], r["nItems"])] = r["peakBytes"]
+    for r in new["results"]:
+        k = (r["shape"], r["stage"], r["nItems"])
+        if k in oldM and oldM[k] > 0 and "peakBytes" in r:
+            print("  %-6s %-11s %9.1f MB -> %9.1f MB (x%.2f)"%(
+                        r["shape"], r["stage"], oldM[k] / 2**20, 
+                        r["peakBytes"] / 2**20, r["peakBytes"] / oldM[k]))
+            continue
+        if not k in oldT or oldT[k] == 0: continue
+        print("  %-6s %-11s %9.3f s -> %9.3f s (x%.2f)"%(
+                    r["shape"], r["stage"], oldT[k], r["seconds"],
+                    r["seconds"] / oldT[k]))
+
+#-----------------------------------------------------------------------
+
+def main(argv=None):
+    """ Run benchmarks.
+
+    Args:
+        argv (list, optional): Command line arguments.
+
+    Returns:
+        (int): Exit code.
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks of "
+                                                 "pyFileRenamer stages.")
+    parser.add_argument("-o", "--output", default="benchmark.json",
+                        help="Result file (JSON).")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Scale of number of files (e.g. 0.01 for "
+                             "a quick run).")
+    parser.add_argument("--shapes", nargs="+", default=list(SHAPES.keys()),
+                        choices=list(SHAPES.keys()),
+                        help="Shapes of trees.")
+    parser.add_argument("--tmp", default=None,
+                        help="Folder to make temporary trees in.")
+    parser.add_argument("--compare", metavar="OLD_JSON",
+                        help="Compare with an old result file.")
+    args = parser.parse_args(argv)
+
+    root = tempfile.mkdtemp(prefix="pyFileRen_bench_", dir=args.tmp)
+    results = []
+    try:
+        for shape in args.shapes:
+            s = SHAPES[shape]
+            nFiles = max(1, int(s["nFiles"] * args.scale))
+            depth = s["depth"]
+            if shape == "deep": depth = max(1, int(depth * args.scale**0.5))
+            results += benchShape(root, shape, nFiles, depth, s["fanOut"])
+    finally:
+        rmtree(root)
+    out = dict(benchVersion=BENCH_VERSION,
+               commit=getGitCommit(),
+               date=datetime.now().isoformat(timespec='seconds'),
+               python=platform.python_version(),
+               platform=platform.platform(),
+               scale=args.scale,
+               results=results)
+    with open(args.output, 'w') as f: json.dump(out, f, indent=1)
+    print("Results were written to %s"%(args.output))
+    if args.compare != None:
+        with open(args.compare, 'r') as f: compareResults(json.load(f), out)
+    return 0
+
+#=======================================================================
+
+if __name__ == "__main__": sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,4070 @@
+# coding: UTF-8
+
+"""
+fileRenEngine
+GUI-free part of pyFileRenamer; scanning folders, planning new file
+names and executing renaming.
+This module must not import wx, so that it can be used on machines
+without a display (see 'pyFileRen.py --headless').
+
+Jinook Oh, Cognitive Biology department, University of Vienna
+September 2019.
+
+------------------------------------------------------------------------
+Copyright (C) 2019 Jinook Oh, W. Tecumseh Fitch
+- Contact: jinook.oh@univie.ac.at, tecumseh.fitch@univie.ac.at
+
+This program is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by the
+Free Software Foundation, either version 3 of the License, or (at your
+option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program.  If not, see <http://www.gnu.org/licenses/>.
+------------------------------------------------------------------------
+"""
+
+import re
+import sys
+import json
+import argparse
+from os import path, rename, scandir, stat, getpid, fsync, remove
+from os import lstat, readlink, symlink, read, close, fsencode, fsdecode
+from os import fstat, cpu_count, link, supports_dir_fd, O_RDONLY
+from os import open as openFD
+try: # not available on Windows
+    from os import O_DIRECTORY
+except ImportError:
+    O_DIRECTORY = 0
+try: # in-kernel copy; not available on all platforms
+    from os import copy_file_range
+except ImportError:
+    copy_file_range = None
+try:
+    from os import sendfile
+except ImportError:
+    sendfile = None
+try:
+    from os import chown
+except ImportError:
+    chown = None
+from stat import S_ISLNK
+from shutil import copystat
+from filecmp import cmp as compareFiles
+from hashlib import sha1, sha256
+from mmap import mmap, ACCESS_READ
+try: # not available on all platforms
+    from mmap import MADV_SEQUENTIAL
+except ImportError:
+    MADV_SEQUENTIAL = None
+from errno import EXDEV, ENOSYS, EINVAL, EOPNOTSUPP, ENOTSUP, EBADF
+from time import time, time_ns, strftime, localtime
+from fnmatch import translate
+from threading import Event, Thread, Lock, current_thread
+from select import select
+from struct import Struct, unpack_from, error as StructError
+from array import array
+from collections import Counter
+from operator import add
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from datetime import datetime
+
+from fileRenTrace import traceSpan, traceOps, traced, enableTrace
+
+DEBUG = False
+LOG_FILE = "log_pyFileRen.txt"
+JOURNAL_FILE = "journal_pyFileRen.txt"
+JOURNAL_BATCH = 256 # number of renaming between journal syncs
+JOURNAL_FLUSH_OPS = 64 # number of results between journal flushes
+JOURNAL_FLUSH_SEC = 0.1 # seconds between journal flushes
+LOG_HEADER = "Timestamp, Origianl file, Renamed file\n"
+LOG_HEADER += "----------------------------------------\n"
+SCAN_WORKERS = 4 # default number of threads for listing folders
+CANCEL_CHECK_INTERVAL = 4096 # number of files between cancel checks
+FF_SEP = ';' # separator of patterns of target file-name
+FF_RE_PREFIX = "re:" # prefix of a regular expression pattern
+TMP_PREFIX = ".pyFileRen_tmp_" # prefix of temporary file-names
+ROLLBACK_SUFFIX = "_rollback" # suffix of run ID of rolling back a run
+COPY_WORKERS = 4 # number of concurrent copies across file systems
+COPY_AHEAD = 8 # number of renaming to look ahead for copies
+COPY_CHUNK = 64 * 1024 * 1024 # bytes copied in kernel between cancel checks
+COPY_BUF = 1024 * 1024 # buffer size when copying isn't done in kernel
+DIR_FD_MAX = 64 # number of folder descriptors kept open for renaming
+DIR_FD_RENAME = rename in supports_dir_fd and O_DIRECTORY != 0 # renameat
+COPY_FALLBACK_ERRNO = set([EXDEV, ENOSYS, EINVAL, EOPNOTSUPP, ENOTSUP, EBADF])
+SCAN_INDEX_FILE = "scanIndex_pyFileRen.db"
+SCAN_INDEX_MAX_BYTES = 256 * 1024 * 1024 # maximum bytes of stored names
+SCAN_INDEX_MAX_AGE = 30 * 24 * 3600 # seconds to keep unused folders
+SCAN_INDEX_RACY_NS = 2 * 10**9 # folders modified more recently not stored
+SCAN_INDEX_BATCH = 1000 # number of listed folders between writes
+META_WORKERS = 8 # number of threads for reading metadata of files
+META_CHUNK = 256 # number of files in a task of reading metadata
+EXIF_HEAD = 4096 # bytes read first from a file to find EXIF
+EXIF_READ_MAX = 128 * 1024 # maximum bytes read from a file for EXIF
+HASH_CACHE_FILE = "hashCache_pyFileRen.db"
+HASH_WORKERS = cpu_count() or 4 # number of processes for hashing files
+HASH_TASK_BYTES = 64 * 1024 * 1024 # bytes of files in a task of hashing
+HASH_TASK_FILES = 256 # maximum number of files in a task of hashing
+HASH_MMAP_MIN = 1024 * 1024 # files from this size are hashed with mmap
+HASH_BUF = 1024 * 1024 # buffer size when a file isn't hashed with mmap
+HASH_CACHE_MAX_AGE = 30 * 24 * 3600 # seconds to keep unused hashes
+DEDUP_PART = 64 * 1024 # bytes of head and tail compared before full hash
+DEDUP_MODES = ['skip', 'link', 'report'] # handling of duplicate files
+SORT_MODES = ['existing', 'natural', 'mtime', 'size'] # orders of numbering
+RE_DIGITS = re.compile(r"(\d+)") # runs of digits for natural order
+WATCH_DELAY = 0.3 # seconds without changes before passing changes
+WATCH_MAX_DELAY = 2.0 # maximum seconds to hold changes 
+WATCH_INTERVAL = 1.0 # seconds between polling folders
+### inotify constants (linux/inotify.h)
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x1000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+IN_WATCH_MASK = IN_MOVED_FROM|IN_MOVED_TO|IN_CREATE|IN_DELETE| \
+                IN_DELETE_SELF|IN_MOVE_SELF|IN_ONLYDIR
+INOTIFY_EVENT = Struct("iIII") # wd, mask, cookie, len of inotify_event
+
+### new file format options
+NEW_FFO = [
+            'oFileN',
+            'folderN',
+            'incNum',
+            'incNumInFolder',
+            'ts',
+            'mtime',
+            'ctime',
+            'size',
+            'exifDate',
+            'hash8',
+            'hash',
+          ]
+META_TOKENS = set(['mtime', 'ctime', 'size', 'exifDate', 'hash8', 'hash'])
+TS_FORMAT = "%Y_%m_%d_%H_%M_%S" # format of timestamp options
+META_NA = "NA" # value of a metadata option, when it's not available
+### new file format options - description
+NEW_FFOD = dict(
+                oFileN = 'Original file-name',
+                folderN = 'Folder name',
+                incNum = 'Increasing Number (overall)',
+                incNumInFolder = 'Increasing Number (in each folder)',
+                ts = 'Timestamp',
+                mtime = 'Modification time of the file',
+                ctime = 'Creation time of the file (change time on Unix)',
+                size = 'File size in bytes',
+                exifDate = 'Date taken (EXIF), or modification time',
+                hash8 = 'First 8 characters of SHA-256 of the file content',
+                hash = 'SHA-256 of the file content',
+               )
+
+#=======================================================================
+
+class Cancelled(Exception):
+    """ Raised when an operation was cancelled with its cancel event.
+    """
+    pass
+
+#=======================================================================
+
+def writeFile(file_path, txt='', mode='a'):
+    """ Function to write a text or numpy file.
+
+    Args:
+        file_path (str): File path for output file.
+        txt (str): Text to print in the file.
+        mode (str, optional): File opening mode.
+
+    Returns:
+        None
+
+    Examples:
+        >>> writeFile('logFile.txt', 'A log is written.', 'a')
+    """
+    if DEBUG: print("writeFile()")
+
+    f = open(file_path, mode)
+    f.write(txt)
+    f.close()
+
+#-----------------------------------------------------------------------
+
+def get_time_stamp(flag_ms=False):
+    """ Function to return string which contains timestamp.
+
+    Args:
+        flag_ms (bool, optional): Whether to return microsecond or not
+
+    Returns:
+        ts (str): Timestamp string
+
+    Examples:
+        >>> print(get_time_stamp())
+        2019_09_10_16_21_56
+    """
+    if DEBUG: print("get_time_stamp()")
+
+    now = datetime.now()
+    ts = ('%.4i_%.2i_%.2i_%.2i_%.2i_%.2i')%(now.year,
+                                            now.month,
+                                            now.day,
+                                            now.hour,
+                                            now.minute,
+                                            now.second)
+    if flag_ms == True: ts += '_%.6i'%(now.microsecond)
+    return ts
+
+#-----------------------------------------------------------------------
+
+def initLogFile(logFile=LOG_FILE):
+    """ Write the header of the log file, if it doesn't exist yet.
+
+    Args:
+        logFile (str, optional): Log file path.
+
+    Returns:
+        None
+    """
+    if DEBUG: print("initLogFile()")
+
+    if not path.isfile(logFile): # log file doesn't exist
+        writeFile(logFile, LOG_HEADER) # write header
+
+#-----------------------------------------------------------------------
+
+def getLogIndexFile(logFile=LOG_FILE):
+    """ Return path of the index file of a log file.
+
+    Args:
+        logFile (str, optional): Log file path.
+
+    Returns:
+        (str): Index file path.
+
+    Examples:
+        >>> getLogIndexFile('log_pyFileRen.txt')
+        'log_pyFileRen.idx'
+    """
+    return path.splitext(logFile)[0] + ".idx"
+
+#=======================================================================
+
+class RenameLog(object):
+    """ Section of the log file, written by a run. 
+    Each line is 'timestamp, original file, renamed file', as before, 
+    following a line with the run ID. Byte offsets of each section are 
+    recorded in the index file (see getLogIndexFile), so that renaming
+    of a run can be read without reading the whole log file. 
+    Lines of the index file are 'run ID, start offset, end offset, 
+    number of files' separated with tabs; end offset is -1 when the 
+    section is started.
+    Lines are flushed once per batch; lines lost in a crash are written
+    when the run is rolled forward, from the journal (see recoverJournal).
+
+    Args:
+        runID (str): ID of the run.
+        logFile (str, optional): Log file path.
+    """
+    def __init__(self, runID, logFile=LOG_FILE):
+        if DEBUG: print("RenameLog.__init__()")
+
+        initLogFile(logFile)
+        self.runID = runID
+        self.indexFile = getLogIndexFile(logFile)
+        self.f = open(logFile, 'ab')
+        self.start = self.f.tell()
+        self.nFiles = 0
+        writeFile(self.indexFile, "%s\t%i\t-1\t0\n"%(runID, self.start))
+        self.f.write(("Run ID: %s\n\n"%(runID)).encode('utf-8', 
+                                                       'surrogateescape'))
+
+    #-------------------------------------------------------------------
+
+    def write(self, fp, newFP):
+        """ Write a renamed file.
+
+        Args:
+            fp (str): Original file path.
+            newFP (str): Renamed file path.
+
+        Returns: None
+        """
+        line = "%s, %s, %s\n\n"%(get_time_stamp(), fp, newFP)
+        # file-names which are not valid UTF-8 are decoded with 
+        #   surrogateescape (os.fsdecode); their bytes are written as they are
+        self.f.write(line.encode('utf-8', 'surrogateescape'))
+        self.nFiles += 1
+
+    #-------------------------------------------------------------------
+
+    def flush(self):
+        """ Flush written lines.
+
+        Args: None
+
+        Returns: None
+        """
+        self.f.flush()
+
+    #-------------------------------------------------------------------
+
+    def close(self):
+        """ Close the log file and record the section in the index file.
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("RenameLog.close()")
+
+        end = self.f.tell()
+        self.f.close()
+        writeFile(self.indexFile, "%s\t%i\t%i\t%i\n"%(self.runID, 
+                                                     self.start, 
+                                                     end, 
+                                                     self.nFiles))
+
+#=======================================================================
+
+def readLogIndex(logFile=LOG_FILE):
+    """ Read the index file of a log file.
+
+    Args:
+        logFile (str, optional): Log file path.
+
+    Returns:
+        runs (dict): Sections [start offset, end offset, number of files]
+          of each run ID, in order of runs. End offset of an unfinished 
+          section is the start offset of the next section (or None 
+          for the end of file).
+    """
+    if DEBUG: print("readLogIndex()")
+
+    runs = {}
+    sections = {} # section of each start offset
+    indexFile = getLogIndexFile(logFile)
+    if not path.isfile(indexFile): return runs
+    with open(indexFile, 'r', encoding='utf-8') as f:
+        for line in f:
+            items = line.rstrip("\n").split("\t")
+            if len(items) != 4: continue # incomplete line
+            runID = items[0]
+            start, end, nFiles = [int(x) for x in items[1:]]
+            if start in sections: # section finished
+                sections[start][1:] = [end, nFiles]
+            else:
+                sec = [start, end, nFiles]
+                sections[start] = sec
+                runs.setdefault(runID, []).append(sec)
+    starts = sorted(sections.keys())
+    for i, start in enumerate(starts):
+        sec = sections[start]
+        if sec[1] == -1: # unfinished (interrupted) section
+            if i+1 < len(starts): sec[1] = starts[i+1]
+            else: sec[1] = None
+    return runs
+
+#-----------------------------------------------------------------------
+
+def readRunLog(runID, logFile=LOG_FILE):
+    """ Read renamed files of a run from the log file, 
+    only reading sections of the run (see readLogIndex).
+
+    Args:
+        runID (str): ID of the run.
+        logFile (str, optional): Log file path.
+
+    Returns:
+        pairs (list): (original file path, renamed file path) in the 
+          order of renaming.
+
+    Raises:
+        KeyError: When there's no run with the ID.
+        ValueError: When a log line can't be parsed unambiguously.
+    """
+    if DEBUG: print("readRunLog()")
+
+    sections = readLogIndex(logFile)[runID]
+    pairs = []
+    with open(logFile, 'rb') as f:
+        for start, end, nFiles in sections:
+            f.seek(start)
+            if end == None: data = f.read()
+            else: data = f.read(end-start)
+            data = data.decode('utf-8', 'surrogateescape')
+            for line in data.split("\n"):
+                if line == "" or line.startswith("Run ID: "): continue
+                line = line.split(", ", 1)[1] # remove timestamp
+                cands = [] # possible splits of original and renamed paths
+                idx = line.find(", ")
+                while idx != -1:
+                    cands.append((line[:idx], line[idx+2:]))
+                    idx = line.find(", ", idx+1)
+                if len(cands) > 1: # there's ', ' in a path
+                    cands = [c for c in cands if path.lexists(c[1])]
+                if len(cands) != 1: 
+                    raise ValueError("Can't parse log line: %s"%(line))
+                pairs.append(cands[0])
+    return pairs
+
+#-----------------------------------------------------------------------
+
+def walkFolders(folders, inclSubFolders=False, nWorkers=1, index=None):
+    """ Go through the given folders (and their sub-folders) with 
+    os.scandir, yielding names of non-folder items in each folder. 
+    Sub-folders are visited iteratively in depth-first order (no 
+    recursion limit) and each folder is visited only once, so symbolic 
+    link loops don't cause infinite walking.
+
+    Args:
+        folders (list): Selected folders.
+        inclSubFolders (bool, optional): Whether to include sub-folders.
+        nWorkers (int, optional): Number of threads to list folders
+          concurrently. The order of yielded folders and names is the 
+          same regardless of this number.
+        index (ScanIndex, optional): Index to serve unchanged folders 
+          without listing them. 
+
+    Yields:
+        dp (str): Folder path.
+        fnL (list): Names of non-folder items in the folder.
+
+    Examples:
+        >>> for dp, fnL in walkFolders(['/tmp'], True): print(dp, fnL)
+    """
+    if DEBUG: print("walkFolders()")
+
+    if nWorkers > 1:
+        yield from walkFoldersParallel(folders, inclSubFolders, nWorkers, 
+                                       index)
+        return
+
+    visited = set() # (st_dev, st_ino) of visited folders
+    stack = [] # folders to visit; (folder path, stat or DirEntry)
+    for dp in reversed(folders): stack.append((dp, None))
+    while stack:
+        dp, de = stack.pop()
+        try:
+            traceOps("stat")
+            if de == None: st = stat(dp)
+            else: st = de.stat() # follows symbolic link
+            key = (st.st_dev, st.st_ino)
+            if key in visited: continue # already visited
+            visited.add(key)
+            fnL, subFolders = listFolder(dp, st, inclSubFolders, index)
+        except OSError as e: # no permission, removed folder, etc
+            if DEBUG: print(e)
+            continue
+        yield dp, fnL
+        ### add sub-folders to visit next in the alphabetical order
+        subFolders.sort(key=lambda item: item[0], reverse=True)
+        for name, de in subFolders: stack.append((path.join(dp, name), de))
+
+#-----------------------------------------------------------------------
+
+def listFolder(dp, st, inclSubFolders=False, index=None):
+    """ List a folder with os.scandir, or take its names from the index,
+    if the folder is unchanged.
+
+    Args:
+        dp (str): Folder path.
+        st (os.stat_result): Stat of the folder.
+        inclSubFolders (bool, optional): Whether to return sub-folders.
+        index (ScanIndex, optional): Index of unchanged folders.
+
+    Returns:
+        fnL (list): Names of non-folder items in the folder.
+        subFolders (list): (name, os.DirEntry or None) of sub-folders;
+          empty when inclSubFolders is False.
+
+    Raises:
+        OSError: When the folder can't be listed.
+    """
+    if index != None:
+        cached = index.lookup(dp, st)
+        if cached != None:
+            fnL, subNames = cached
+            if not inclSubFolders: return fnL, []
+            return fnL, [(name, None) for name in subNames]
+    traceOps("scandir")
+    fnL = []
+    subFolders = []
+    with scandir(dp) as it:
+        for de in it:
+            try: isDir = de.is_dir() # no stat call on most OS
+            except OSError: isDir = False
+            if isDir:
+                if inclSubFolders or index != None: 
+                    subFolders.append((de.name, de))
+            else:
+                fnL.append(de.name)
+    if index != None:
+        index.store(dp, st, fnL, [name for name, de in subFolders])
+        if not inclSubFolders: subFolders = []
+    return fnL, subFolders
+
+#-----------------------------------------------------------------------
+
+def walkFoldersParallel(folders, inclSubFolders, nWorkers, index=None):
+    """ Same as walkFolders, but folders are listed concurrently in a 
+    thread pool, which helps a lot on high-latency file systems such 
+    as NFS or SMB. 
+    When a folder is listed, listing of its sub-folders is immediately
+    submitted to the pool, while results are yielded in the depth-first
+    order of walkFolders. Ancestor folders are passed down to detect 
+    symbolic link loops during listing, then a folder reached twice is 
+    skipped in the yielding order, as in walkFolders.
+
+    Args:
+        folders (list): Selected folders.
+        inclSubFolders (bool): Whether to include sub-folders.
+        nWorkers (int): Number of threads.
+        index (ScanIndex, optional): Index of unchanged folders.
+
+    Yields:
+        dp (str): Folder path.
+        fnL (list): Names of non-folder items in the folder.
+    """
+    if DEBUG: print("walkFoldersParallel()")
+
+    pool = ThreadPoolExecutor(max_workers=nWorkers)
+
+    def listTask(dp, de, ancestors):
+        # ancestors: (key, parent's ancestors) of parent folder, or None
+        try:
+            traceOps("stat")
+            if de == None: st = stat(dp)
+            else: st = de.stat() # follows symbolic link
+            key = (st.st_dev, st.st_ino)
+            if de == None or de.is_symlink(): # (unknown without DirEntry)
+                a = ancestors
+                while a != None:
+                    if a[0] == key: return dp, key, None, [] # loop
+                    a = a[1]
+            fnL, subFolders = listFolder(dp, st, inclSubFolders, index)
+        except OSError as e: # no permission, removed folder, etc
+            if DEBUG: print(e)
+            return dp, None, None, []
+        subFolders.sort(key=lambda item: item[0])
+        chain = (key, ancestors)
+        children = [pool.submit(listTask, path.join(dp, name), de, chain) \
+                                                for name, de in subFolders]
+        return dp, key, fnL, children
+
+    visited = set() # (st_dev, st_ino) of yielded folders
+    try:
+        stack = [pool.submit(listTask, dp, None, None) \
+                                            for dp in reversed(folders)]
+        while stack:
+            dp, key, fnL, children = stack.pop().result()
+            if fnL == None or key in visited: continue
+            visited.add(key)
+            yield dp, fnL
+            stack += reversed(children)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+#-----------------------------------------------------------------------
+
+def getNameMatcher(fileForm):
+    """ Return a function to test whether a file-name matches with the 
+    given file-name form. The form can have several patterns separated
+    by FF_SEP; a file-name matches when it matches with any of them.
+    Each pattern is a file-name with wildcard characters (as in glob, 
+    '*' and '?' don't match a leading dot) or, with FF_RE_PREFIX, 
+    a regular expression which should match the whole file-name.
+    All patterns are compiled into one regular expression, so that
+    each file-name is tested once, regardless of number of patterns.
+
+    Args:
+        fileForm (str): Target file-name (patterns separated by FF_SEP).
+
+    Returns:
+        (function): Function which returns a match object or None with
+          a file-name.
+
+    Raises:
+        ValueError: When a regular expression is invalid.
+
+    Examples:
+        >>> match = getNameMatcher("*.jpg; *.png; re:IMG_\\d{4}\\.tif")
+        >>> bool(match("a.png")), bool(match("IMG_0001.tif"))
+        (True, True)
+    """
+    if DEBUG: print("getNameMatcher()")
+
+    flags = 0
+    if path.normcase('A') == 'a': flags = re.IGNORECASE # case-insensitive
+    parts = []
+    for pat in fileForm.split(FF_SEP):
+        pat = pat.strip()
+        if pat == '': continue
+        if pat.startswith(FF_RE_PREFIX):
+            rPat = pat[len(FF_RE_PREFIX):]
+            try:
+                re.compile(rPat, flags)
+            except re.error as e:
+                raise ValueError("Invalid regular expression '%s': %s"%(rPat, 
+                                                                         e))
+            parts.append("(?:%s)\\Z"%(rPat))
+        elif pat.startswith('.'):
+            parts.append(translate(pat))
+        else:
+            parts.append("(?!\\.)" + translate(pat))
+    if parts == []: return lambda fn: None # no pattern
+    try:
+        return re.compile("|".join(parts), flags).match
+    except re.error as e: # such as a group name used in two patterns
+        raise ValueError("Invalid target file-name '%s': %s"%(fileForm, e))
+
+#=======================================================================
+
+class PathList(object):
+    """ Compact list of file paths, for batches of millions of files.
+    Each folder is kept once in a table of prefixes (folder path with
+    a trailing separator), which can be shared with other lists, such 
+    as new file paths of the same files; each file is kept only as the
+    index of its prefix (in an array) and its file-name. A path is made
+    (prefix + file-name) when it's accessed, so the list can be read 
+    like a list of paths (len, index, slice and iteration).
+    Files are appended after their prefix indices, so a list being 
+    filled in a thread can be read in another thread up to its length.
+
+    Args:
+        paths (iterable, optional): File paths to append.
+        shareWith (PathList, optional): List whose table of prefixes
+          is shared.
+
+    Attributes:
+        prefixes (list): Prefix of each prefix index.
+        dirI (array): Prefix index of each file.
+        names (list): File-name of each file.
+
+    Examples:
+        >>> fL = PathList()
+        >>> fL.addFolder('/data', ['a.jpg', 'b.jpg'])
+        >>> len(fL), fL[1]
+        (2, '/data/b.jpg')
+    """
+    def __init__(self, paths=(), shareWith=None):
+        if shareWith == None:
+            self.prefixes = []
+            self.prefixIdx = {} # prefix index of each prefix
+            self.lock = Lock() # for adding prefixes to the shared table
+        else:
+            self.prefixes = shareWith.prefixes
+            self.prefixIdx = shareWith.prefixIdx
+            self.lock = shareWith.lock
+        self.dirI = array('I')
+        self.names = []
+        for fp in paths: self.append(fp)
+
+    #-------------------------------------------------------------------
+
+    def __len__(self): return len(self.names)
+
+    #-------------------------------------------------------------------
+
+    def __getitem__(self, i):
+        if isinstance(i, slice): 
+            return [self[j] for j in range(*i.indices(len(self.names)))]
+        return self.prefixes[self.dirI[i]] + self.names[i]
+
+    #-------------------------------------------------------------------
+
+    def __iter__(self):
+        return map(add, map(self.prefixes.__getitem__, self.dirI), 
+                   self.names)
+
+    #-------------------------------------------------------------------
+
+    def __repr__(self):
+        return "PathList(%i files in %i folders)"%(len(self.names), 
+                                                   len(self.prefixes))
+
+    #-------------------------------------------------------------------
+
+    def getPrefixIndex(self, prefix):
+        """ Return index of a prefix, adding it to the table if it's new.
+
+        Args:
+            prefix (str): Folder path with a trailing separator.
+
+        Returns:
+            k (int): Prefix index.
+        """
+        k = self.prefixIdx.get(prefix)
+        if k != None: return k
+        with self.lock:
+            k = self.prefixIdx.get(prefix)
+            if k == None:
+                k = len(self.prefixes)
+                self.prefixes.append(prefix)
+                self.prefixIdx[prefix] = k
+        return k
+
+    #-------------------------------------------------------------------
+
+    def addFolder(self, dp, fnL):
+        """ Append files in a folder.
+
+        Args:
+            dp (str): Folder path.
+            fnL (list): File-names.
+
+        Returns: None
+        """
+        if fnL == []: return
+        k = self.getPrefixIndex(path.join(dp, ""))
+        self.dirI.extend(array('I', [k]) * len(fnL))
+        self.names.extend(fnL)
+
+    #-------------------------------------------------------------------
+
+    def splitPrefix(self, fp):
+        """ Return prefix index and file-name of a file path.
+
+        Args:
+            fp (str): File path.
+
+        Returns:
+            k (int): Prefix index.
+            bn (str): File-name.
+        """
+        bn = splitPath(fp)[1]
+        return self.getPrefixIndex(fp[:len(fp)-len(bn)]), bn
+
+    #-------------------------------------------------------------------
+
+    def append(self, fp):
+        """ Append a file path.
+
+        Args:
+            fp (str): File path.
+
+        Returns: None
+        """
+        k, bn = self.splitPrefix(fp)
+        self.dirI.append(k)
+        self.names.append(bn)
+
+    #-------------------------------------------------------------------
+
+    def setPath(self, i, fp):
+        """ Replace the file path at an index.
+
+        Args:
+            i (int): Index.
+            fp (str): File path.
+
+        Returns: None
+        """
+        k, bn = self.splitPrefix(fp)
+        self.dirI[i] = k
+        self.names[i] = bn
+
+    #-------------------------------------------------------------------
+
+    def select(self, indices):
+        """ Return a list of files at the given indices, sharing the 
+        table of prefixes.
+
+        Args:
+            indices (iterable): Indices of files.
+
+        Returns:
+            (PathList): Selected files.
+        """
+        dirI = self.dirI
+        names = self.names
+        pl = PathList(shareWith=self)
+        for i in indices:
+            pl.dirI.append(dirI[i])
+            pl.names.append(names[i])
+        return pl
+
+#-----------------------------------------------------------------------
+
+def asPathList(fileList, shareWith=None):
+    """ Return file paths as PathList; fileList itself if it's already
+    a PathList (sharing the table of prefixes of shareWith).
+
+    Args:
+        fileList (list/ PathList): File paths.
+        shareWith (PathList, optional): List whose table of prefixes 
+          should be shared.
+
+    Returns:
+        (PathList): File paths.
+    """
+    if isinstance(fileList, PathList) and \
+      (shareWith == None or fileList.prefixes is shareWith.prefixes):
+        return fileList
+    return PathList(fileList, shareWith)
+
+#-----------------------------------------------------------------------
+
+def scanFolders(folders, fileForm, inclSubFolders=False, nWorkers=1,
+                progressFunc=None, cancelEvent=None, index=None):
+    """ Return list of folders and list of files, matching with the 
+    given file-name form, in the given folders in one pass.
+
+    Args:
+        folders (list): Selected folders.
+        fileForm (str): Target file-name (see getNameMatcher).
+        inclSubFolders (bool, optional): Whether to include sub-folders.
+        nWorkers (int, optional): Number of threads to list folders.
+        progressFunc (function, optional): Function to be called after 
+          each folder with (folder list, file list) scanned so far.
+        cancelEvent (threading.Event, optional): Scanning stops, when 
+          it's set.
+        index (ScanIndex, optional): Index of unchanged folders, which 
+          is updated (flushed) after scanning.
+
+    Returns:
+        folderL (list): Selected folders (and their sub-folders).
+        fL (PathList): File paths.
+
+    Raises:
+        Cancelled: When cancelEvent was set.
+    """
+    match = getNameMatcher(fileForm)
+    folderL = []
+    fL = PathList()
+    walker = walkFolders(folders, inclSubFolders, nWorkers, index)
+    with traceSpan("scan") as sp:
+        nNames = 0 # number of walked file-names
+        tMatch = 0.0 # time spent for matching file-names
+        try:
+            for dp, fnL in walker:
+                if cancelEvent != None and cancelEvent.is_set(): 
+                    raise Cancelled
+                folderL.append(dp)
+                if sp.enabled:
+                    t = time()
+                    fL.addFolder(dp, [fn for fn in fnL if match(fn)])
+                    tMatch += time() - t
+                    nNames += len(fnL)
+                else:
+                    fL.addFolder(dp, [fn for fn in fnL if match(fn)])
+                if progressFunc != None: progressFunc(folderL, fL)
+        finally:
+            walker.close() # stop listing in threads, if any
+            if index != None: 
+                index.flush()
+                sp.add(indexHits=index.nHits, indexMisses=index.nMisses)
+            sp.add(folders=len(folderL), names=nNames, matched=len(fL),
+                   matchMs=round(tMatch*1000, 3))
+    return folderL, fL
+
+#=======================================================================
+
+class ScanIndex(object):
+    """ Persistent index of listed folders (like git's index), so that 
+    folders unchanged since the last scan are not listed again.
+    Names of files and sub-folders of each folder are stored in an
+    SQLite database with the device, inode and modification time of 
+    the folder; a folder is served from the index only when all of 
+    them are same. A folder modified within SCAN_INDEX_RACY_NS before 
+    it was listed is not stored, as a later change in the same 
+    timestamp granularity could be missed.
+    Folders not used for maxAge seconds are evicted, and least recently
+    used folders are evicted when stored names exceed maxBytes.
+    Methods can be called from several threads (see walkFolders).
+
+    Args:
+        indexFile (str, optional): Index file path.
+        maxBytes (int, optional): Maximum bytes of stored names.
+        maxAge (float, optional): Seconds to keep unused folders.
+
+    Attributes:
+        nHits (int): Number of folders served from the index.
+        nMisses (int): Number of folders listed.
+
+    Examples:
+        >>> index = ScanIndex()
+        >>> folderL, fL = scanFolders(['/data'], '*.jpg', True, index=index)
+        >>> index.close()
+    """
+    def __init__(self, indexFile=SCAN_INDEX_FILE, 
+                 maxBytes=SCAN_INDEX_MAX_BYTES, maxAge=SCAN_INDEX_MAX_AGE):
+        if DEBUG: print("ScanIndex.__init__()")
+
+        import sqlite3 # loaded only when the index is used
+        self.indexFile = indexFile
+        self.maxBytes = maxBytes
+        self.maxAge = maxAge
+        self.lock = Lock()
+        self.db = sqlite3.connect(indexFile, check_same_thread=False)
+        self.db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY"
+                        ", dev INTEGER, ino INTEGER, mtime INTEGER"
+                        ", used REAL, size INTEGER, files BLOB, subdirs BLOB)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS dirs_used ON dirs(used)")
+        self.db.commit()
+        self.pending = [] # rows of listed folders to be written
+        self.used = [] # folders served from the index
+        self.nHits = 0
+        self.nMisses = 0
+
+    #-------------------------------------------------------------------
+
+    def lookup(self, dp, st):
+        """ Return stored names in a folder, if it's not changed.
+
+        Args:
+            dp (str): Folder path.
+            st (os.stat_result): Current stat of the folder.
+
+        Returns:
+            (tuple): Names of non-folder items and names of sub-folders,
+              or None if the folder should be listed.
+        """
+        with self.lock:
+            if self.db == None: return None # closed
+            row = self.db.execute("SELECT dev, ino, mtime, files, subdirs"
+                                  " FROM dirs WHERE path=?", 
+                                  (dp,)).fetchone()
+            if row == None or row[:3] != (st.st_dev, st.st_ino, 
+                                          st.st_mtime_ns):
+                self.nMisses += 1
+                return None
+            self.nHits += 1
+            self.used.append(dp)
+        return decodeNames(row[3]), decodeNames(row[4])
+
+    #-------------------------------------------------------------------
+
+    def store(self, dp, st, fnL, subNames):
+        """ Store names in a listed folder (written in 'flush').
+
+        Args:
+            dp (str): Folder path.
+            st (os.stat_result): Stat of the folder before listing.
+            fnL (list): Names of non-folder items.
+            subNames (list): Names of sub-folders.
+
+        Returns: None
+        """
+        if time_ns() - st.st_mtime_ns < SCAN_INDEX_RACY_NS: return
+        files = encodeNames(fnL)
+        subdirs = encodeNames(subNames)
+        row = (dp, st.st_dev, st.st_ino, st.st_mtime_ns, time(),
+               len(files)+len(subdirs), files, subdirs)
+        with self.lock:
+            self.pending.append(row)
+            flagFlush = len(self.pending) >= SCAN_INDEX_BATCH
+        if flagFlush: self.flush()
+
+    #-------------------------------------------------------------------
+
+    def flush(self):
+        """ Write listed folders and usage time of served folders.
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("ScanIndex.flush()")
+
+        with self.lock:
+            if self.db == None: return # closed
+            pending = self.pending
+            used = self.used
+            self.pending = []
+            self.used = []
+            self.db.executemany("INSERT OR REPLACE INTO dirs VALUES"
+                                " (?, ?, ?, ?, ?, ?, ?, ?)", pending)
+            t = time()
+            self.db.executemany("UPDATE dirs SET used=? WHERE path=?",
+                                [(t, dp) for dp in used])
+            self.db.commit()
+
+    #-------------------------------------------------------------------
+
+    def evict(self):
+        """ Remove folders not used for maxAge seconds, then least 
+        recently used folders while stored names exceed maxBytes.
+
+        Args: None
+
+        Returns:
+            nEvicted (int): Number of removed folders.
+        """
+        if DEBUG: print("ScanIndex.evict()")
+
+        with self.lock:
+            db = self.db
+            if db == None: return 0 # closed
+            cur = db.execute("DELETE FROM dirs WHERE used<?", 
+                             (time()-self.maxAge,))
+            nEvicted = cur.rowcount
+            total = db.execute("SELECT SUM(size) FROM dirs").fetchone()[0]
+            if total != None and total > self.maxBytes:
+                excess = total - self.maxBytes
+                freed = 0
+                n = 0 # number of folders to evict
+                for (size,) in db.execute("SELECT size FROM dirs"
+                                          " ORDER BY used"):
+                    freed += size
+                    n += 1
+                    if freed >= excess: break
+                cur = db.execute("DELETE FROM dirs WHERE path IN (SELECT path"
+                                 " FROM dirs ORDER BY used LIMIT ?)", (n,))
+                nEvicted += cur.rowcount
+            if nEvicted > 0: db.execute("PRAGMA incremental_vacuum")
+            db.commit()
+        return nEvicted
+
+    #-------------------------------------------------------------------
+
+    def close(self):
+        """ Write pending changes, evict old folders and close the index.
+        A closed index serves no folder, so that a scan still running
+        with it lists all folders.
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("ScanIndex.close()")
+
+        self.flush()
+        self.evict()
+        with self.lock:
+            if self.db != None: self.db.close()
+            self.db = None
+
+#-----------------------------------------------------------------------
+
+def encodeNames(names):
+    """ Encode names to bytes for ScanIndex (file-names can't have 
+    a null character). Undecodable names are kept with 
+    'surrogateescape'.
+
+    Args:
+        names (list): Names.
+
+    Returns:
+        (bytes): Encoded names.
+    """
+    return "\0".join(names).encode('utf-8', 'surrogateescape')
+
+#-----------------------------------------------------------------------
+
+def decodeNames(data):
+    """ Decode names encoded with encodeNames.
+
+    Args:
+        data (bytes): Encoded names.
+
+    Returns:
+        (list): Names.
+    """
+    if data == b"": return []
+    return data.decode('utf-8', 'surrogateescape').split("\0")
+
+#=======================================================================
+
+class ScanCache(object):
+    """ Keeping the result of scanFolders, so that changes only in 
+    new file-name format don't cause scanning folders again. 
+    The cached result is used as long as the selected folders, 
+    the sub-folder option and the target file-name form are same.
+
+    The cached result is replaced at once only after a complete scan, 
+    so the cache can be used from a worker thread.
+
+    Args:
+        hashCacheFile (str, optional): See MetaCache.
+
+    Attributes:
+        result (tuple): Scanning parameters (key), scanned folders and 
+          scanned file paths (PathList).
+        meta (MetaCache): Metadata of scanned files; stat results are
+          discarded when folders are scanned again, and only of added 
+          or removed files on changes while watching.
+        existsCache (dict): Whether each new file path exists (see 
+          findConflicts), while watching; None otherwise. Entries of 
+          changed folders are discarded on changes.
+
+    Examples:
+        >>> sc = ScanCache()
+        >>> folderL, fileL = sc.get(['/tmp'], '*.jpg', True)
+    """
+    def __init__(self, hashCacheFile=None):
+        if DEBUG: print("ScanCache.__init__()")
+        self.watcher = None
+        self.existsCache = None
+        self.meta = MetaCache(hashCacheFile)
+        self.invalidate()
+
+    #-------------------------------------------------------------------
+
+    def get(self, folders, fileForm, inclSubFolders=False, nWorkers=1,
+            progressFunc=None, cancelEvent=None, index=None):
+        """ Return scanned folders and files; scan folders only when 
+        there's no cached result with the same parameters.
+
+        Args:
+            folders (list): Selected folders.
+            fileForm (str): Target file-name (see getNameMatcher).
+            inclSubFolders (bool, optional): Whether to include sub-folders.
+            nWorkers (int, optional): Number of threads to list folders.
+            progressFunc (function, optional): See scanFolders.
+            cancelEvent (threading.Event, optional): See scanFolders.
+            index (ScanIndex, optional): See scanFolders.
+
+        Returns:
+            folderL (list): Selected folders (and their sub-folders).
+            fileL (PathList): File paths.
+
+        Raises:
+            Cancelled: When cancelEvent was set during scanning.
+        """
+        if DEBUG: print("ScanCache.get()")
+
+        key = (tuple(folders), fileForm, inclSubFolders)
+        result = self.result
+        if key != result[0]:
+            self.stopWatching()
+            folderL, fileL = scanFolders(folders, 
+                                         fileForm, 
+                                         inclSubFolders,
+                                         nWorkers,
+                                         progressFunc,
+                                         cancelEvent,
+                                         index)
+            result = (key, folderL, fileL)
+            self.meta.clearStats()
+            self.result = result
+        return result[1], result[2]
+
+    #-------------------------------------------------------------------
+
+    def invalidate(self):
+        """ Discard the cached result (such as after renaming files).
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("ScanCache.invalidate()")
+        self.stopWatching()
+        self.meta.clearStats()
+        self.result = (None, [], [])
+
+    #-------------------------------------------------------------------
+
+    def startWatching(self, changeFunc):
+        """ Keep the cached result up to date with FolderWatcher,
+        until it's invalidated or folders are scanned with different
+        parameters.
+
+        Args:
+            changeFunc (function): Function to be called (from the 
+              watching thread) after the cached result was updated.
+
+        Returns:
+            (str): Backend of the watcher ('inotify' or 'poll'), or None
+              if there's no cached result.
+        """
+        if DEBUG: print("ScanCache.startWatching()")
+
+        key, folderL, fileL = self.result
+        if key == None: return None
+        if self.watcher != None and self.watcherKey == key: 
+            return self.watcher.backend
+        self.stopWatching()
+        def onChange(folderL, fileL, touched):
+            if self.result[0] != key: return # outdated
+            self.meta.clearStats(touched)
+            changedK = set() # prefix indices of changed folders
+            for fp in touched:
+                bn = splitPath(fp)[1]
+                changedK.add(fileL.prefixIdx.get(fp[:len(fp)-len(bn)]))
+            existsCache = self.existsCache
+            if existsCache != None: # a new dict; it's used in other threads
+                self.existsCache = {k: v for k, v in existsCache.items() \
+                                                    if not k in changedK}
+            self.result = (key, folderL, fileL)
+            changeFunc()
+        self.watcher = FolderWatcher(key[0], key[1], key[2], folderL, fileL,
+                                     onChange)
+        self.watcherKey = key
+        self.existsCache = {}
+        self.watcher.start()
+        return self.watcher.backend
+
+    #-------------------------------------------------------------------
+
+    def stopWatching(self):
+        """ Stop keeping the cached result up to date.
+
+        Args: None
+
+        Returns: None
+        """
+        self.existsCache = None # not kept up to date without watching
+        if self.watcher == None: return
+        self.watcher.stop()
+        self.watcher = None
+
+#=======================================================================
+
+class FolderWatcher(object):
+    """ Keeping a scanned file list of folders up to date, applying 
+    added, removed and moved files and folders, without scanning all
+    folders again. Linux inotify is used when available (only changed
+    names are processed); otherwise folders are polled by their 
+    modification time, and only changed folders are listed again.
+    Changes are collected for a short time (WATCH_DELAY) and passed to 
+    changeFunc at once, from the watching thread.
+    Changes made while watching is being started may be missed.
+    As in walkFolders, each folder (st_dev, st_ino) is added only once,
+    so symbolic links to folders don't add aliases of files.
+
+    Args:
+        folders (list): Selected folders.
+        fileForm (str): Target file-name (see getNameMatcher).
+        inclSubFolders (bool): Whether to include sub-folders.
+        folderL (list): Scanned folders (see scanFolders).
+        fileL (PathList): Scanned file paths (see scanFolders); updated 
+          file lists share its table of prefixes.
+        changeFunc (function): Function to be called with updated 
+          (folder list, file list (PathList), set of added or removed 
+          file paths) after changes.
+
+    Attributes:
+        backend (str): 'inotify' or 'poll'.
+    """
+    def __init__(self, folders, fileForm, inclSubFolders, folderL, fileL, 
+                 changeFunc):
+        if DEBUG: print("FolderWatcher.__init__()")
+
+        self.roots = list(folders)
+        self.match = getNameMatcher(fileForm)
+        self.inclSubFolders = inclSubFolders
+        self.changeFunc = changeFunc
+        self.stopEvent = Event()
+        self.thread = None
+        self.flagSort = False # whether folders need sorting (new folders)
+        self.flagChanged = False # whether there are changes not passed
+        self.touched = set() # added or removed file paths not passed
+        self.folders = {} # matched file-names (dict as ordered set) 
+                          #   of each folder in scanning order
+        self.keys = {} # (st_dev, st_ino) of each folder
+        self.visited = set() # (st_dev, st_ino) of folders
+        self.fileL = asPathList(fileL)
+        dirOf = {} # folder of each prefix (see PathList)
+        for dp in folderL:
+            self.folders[dp] = {}
+            dirOf[path.join(dp, "")] = dp
+        prefixes = self.fileL.prefixes
+        for k, bn in zip(self.fileL.dirI, self.fileL.names):
+            self.folders[dirOf[prefixes[k]]][bn] = None
+        self.mtimes = {} # modification time of each folder (polling)
+        self.wds = {} # folder of each watch descriptor (inotify)
+        self.wdOf = {} # watch descriptor of each folder (inotify)
+        self.libc = None
+        self.fd = None
+        if sys.platform.startswith('linux'):
+            import ctypes
+            try:
+                self.libc = ctypes.CDLL(None, use_errno=True)
+                self.fd = self.libc.inotify_init1(IN_CLOEXEC)
+            except (OSError, AttributeError):
+                self.fd = None
+            if self.fd != None and self.fd < 0: self.fd = None
+        if self.fd == None: self.backend = "poll"
+        else: self.backend = "inotify"
+
+    #-------------------------------------------------------------------
+
+    def start(self):
+        """ Start watching in a thread.
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("FolderWatcher.start()")
+
+        for dp in list(self.folders.keys()): 
+            try: st = stat(dp)
+            except OSError: continue
+            self.keys[dp] = (st.st_dev, st.st_ino)
+            self.visited.add(self.keys[dp])
+            self.watchFolder(dp)
+        if self.backend == "inotify": target = self.runInotify
+        else: target = self.runPolling
+        self.thread = Thread(target=target, daemon=True)
+        self.thread.start()
+
+    #-------------------------------------------------------------------
+
+    def stop(self):
+        """ Stop watching.
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("FolderWatcher.stop()")
+
+        self.stopEvent.set()
+        if self.thread != None and self.thread != current_thread():
+            self.thread.join()
+        if self.fd != None:
+            close(self.fd)
+            self.fd = None
+
+    #-------------------------------------------------------------------
+
+    def watchFolder(self, dp):
+        """ Start watching a folder, recording its watch descriptor 
+        (inotify) or modification time (polling).
+
+        Args:
+            dp (str): Folder path.
+
+        Returns:
+            (bool): False if it can't be watched (such as removed).
+        """
+        if self.backend == "poll":
+            try: self.mtimes[dp] = stat(dp).st_mtime_ns
+            except OSError: return False
+            return True
+        wd = self.libc.inotify_add_watch(self.fd, 
+                                         fsencode(dp), 
+                                         IN_WATCH_MASK)
+        if wd < 0: return False
+        self.wds[wd] = dp
+        self.wdOf[dp] = wd
+        return True
+
+    #-------------------------------------------------------------------
+
+    def addFolderTree(self, dp):
+        """ Add a new folder (and its sub-folders, if sub-folders are 
+        included) with its matching files. A folder is watched before
+        it's listed, so files added in the meantime are not missed.
+        A folder already added (such as through a symbolic link) is 
+        not added again.
+
+        Args:
+            dp (str): Folder path.
+
+        Returns: None
+        """
+        stack = [dp]
+        while stack:
+            dp = stack.pop()
+            if dp in self.folders: continue
+            try: st = stat(dp) # follows symbolic link
+            except OSError: continue
+            key = (st.st_dev, st.st_ino)
+            if key in self.visited or not self.watchFolder(dp): continue
+            files = {}
+            subFolders = []
+            try:
+                with scandir(dp) as it:
+                    for de in it:
+                        try: isDir = de.is_dir()
+                        except OSError: isDir = False
+                        if isDir: subFolders.append(de.path)
+                        elif self.match(de.name): files[de.name] = None
+            except OSError:
+                continue
+            self.folders[dp] = files
+            self.keys[dp] = key
+            self.visited.add(key)
+            prefix = path.join(dp, "")
+            self.touched.update([prefix + fn for fn in files])
+            if self.inclSubFolders: stack += subFolders
+        self.flagSort = True
+        self.flagChanged = True
+
+    #-------------------------------------------------------------------
+
+    def removeFolderTree(self, dp):
+        """ Remove a folder and its sub-folders with their files.
+
+        Args:
+            dp (str): Folder path.
+
+        Returns: None
+        """
+        prefix = path.join(dp, "")
+        for fdp in list(self.folders.keys()):
+            if fdp != dp and not fdp.startswith(prefix): continue
+            fPrefix = path.join(fdp, "")
+            self.touched.update([fPrefix + fn for fn in self.folders[fdp]])
+            del self.folders[fdp]
+            self.visited.discard(self.keys.pop(fdp, None))
+            self.flagChanged = True
+            self.mtimes.pop(fdp, None)
+            wd = self.wdOf.pop(fdp, None)
+            if wd != None:
+                self.wds.pop(wd, None)
+                self.libc.inotify_rm_watch(self.fd, wd)
+
+    #-------------------------------------------------------------------
+
+    def sortFolders(self):
+        """ Sort folders in the order of scanning (see walkFolders); 
+        selected folders in their order, then sub-folders in 
+        alphabetical depth-first order.
+
+        Args: None
+
+        Returns: None
+        """
+        def key(item):
+            dp = item[0]
+            for i, root in enumerate(self.roots):
+                rel = path.relpath(dp, root)
+                if rel == '.': return (i, ())
+                if not rel.startswith(".."): 
+                    return (i, tuple(rel.split(path.sep)))
+            return (len(self.roots), (dp,))
+        self.folders = dict(sorted(self.folders.items(), key=key))
+        self.flagSort = False
+
+    #-------------------------------------------------------------------
+
+    def relistFolder(self, dp):
+        """ List a folder again and apply differences (polling, or 
+        when inotify events were lost).
+
+        Args:
+            dp (str): Folder path.
+
+        Returns: None
+        """
+        files = {}
+        subFolders = []
+        try:
+            with scandir(dp) as it:
+                for de in it:
+                    try: isDir = de.is_dir()
+                    except OSError: isDir = False
+                    if isDir: subFolders.append(de.path)
+                    elif self.match(de.name): files[de.name] = None
+        except OSError: # removed
+            self.removeFolderTree(dp)
+            return
+        old = self.folders[dp]
+        kept = {fn: None for fn in old if fn in files} # keep the order
+        kept.update(files)
+        if list(kept) != list(old): 
+            self.flagChanged = True
+            prefix = path.join(dp, "")
+            self.touched.update([prefix + fn for fn in \
+                                    set(old).symmetric_difference(files)])
+        self.folders[dp] = kept
+        if not self.inclSubFolders: return
+        prefix = path.join(dp, "")
+        subSet = set(subFolders)
+        for fdp in list(self.folders.keys()): # removed sub-folders
+            if fdp.startswith(prefix) and path.dirname(fdp) == \
+              path.dirname(path.join(dp, "_")) and not fdp in subSet:
+                self.removeFolderTree(fdp)
+        for sdp in subFolders: # added sub-folders
+            if not sdp in self.folders: self.addFolderTree(sdp)
+
+    #-------------------------------------------------------------------
+
+    def applyEvent(self, dp, mask, name):
+        """ Apply an inotify event.
+
+        Args:
+            dp (str): Folder path.
+            mask (int): Event mask.
+            name (str): Name of the file or folder in the event.
+
+        Returns: None
+        """
+        fp = path.join(dp, name)
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE|IN_MOVED_TO):
+                if self.inclSubFolders: self.addFolderTree(fp)
+            elif mask & (IN_DELETE|IN_MOVED_FROM):
+                self.removeFolderTree(fp)
+        elif mask & (IN_CREATE|IN_MOVED_TO):
+            if self.match(name): 
+                self.folders[dp][name] = None
+                self.touched.add(fp)
+                self.flagChanged = True
+        elif mask & (IN_DELETE|IN_MOVED_FROM):
+            if self.folders[dp].pop(name, 0) != 0: 
+                self.touched.add(fp)
+                self.flagChanged = True
+
+    #-------------------------------------------------------------------
+
+    def emit(self):
+        """ Pass updated lists to changeFunc, if there are changes.
+        The file list is made of file-names of each folder, sharing the
+        table of prefixes of the scanned file list.
+
+        Args: None
+
+        Returns: None
+        """
+        if not self.flagChanged: return
+        self.flagChanged = False
+        touched = self.touched
+        self.touched = set()
+        with traceSpan("watch.emit") as sp:
+            if self.flagSort: self.sortFolders()
+            folderL = list(self.folders.keys())
+            fileL = PathList(shareWith=self.fileL)
+            for dp, files in self.folders.items(): 
+                fileL.addFolder(dp, list(files))
+            sp.add(folders=len(folderL), files=len(fileL), 
+                   touched=len(touched))
+        self.changeFunc(folderL, fileL, touched)
+
+    #-------------------------------------------------------------------
+
+    def runInotify(self):
+        """ Read inotify events and apply them, until stopped.
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("FolderWatcher.runInotify()")
+
+        pending = None # time of the first change not passed yet
+        while not self.stopEvent.is_set():
+            r, w, x = select([self.fd], [], [], WATCH_DELAY)
+            if r != []:
+                data = read(self.fd, 65536)
+                i = 0
+                with traceSpan("watch.events") as sp:
+                    nEvents = 0
+                    while i < len(data):
+                        wd, mask, cookie, nameLen = INOTIFY_EVENT.unpack_from(
+                                                                    data, i)
+                        i += INOTIFY_EVENT.size
+                        name = fsdecode(data[i:i+nameLen].rstrip(b"\0"))
+                        i += nameLen
+                        nEvents += 1
+                        if mask & IN_Q_OVERFLOW: # events were lost
+                            for dp in list(self.folders.keys()):
+                                if dp in self.folders: self.relistFolder(dp)
+                        elif mask & IN_IGNORED: # watch was removed
+                            dp = self.wds.pop(wd, None)
+                            if dp != None: 
+                                self.wdOf.pop(dp, None)
+                                self.removeFolderTree(dp)
+                        elif wd in self.wds and name != "":
+                            self.applyEvent(self.wds[wd], mask, name)
+                    sp.add(events=nEvents)
+                if pending == None: pending = time()
+                if time() - pending < WATCH_MAX_DELAY: continue
+            if pending != None:
+                pending = None
+                self.emit()
+
+    #-------------------------------------------------------------------
+
+    def runPolling(self):
+        """ Poll modification time of folders and list changed folders
+        again, until stopped.
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("FolderWatcher.runPolling()")
+
+        while not self.stopEvent.wait(WATCH_INTERVAL):
+            with traceSpan("watch.poll") as sp:
+                for dp in list(self.folders.keys()):
+                    if not dp in self.folders: continue # removed meanwhile
+                    try: mtime = stat(dp).st_mtime_ns
+                    except OSError: mtime = None
+                    if mtime == self.mtimes.get(dp): continue
+                    if mtime == None: 
+                        self.removeFolderTree(dp)
+                        continue
+                    self.mtimes[dp] = mtime
+                    self.relistFolder(dp)
+                sp.add(folders=len(self.folders))
+            self.emit()
+
+#=======================================================================
+
+def readExifDate(fp):
+    """ Return the date when a photo was taken, from EXIF in a JPEG or 
+    TIFF-based (such as many raw formats) file. Only the header of the
+    file is read (at most EXIF_READ_MAX bytes).
+
+    Args:
+        fp (str): File path.
+
+    Returns:
+        (str): Date in TS_FORMAT, or None if it's not found.
+
+    Raises:
+        OSError: When the file can't be read.
+    """
+    with open(fp, 'rb') as f:
+        buf = f.read(EXIF_HEAD)
+        if buf[:2] == b'\xff\xd8': # JPEG; find APP1 segment with EXIF
+            i = 2
+            while True:
+                if len(buf) < i + 10: 
+                    if len(buf) >= EXIF_READ_MAX: return None
+                    more = f.read(min(i+10, EXIF_READ_MAX) - len(buf))
+                    if more == b'': return None
+                    buf += more
+                    continue
+                if buf[i] != 0xff or buf[i+1] in (0xd9, 0xda): 
+                    return None # not a marker, end of image or image data
+                segEnd = i + 2 + int.from_bytes(buf[i+2:i+4], 'big')
+                if buf[i+1] == 0xe1 and buf[i+4:i+10] == b'Exif\0\0':
+                    if segEnd > EXIF_READ_MAX: segEnd = EXIF_READ_MAX
+                    if segEnd > len(buf): buf += f.read(segEnd - len(buf))
+                    return parseExifDate(buf[i+10:segEnd])
+                i = segEnd
+        elif buf[:4] in (b'II*\0', b'MM\0*'): # TIFF
+            buf += f.read(EXIF_READ_MAX - len(buf))
+            return parseExifDate(buf)
+    return None
+
+#-----------------------------------------------------------------------
+
+def parseExifDate(tiff):
+    """ Return the date when a photo was taken, from TIFF structure of
+    EXIF (DateTimeOriginal, DateTimeDigitized or DateTime).
+
+    Args:
+        tiff (bytes): Data starting with TIFF header.
+
+    Returns:
+        (str): Date in TS_FORMAT, or None if it's not found.
+    """
+    if tiff[:2] == b'II': bo = '<'
+    elif tiff[:2] == b'MM': bo = '>'
+    else: return None
+    dates = {}
+    def readIFD(offset):
+        exifOffset = None
+        n = unpack_from(bo+'H', tiff, offset)[0]
+        for k in range(n):
+            tag, typ, cnt, val = unpack_from(bo+'HHII', tiff, offset+2+12*k)
+            if tag == 0x8769: # pointer to EXIF IFD
+                exifOffset = val
+            elif tag in (0x9003, 0x9004, 0x0132) and typ == 2: # ASCII
+                if cnt <= 4: continue
+                dates[tag] = tiff[val:val+cnt].split(b'\0')[0]
+        return exifOffset
+    try:
+        exifOffset = readIFD(unpack_from(bo+'I', tiff, 4)[0])
+        if exifOffset != None: readIFD(exifOffset)
+    except StructError: # truncated or broken data
+        pass
+    for tag in (0x9003, 0x9004, 0x0132):
+        m = reExifDate.match(dates.get(tag, b''))
+        if m != None and m.group(1) != b'0000':
+            return "_".join([g.decode() for g in m.groups()])
+    return None
+
+reExifDate = re.compile(rb"(\d{4}):(\d\d):(\d\d) (\d\d):(\d\d):(\d\d)")
+
+#-----------------------------------------------------------------------
+
+def hashFile(fp):
+    """ Return SHA-256 of the content of a file. Large files are mapped
+    into memory, so that the whole content is hashed in one call 
+    (without copying into a buffer); others are read with a buffer.
+
+    Args:
+        fp (str): File path.
+
+    Returns:
+        (str): Hexadecimal digest.
+
+    Raises:
+        OSError: When the file can't be read.
+    """
+    h = sha256()
+    with open(fp, 'rb') as f:
+        if fstat(f.fileno()).st_size >= HASH_MMAP_MIN:
+            try:
+                with mmap(f.fileno(), 0, access=ACCESS_READ) as m:
+                    if hasattr(m, 'madvise'): m.madvise(MADV_SEQUENTIAL)
+                    h.update(m)
+                return h.hexdigest()
+            except (OSError, ValueError): # can't be mapped
+                f.seek(0)
+                h = sha256()
+        buf = bytearray(HASH_BUF)
+        view = memoryview(buf)
+        while True:
+            n = f.readinto(buf)
+            if not n: break
+            h.update(view[:n])
+    return h.hexdigest()
+
+#-----------------------------------------------------------------------
+
+def hashFiles(fpL):
+    """ Return SHA-256 of files; run in a worker process of MetaCache.
+
+    Args:
+        fpL (list): File paths.
+
+    Returns:
+        (list): Hexadecimal digest (or None, when a file can't be read)
+          of each file.
+    """
+    ret = []
+    for fp in fpL:
+        try:
+            ret.append(hashFile(fp))
+        except OSError as e:
+            if DEBUG: print(e)
+            ret.append(None)
+    return ret
+
+#=======================================================================
+
+class MetaCache(object):
+    """ Metadata (stat, EXIF date and content hash) of files for options
+    such as '[mtime]', '[exifDate]' and '[hash8]'. Metadata is read only
+    for files not in the cache; stat and EXIF in META_WORKERS threads, 
+    hashes in HASH_WORKERS processes. Stat results are kept until 
+    'clearStats' (when folders are scanned again); EXIF dates and 
+    hashes are kept with the modification time and size (and inode for
+    hashes) of the file, so that unchanged files are not read again.
+    With hashCacheFile, hashes are also kept in an SQLite file for 
+    later runs of the program.
+
+    Args:
+        hashCacheFile (str, optional): File path of persistent hashes.
+
+    Attributes:
+        stats (dict): os.stat_result (or None) of each file path.
+        exifDates (dict): (st_mtime_ns, st_size, EXIF date) of each 
+          file path.
+        hashes (dict): (st_size, st_mtime_ns, st_ino, SHA-256) of each
+          file path.
+
+    Examples:
+        >>> meta = MetaCache()
+        >>> nFileList = planNewPaths(fileList, '[exifDate]', meta=meta)
+    """
+    def __init__(self, hashCacheFile=None):
+        if DEBUG: print("MetaCache.__init__()")
+        self.stats = {}
+        self.exifDates = {}
+        self.hashes = {}
+        self.hashCacheFile = hashCacheFile
+        self.db = None # connection to hashCacheFile, opened when needed
+        self.lock = Lock()
+
+    #-------------------------------------------------------------------
+
+    def clearStats(self, fpL=None):
+        """ Discard stat results (such as after files are changed).
+
+        Args:
+            fpL (iterable, optional): File paths whose results are 
+              discarded; all results if it's None.
+
+        Returns: None
+        """
+        if DEBUG: print("MetaCache.clearStats()")
+        if fpL == None: 
+            self.stats = {}
+            return
+        for fp in fpL: self.stats.pop(fp, None)
+
+    #-------------------------------------------------------------------
+
+    def fetch(self, fileList, needExif=False, needHash=False, 
+              cancelEvent=None, nWorkers=META_WORKERS):
+        """ Read metadata of files which are not in the cache.
+
+        Args:
+            fileList (list): File paths.
+            needExif (bool, optional): Whether to read EXIF dates.
+            needHash (bool, optional): Whether to hash contents.
+            cancelEvent (threading.Event, optional): Reading stops, when 
+              it's set.
+            nWorkers (int, optional): Number of threads.
+
+        Returns: None
+
+        Raises:
+            Cancelled: When cancelEvent was set.
+        """
+        if DEBUG: print("MetaCache.fetch()")
+
+        stats = self.stats
+        exifDates = self.exifDates
+        def isCached(fp):
+            if not fp in stats: return False
+            if not needExif: return True
+            st = stats[fp]
+            if st == None: return True
+            e = exifDates.get(fp)
+            return e != None and e[:2] == (st.st_mtime_ns, st.st_size)
+        todo = [fp for fp in fileList if not isCached(fp)]
+        if todo != []: self.fetchStats(todo, needExif, cancelEvent, nWorkers)
+        if needHash: self.fetchHashes(fileList, cancelEvent)
+
+    #-------------------------------------------------------------------
+
+    def fetchStats(self, todo, needExif, cancelEvent, nWorkers):
+        """ Read stat (and EXIF dates) of files in threads.
+
+        Args:
+            todo (list): File paths.
+            needExif (bool): Whether to read EXIF dates.
+            cancelEvent (threading.Event): Reading stops, when it's set.
+            nWorkers (int): Number of threads.
+
+        Returns: None
+
+        Raises:
+            Cancelled: When cancelEvent was set.
+        """
+        stats = self.stats
+        exifDates = self.exifDates
+
+        def task(fpL):
+            ret = []
+            nExif = 0
+            for fp in fpL:
+                st = stats.get(fp)
+                try:
+                    if st == None: st = stat(fp)
+                    date = None
+                    if needExif:
+                        e = exifDates.get(fp)
+                        if e != None and e[:2] == (st.st_mtime_ns, 
+                                                   st.st_size):
+                            date = e[2]
+                        else:
+                            date = readExifDate(fp)
+                            nExif += 1
+                except OSError as e:
+                    if DEBUG: print(e)
+                    if st == None: ret.append((fp, None, None))
+                    else: ret.append((fp, st, None))
+                    continue
+                ret.append((fp, st, date))
+            traceOps("stat", len(fpL))
+            traceOps("read", nExif)
+            return ret
+
+        with traceSpan("meta") as sp:
+            sp.add(files=len(todo))
+            pool = ThreadPoolExecutor(max_workers=nWorkers)
+            try:
+                futures = [pool.submit(task, todo[i:i+META_CHUNK]) \
+                                for i in range(0, len(todo), META_CHUNK)]
+                for fut in futures:
+                    if cancelEvent != None and cancelEvent.is_set():
+                        raise Cancelled
+                    for fp, st, date in fut.result():
+                        stats[fp] = st
+                        if needExif and st != None:
+                            exifDates[fp] = (st.st_mtime_ns, st.st_size, 
+                                             date)
+            finally:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+    #-------------------------------------------------------------------
+
+    def fetchHashes(self, fileList, cancelEvent=None, nWorkers=HASH_WORKERS):
+        """ Hash contents of files (fetched already) which are not in 
+        the cache, in worker processes. Files are grouped into tasks of
+        about HASH_TASK_BYTES. Hashes finished before cancellation are 
+        kept.
+
+        Args:
+            fileList (list): File paths.
+            cancelEvent (threading.Event, optional): Hashing stops, when
+              it's set.
+            nWorkers (int, optional): Number of processes.
+
+        Returns: None
+
+        Raises:
+            Cancelled: When cancelEvent was set.
+        """
+        if DEBUG: print("MetaCache.fetchHashes()")
+
+        stats = self.stats
+        hashes = self.hashes
+        todo = [] # (file path, key)
+        for fp in fileList:
+            st = stats.get(fp)
+            if st == None: continue
+            key = (st.st_size, st.st_mtime_ns, st.st_ino)
+            h = hashes.get(fp)
+            if h == None or h[:3] != key: todo.append((fp, key))
+        if todo == []: return
+
+        with traceSpan("hash") as sp:
+            nTodo = len(todo)
+            todo = self.lookupHashes(todo)
+            sp.add(cached=nTodo-len(todo), files=len(todo))
+            if todo == []: return
+            tasks = [[]]
+            nBytes = 0
+            for item in todo:
+                if tasks[-1] != [] and (nBytes >= HASH_TASK_BYTES or \
+                                        len(tasks[-1]) >= HASH_TASK_FILES):
+                    tasks.append([])
+                    nBytes = 0
+                tasks[-1].append(item)
+                nBytes += item[1][0]
+            sp.add(bytes=sum([item[1][0] for item in todo]))
+            traceOps("read", len(todo))
+            # loaded only when files are hashed
+            from concurrent.futures import ProcessPoolExecutor
+            from multiprocessing import get_context
+            # 'spawn', as forking a process with threads (GUI) isn't safe
+            pool = ProcessPoolExecutor(max_workers=min(nWorkers, len(tasks)),
+                                       mp_context=get_context("spawn"))
+            rows = [] # hashed files
+            try:
+                futures = [pool.submit(hashFiles, [fp for fp, key in task]) \
+                                                            for task in tasks]
+                for task, fut in zip(tasks, futures):
+                    while True: # wait, checking cancellation
+                        if cancelEvent != None and cancelEvent.is_set():
+                            raise Cancelled
+                        try:
+                            ret = fut.result(timeout=0.2)
+                            break
+                        except FutureTimeout:
+                            pass
+                    for (fp, key), h in zip(task, ret):
+                        if h == None: continue
+                        hashes[fp] = key + (h,)
+                        rows.append((fp,) + key + (h,))
+            finally:
+                pool.shutdown(wait=False, cancel_futures=True)
+                self.storeHashes(rows)
+
+    #-------------------------------------------------------------------
+
+    def openHashCache(self):
+        """ Return connection to hashCacheFile; opened at the first call.
+        Must be called with self.lock.
+
+        Args: None
+
+        Returns:
+            (sqlite3.Connection): Connection, or None without 
+              hashCacheFile or when it can't be opened.
+        """
+        if self.db != None or self.hashCacheFile == None: return self.db
+        import sqlite3 # loaded only when the hash cache is used
+        try:
+            db = sqlite3.connect(self.hashCacheFile, check_same_thread=False)
+            db.execute("CREATE TABLE IF NOT EXISTS hashes (path TEXT"
+                       " PRIMARY KEY, size INTEGER, mtime INTEGER"
+                       ", ino INTEGER, hash TEXT, used REAL)")
+            db.commit()
+        except sqlite3.Error as e:
+            print("Hash cache is not used: %s"%(e), file=sys.stderr)
+            self.hashCacheFile = None
+            return None
+        self.db = db
+        return db
+
+    #-------------------------------------------------------------------
+
+    def lookupHashes(self, todo):
+        """ Get hashes of files from hashCacheFile.
+
+        Args:
+            todo (list): (file path, key) of files to be hashed.
+
+        Returns:
+            (list): (file path, key) of files not found.
+        """
+        with self.lock:
+            db = self.openHashCache()
+            if db == None: return todo
+            rest = []
+            t = time()
+            for fp, key in todo:
+                row = db.execute("SELECT size, mtime, ino, hash FROM hashes"
+                                 " WHERE path=?", (fp,)).fetchone()
+                if row != None and row[:3] == key:
+                    self.hashes[fp] = row
+                    db.execute("UPDATE hashes SET used=? WHERE path=?", 
+                               (t, fp))
+                else:
+                    rest.append((fp, key))
+            db.commit()
+        return rest
+
+    #-------------------------------------------------------------------
+
+    def storeHashes(self, rows):
+        """ Write hashes to hashCacheFile.
+
+        Args:
+            rows (list): (file path, size, mtime, inode, hash) of files.
+
+        Returns: None
+        """
+        if rows == []: return
+        t = time()
+        with self.lock:
+            db = self.openHashCache()
+            if db == None: return
+            db.executemany("INSERT OR REPLACE INTO hashes VALUES"
+                           " (?, ?, ?, ?, ?, ?)", 
+                           [row + (t,) for row in rows])
+            db.commit()
+
+    #-------------------------------------------------------------------
+
+    def close(self):
+        """ Remove hashes not used for HASH_CACHE_MAX_AGE seconds from 
+        hashCacheFile and close it.
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("MetaCache.close()")
+
+        with self.lock:
+            if self.db == None: return
+            self.db.execute("DELETE FROM hashes WHERE used<?", 
+                            (time()-HASH_CACHE_MAX_AGE,))
+            self.db.commit()
+            self.db.close()
+            self.db = None
+
+    #-------------------------------------------------------------------
+
+    def getValues(self, fp, tokens):
+        """ Return values of metadata options of a file.
+
+        Args:
+            fp (str): File path (fetched already).
+            tokens (set): Options to get.
+
+        Returns:
+            values (dict): Value (str) of each option in tokens.
+        """
+        st = self.stats.get(fp)
+        values = {}
+        if st == None:
+            for k in tokens: values[k] = META_NA
+            return values
+        if 'mtime' in tokens: 
+            values['mtime'] = strftime(TS_FORMAT, localtime(st.st_mtime))
+        if 'ctime' in tokens:
+            t = getattr(st, 'st_birthtime', st.st_ctime)
+            values['ctime'] = strftime(TS_FORMAT, localtime(t))
+        if 'size' in tokens: values['size'] = str(st.st_size)
+        if 'exifDate' in tokens:
+            e = self.exifDates.get(fp)
+            if e != None and e[2] != None: values['exifDate'] = e[2]
+            else: values['exifDate'] = strftime(TS_FORMAT, 
+                                                localtime(st.st_mtime))
+        if 'hash8' in tokens or 'hash' in tokens:
+            h = self.hashes.get(fp)
+            if h == None: h = META_NA
+            else: h = h[3]
+            values['hash8'] = h[:8]
+            values['hash'] = h
+        return values
+
+#=======================================================================
+
+class NewNameTemplate(object):
+    """ New file-name format, compiled once into literal strings and 
+    option tokens such as '[incNum]', so that rendering a file-name is
+    a single string formatting.
+
+    Args:
+        newForm (str): New file-name format such as '[oFileN]_[incNum]'.
+
+    Attributes:
+        newForm (str): New file-name format.
+        tokens (set): Options used in the format.
+        fmt (str): Format string for str.format_map.
+
+    Raises:
+        ValueError: When there's an unknown option in the format.
+
+    Examples:
+        >>> tmpl = NewNameTemplate('[folderN]_[incNum]')
+        >>> tmpl.render(dict(folderN='img', incNum='01'))
+        'img_01'
+    """
+    reToken = re.compile(r"\[(\w+)\]")
+
+    def __init__(self, newForm):
+        if DEBUG: print("NewNameTemplate.__init__()")
+
+        self.newForm = newForm
+        self.tokens = set()
+        fmt = [] 
+        unknown = []
+        parts = self.reToken.split(newForm) # literal, token, literal, ..
+        for i, s in enumerate(parts):
+            if i % 2 == 0: # literal string
+                fmt.append(s.replace("{", "{{").replace("}", "}}"))
+            else: # option token
+                if not s in NEW_FFOD: unknown.append("[%s]"%(s))
+                self.tokens.add(s)
+                fmt.append("{%s}"%(s))
+        if unknown != []:
+            msg = "Unknown option(s) in new file-name format: "
+            msg += ", ".join(unknown)
+            raise ValueError(msg)
+        self.fmt = "".join(fmt)
+
+    #-------------------------------------------------------------------
+
+    def render(self, values):
+        """ Return a file-name with the given option values.
+
+        Args:
+            values (dict): Replacement string of each option in tokens.
+
+        Returns:
+            (str): New file-name.
+        """
+        return self.fmt.format_map(values)
+
+#=======================================================================
+
+def naturalKey(name):
+    """ Return a sort key of a name, with which runs of digits are 
+    compared as numbers ('img2' before 'img10') and letters without case.
+
+    Args:
+        name (str): Name.
+
+    Returns:
+        (tuple): Text and numbers alternately, starting with text.
+
+    Examples:
+        >>> sorted(['img10', 'IMG2', 'img1'], key=naturalKey)
+        ['img1', 'IMG2', 'img10']
+    """
+    parts = RE_DIGITS.split(name.casefold())
+    parts[1::2] = map(int, parts[1::2])
+    return tuple(parts)
+
+#-----------------------------------------------------------------------
+
+def getNumberingOrder(fileList, sortBy='existing', meta=None):
+    """ Return indices of files in the order of numbering ('[incNum]', 
+    '[incNumInFolder]'). A key is computed once for each file and the 
+    (key, index) pairs are sorted; ties keep the existing order.
+    'mtime' and 'size' use stat results in meta (fetched already); 
+    files without them come last.
+
+    Args:
+        fileList (list/ PathList): File paths.
+        sortBy (str, optional): One of SORT_MODES; 'existing' (order of
+          scanning), 'natural' (folder, then file-name in natural order),
+          'mtime' or 'size'.
+        meta (MetaCache, optional): Cache with stat results of files.
+
+    Returns:
+        order (list/ range): Indices of fileList.
+
+    Raises:
+        ValueError: When sortBy is unknown.
+    """
+    if sortBy == 'existing': return range(len(fileList))
+    if sortBy == 'natural':
+        fileList = asPathList(fileList)
+        prefixes = fileList.prefixes
+        folderKeys = {} # key of each prefix; computed once per folder
+        decorated = []
+        for i, (k, bn) in enumerate(zip(fileList.dirI, fileList.names)):
+            fk = folderKeys.get(k)
+            if fk == None: fk = folderKeys[k] = naturalKey(prefixes[k])
+            decorated.append((fk, naturalKey(bn), i))
+    elif sortBy in ['mtime', 'size']:
+        stats = meta.stats
+        attr = dict(mtime='st_mtime_ns', size='st_size')[sortBy]
+        decorated = []
+        for i, fp in enumerate(fileList):
+            st = stats.get(fp)
+            if st == None: decorated.append((1, 0, i))
+            else: decorated.append((0, getattr(st, attr), i))
+    else:
+        raise ValueError("Unknown sort order: %s"%(sortBy))
+    decorated.sort()
+    return [item[-1] for item in decorated]
+
+#-----------------------------------------------------------------------
+
+@traced("plan", lambda ret, args: dict(files=len(ret)))
+def planNewPaths(fileList, newForm, folder2move="", cancelEvent=None,
+                 meta=None, sortBy='existing'):
+    """ Make new file paths of files with the new file-name format.
+    Metadata of files is read only when the format has its options.
+
+    Args:
+        fileList (list/ PathList): File paths to be renamed.
+        newForm (str/ NewNameTemplate): New file-name format such as 
+          '[oFileN]_[incNum]'.
+        folder2move (str, optional): Folder to move renamed files.
+          Renamed files stay in their folders if it's an empty string.
+        cancelEvent (threading.Event, optional): Planning stops, when 
+          it's set.
+        meta (MetaCache, optional): Cache of metadata of files.
+        sortBy (str, optional): Order of numbering; one of SORT_MODES
+          (see getNumberingOrder). New paths are in the order of 
+          fileList regardless of it.
+
+    Returns:
+        nFileList (PathList): New file paths, sharing the table of 
+          prefixes of fileList.
+
+    Raises:
+        Cancelled: When cancelEvent was set.
+        ValueError: When sortBy is unknown.
+    """
+    fileList = asPathList(fileList)
+    if isinstance(newForm, NewNameTemplate): tmpl = newForm
+    else: tmpl = NewNameTemplate(newForm)
+    tokens = tmpl.tokens
+    useOFN = 'oFileN' in tokens
+    useFolderN = 'folderN' in tokens
+    useIncNum = 'incNum' in tokens
+    useIncNumInFolder = 'incNumInFolder' in tokens
+    useTS = 'ts' in tokens
+    metaTokens = tokens & META_TOKENS
+    needStats = sortBy in ['mtime', 'size'] and \
+                (useIncNum or useIncNumInFolder)
+    if metaTokens or needStats:
+        if meta == None: meta = MetaCache()
+        meta.fetch(fileList, 
+                   'exifDate' in metaTokens, 
+                   'hash8' in metaTokens or 'hash' in metaTokens,
+                   cancelEvent)
+    if useIncNum or useIncNumInFolder:
+        order = getNumberingOrder(fileList, sortBy, meta)
+    elif not sortBy in SORT_MODES:
+        raise ValueError("Unknown sort order: %s"%(sortBy))
+    else: # numbers are not used; order doesn't matter
+        order = range(len(fileList))
+    
+    ### new file paths; same folders as files (or folder2move) and 
+    ###   new file-names
+    nFileList = PathList(shareWith=fileList)
+    if folder2move != "":
+    # there's a different folder path to move renamed files
+        k = nFileList.getPrefixIndex(path.join(folder2move, ""))
+        nFileList.dirI = array('I', [k]) * len(fileList)
+    else:
+        nFileList.dirI = array('I', fileList.dirI)
+    newNames = nFileList.names = [None] * len(fileList)
+    prefixes = fileList.prefixes
+    dirI = fileList.dirI
+    names = fileList.names
+    seps = [sep for sep in [path.sep, path.altsep] if sep != None]
+    values = {} # replacement string of each option
+    zeroPadN = len(str(len(fileList)))
+    prevK = None # prefix index of the previous file
+    incNInFolder = {} # last number of each folder (prefix index)
+    for n, i in enumerate(order):
+        if cancelEvent != None and n % CANCEL_CHECK_INTERVAL == 0 and \
+          cancelEvent.is_set(): 
+            raise Cancelled
+        k = dirI[i]
+        bn = names[i]
+        oFExt = bn.rpartition('.')[2] # origianl file extension
+        if k != prevK: # folder changed
+            if useFolderN: 
+                values['folderN'] = path.basename(path.dirname(prefixes[k]))
+            prevK = k
+        if useOFN: values['oFileN'] = bn.partition('.')[0]
+        if useIncNum: values['incNum'] = str(n+1).zfill(zeroPadN)
+        if useIncNumInFolder:
+            c = incNInFolder.get(k, 0) + 1
+            incNInFolder[k] = c
+            values['incNumInFolder'] = str(c).zfill(zeroPadN)
+        if useTS: values['ts'] = get_time_stamp()
+        if metaTokens: 
+            values.update(meta.getValues(prefixes[k] + bn, metaTokens))
+        newFN = "%s.%s"%(tmpl.render(values), oFExt)
+        for sep in seps:
+            if sep in newFN: # new file-name with folders
+                nFP = path.join(prefixes[nFileList.dirI[i]], newFN)
+                nFileList.setPath(i, nFP)
+                break
+        else:
+            newNames[i] = newFN # store the new file-name
+    return nFileList
+
+#-----------------------------------------------------------------------
+
+@traced("findConflicts", lambda ret, args: dict(files=len(args[1]), 
+                                                conflicts=len(ret)))
+def listFolderNames(prefix):
+    """ Return file-names in a folder, for checking whether files exist
+    (see findConflicts). Names are normalized with path.normcase.
+
+    Args:
+        prefix (str): Folder path with a trailing separator.
+
+    Returns:
+        (set): File-names; empty if the folder doesn't exist, 
+          None if it can't be listed.
+    """
+    try:
+        with scandir(prefix or '.') as it: 
+            return set([path.normcase(de.name) for de in it])
+    except (FileNotFoundError, NotADirectoryError):
+        return set()
+    except OSError:
+        return None
+
+#-----------------------------------------------------------------------
+
+def findConflicts(fileList, nFileList, cancelEvent=None, existsCache=None):
+    """ Find renaming which would overwrite a file; two or more files 
+    with the same new file path, or a new file path which is already 
+    used by a file not being renamed. 
+    Uses hash sets of file-names in each folder (see PathList), so it 
+    takes linear time without making full paths. Each folder of new 
+    file paths (such as the move-to folder) is listed once, instead of
+    checking each new file path on disk.
+
+    Args:
+        fileList (list/ PathList): File paths to be renamed.
+        nFileList (list/ PathList): New file paths.
+        cancelEvent (threading.Event, optional): Checking stops, when 
+          it's set.
+        existsCache (dict, optional): Whether each new file path exists
+          (dict of file-name to bool, of each prefix index of fileList);
+          paths in it are not checked on disk again and checked paths 
+          are added (see ScanCache.existsCache).
+
+    Returns:
+        conflicts (list): (index, reason) of conflicting files.
+
+    Raises:
+        Cancelled: When cancelEvent was set.
+    """
+    fileList = asPathList(fileList)
+    nFileList = asPathList(nFileList, fileList)
+    srcNames = {} # file-names (set) of each prefix index
+    for k, bn in zip(fileList.dirI, fileList.names):
+        nameSet = srcNames.get(k)
+        if nameSet == None: srcNames[k] = nameSet = set()
+        nameSet.add(bn)
+    firstIdx = {} # index of the first file with each new file-name,
+                  #   of each prefix index
+    dupIdx = set() # indices of files with duplicate new file path
+    conflicts = []
+    listed = {} # file-names (set) on disk of each prefix index
+    nLexists = 0 # number of checked new file paths on disk
+    for i, (k, bn) in enumerate(zip(nFileList.dirI, nFileList.names)):
+        if cancelEvent != None and i % CANCEL_CHECK_INTERVAL == 0 and \
+          cancelEvent.is_set(): 
+            raise Cancelled
+        first = firstIdx.get(k)
+        if first == None: firstIdx[k] = first = {}
+        j = first.setdefault(bn, i)
+        if j != i: 
+            dupIdx.add(j)
+            dupIdx.add(i)
+        elif not bn in srcNames.get(k, ()):
+            if existsCache == None: 
+                exists = None
+            else:
+                known = existsCache.get(k)
+                if known == None: existsCache[k] = known = {}
+                exists = known.get(bn)
+            if exists == None:
+                if not k in listed: 
+                    listed[k] = listFolderNames(nFileList.prefixes[k])
+                if listed[k] != None: 
+                    exists = path.normcase(bn) in listed[k]
+                else: # folder can't be listed
+                    nLexists += 1
+                    exists = path.lexists(nFileList[i])
+                if existsCache != None: known[bn] = exists
+            if exists:
+                conflicts.append((i, "New file path already exists"))
+    traceOps("scandir", len(listed))
+    traceOps("lstat", nLexists)
+    for i in sorted(dupIdx):
+        conflicts.append((i, "Same new file path as another file"))
+    conflicts.sort()
+    return conflicts
+
+#-----------------------------------------------------------------------
+
+def hashFilePart(fp, size):
+    """ Return SHA-256 of the head and tail (DEDUP_PART bytes each) of 
+    a file; of the whole content, if it's not larger than both.
+
+    Args:
+        fp (str): File path.
+        size (int): Size of the file.
+
+    Returns:
+        (str): Hexadecimal digest.
+
+    Raises:
+        OSError: When the file can't be read.
+    """
+    h = sha256()
+    with open(fp, 'rb') as f:
+        if size <= 2 * DEDUP_PART:
+            h.update(f.read())
+        else:
+            h.update(f.read(DEDUP_PART))
+            f.seek(size - DEDUP_PART)
+            h.update(f.read(DEDUP_PART))
+    return h.hexdigest()
+
+#-----------------------------------------------------------------------
+
+def findDuplicates(fileList, meta=None, cancelEvent=None, 
+                   nWorkers=META_WORKERS, sortBy='existing'):
+    """ Find files with the same content as another file in the list.
+    Files are compared in stages, so that most files are not read; 
+    files with a unique size are not compared at all, files with the 
+    same size are compared with hashes of their head and tail (read in 
+    threads), and only files with the same partial hash are hashed 
+    fully (MetaCache.fetchHashes). Hard links of the same file are 
+    duplicates without reading. Empty files are not duplicates.
+
+    Args:
+        fileList (list): File paths.
+        meta (MetaCache, optional): Cache of metadata of files.
+        cancelEvent (threading.Event, optional): Comparing stops, when 
+          it's set.
+        nWorkers (int, optional): Number of threads for partial hashes.
+        sortBy (str, optional): Order of numbering (see 
+          getNumberingOrder), in which the first file is chosen.
+
+    Returns:
+        dupOf (dict): Index of the first file (in fileList) with the 
+          same content of each duplicate file.
+
+    Raises:
+        Cancelled: When cancelEvent was set.
+        ValueError: When sortBy is unknown.
+    """
+    if DEBUG: print("findDuplicates()")
+
+    if meta == None: meta = MetaCache()
+    meta.fetch(fileList, cancelEvent=cancelEvent)
+    stats = meta.stats
+    rank = None # position of each file in the order of numbering
+    if sortBy != 'existing':
+        rank = [0] * len(fileList)
+        for r, i in enumerate(getNumberingOrder(fileList, sortBy, meta)): 
+            rank[i] = r
+        rank = rank.__getitem__
+    with traceSpan("dedup") as sp:
+        ### group by size, then by file (hard links)
+        bySize = {}
+        for i, fp in enumerate(fileList):
+            st = stats.get(fp)
+            if st == None or st.st_size == 0: continue
+            bySize.setdefault(st.st_size, []).append(i)
+        dupOf = {}
+        todo = [] # files to be compared with partial hashes
+        for iL in bySize.values():
+            if len(iL) < 2: continue
+            first = {}
+            for i in sorted(iL, key=rank):
+                st = stats[fileList[i]]
+                j = first.setdefault((st.st_dev, st.st_ino), i)
+                if j != i: dupOf[i] = j
+            if len(first) > 1: todo += sorted(first.values(), key=rank)
+        sp.add(files=len(fileList), sameSize=len(todo))
+
+        ### group by partial hash
+        def task(iL):
+            ret = []
+            for i in iL:
+                fp = fileList[i]
+                try:
+                    ret.append(hashFilePart(fp, stats[fp].st_size))
+                except OSError as e:
+                    if DEBUG: print(e)
+                    ret.append(None)
+            traceOps("read", len(iL))
+            return ret
+        byPart = {}
+        pool = ThreadPoolExecutor(max_workers=nWorkers)
+        try:
+            tasks = [todo[k:k+META_CHUNK] \
+                            for k in range(0, len(todo), META_CHUNK)]
+            futures = [pool.submit(task, iL) for iL in tasks]
+            for iL, fut in zip(tasks, futures):
+                if cancelEvent != None and cancelEvent.is_set():
+                    raise Cancelled
+                for i, h in zip(iL, fut.result()):
+                    if h == None: continue
+                    size = stats[fileList[i]].st_size
+                    byPart.setdefault((size, h), []).append(i)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        ### confirm with full hashes
+        full = [] # files with the same partial hash, larger than the part
+        for (size, h), iL in byPart.items():
+            if len(iL) < 2: continue
+            iL.sort(key=rank)
+            if size <= 2 * DEDUP_PART: # whole content was hashed
+                for i in iL[1:]: dupOf[i] = iL[0]
+            else:
+                full += iL
+        sp.add(partialHashed=len(todo), fullHashed=len(full))
+        meta.fetchHashes([fileList[i] for i in full], cancelEvent)
+        byFull = {}
+        for i in sorted(full, key=rank):
+            h = meta.hashes.get(fileList[i])
+            if h == None: continue
+            j = byFull.setdefault(h[3], i)
+            if j != i: dupOf[i] = j
+        for i in dupOf: # a hard link of a duplicate
+            while dupOf[i] in dupOf: dupOf[i] = dupOf[dupOf[i]]
+        sp.add(duplicates=len(dupOf))
+    return dupOf
+
+#-----------------------------------------------------------------------
+
+@traced("orderRenames", lambda ret, args: dict(files=len(args[0]), 
+                                               steps=len(ret)))
+def orderRenames(fileList, nFileList):
+    """ Return order of renaming, so that no file is overwritten when
+    a new file path is the current path of another file to be renamed.
+    Chains such as a->b, b->c are renamed from the end (b->c, a->b).
+    A cycle such as a->b, b->a is renamed in two phases through a 
+    temporary file-name (a->tmp, b->a, tmp->b).
+    Independent files (not in chains or cycles; most of files) come 
+    first, grouped by their folder and new folder (in the order of 
+    first appearance), so that files are renamed folder by folder
+    (see DirRenamer).
+    New file paths should have no conflicts (see findConflicts).
+    Files are compared by prefix index and file-name (see PathList), 
+    without making full paths.
+
+    Args:
+        fileList (list/ PathList): File paths to be renamed.
+        nFileList (list/ PathList): New file paths.
+
+    Returns:
+        steps (list): Indices of files in renaming order. 
+          -(index+1) appears twice for a file in a cycle; the first one
+          is renaming to a temporary name and the second one is 
+          renaming from it to the new file path. 
+          Files with the same new path as the current path are omitted.
+    """
+    fileList = asPathList(fileList)
+    nFileList = asPathList(nFileList, fileList)
+    dirI = fileList.dirI
+    names = fileList.names
+    nDirI = nFileList.dirI
+    nNames = nFileList.names
+    moved = [] # indices of files to be renamed (new path is different)
+    srcIdx = {} # index of each file-name to be renamed, of each prefix
+    for i, k in enumerate(dirI):
+        if k == nDirI[i] and names[i] == nNames[i]: continue
+        moved.append(i)
+        idx = srcIdx.get(k)
+        if idx == None: srcIdx[k] = idx = {}
+        idx[names[i]] = i
+    nextIdx = {} # index of file, which should be renamed before the file 
+    hasPrev = set()
+    for i in moved:
+        idx = srcIdx.get(nDirI[i])
+        if idx == None: continue
+        j = idx.get(nNames[i])
+        if j != None and j != i:
+            nextIdx[i] = j
+            hasPrev.add(j)
+    groups = {} # independent files of each (folder, new folder)
+    chainSteps = []
+    visited = set()
+    for i in moved:
+        if i in hasPrev: continue
+        if not i in nextIdx: # independent file (most of files)
+            key = (dirI[i], nDirI[i])
+            group = groups.get(key)
+            if group == None: groups[key] = [i]
+            else: group.append(i)
+            continue
+        chain = [i]
+        while chain[-1] in nextIdx: chain.append(nextIdx[chain[-1]])
+        visited.update(chain)
+        chainSteps += reversed(chain)
+    steps = []
+    for group in groups.values(): steps += group
+    steps += chainSteps
+    for i in nextIdx: # remaining files are in cycles
+        if i in visited: continue
+        cycle = [i]
+        j = nextIdx[i]
+        while j != i:
+            cycle.append(j)
+            j = nextIdx[j]
+        visited.update(cycle)
+        steps.append(-(i+1)) # to temporary file-name
+        steps += reversed(cycle[1:])
+        steps.append(-(i+1)) # from temporary file-name
+    return steps
+
+#-----------------------------------------------------------------------
+
+def getCopyTmpPath(newFP, runID):
+    """ Return the temporary file path, to which a file is copied 
+    before being moved to newFP across file systems (see moveFile).
+
+    Args:
+        newFP (str): New file path.
+        runID (str): ID of the run.
+
+    Returns:
+        (str): Temporary file path in the folder of newFP.
+    """
+    h = sha1(newFP.encode('utf-8', 'surrogateescape')).hexdigest()[:16]
+    return path.join(path.dirname(newFP), 
+                     "%s%s_copy_%s"%(TMP_PREFIX, runID, h))
+
+#-----------------------------------------------------------------------
+
+def copyFileData(fSrc, fDst, size, cancelEvent=None):
+    """ Copy data of a file in the kernel (os.copy_file_range, or 
+    os.sendfile on Linux), falling back to copying with a bounded 
+    buffer where these are not supported.
+
+    Args:
+        fSrc (file): Source file opened for reading in binary mode.
+        fDst (file): Destination file opened for writing in binary mode.
+        size (int): Number of bytes to copy.
+        cancelEvent (threading.Event, optional): Copying stops when
+          it's set.
+
+    Returns:
+        copied (int): Number of copied bytes.
+
+    Raises:
+        Cancelled: When cancelEvent was set.
+    """
+    if DEBUG: print("copyFileData()")
+
+    def checkCancel():
+        if cancelEvent != None and cancelEvent.is_set(): raise Cancelled()
+
+    fdSrc = fSrc.fileno()
+    fdDst = fDst.fileno()
+    copied = 0
+    if copy_file_range != None:
+        try:
+            while copied < size:
+                checkCancel()
+                n = copy_file_range(fdSrc, fdDst, min(COPY_CHUNK, size-copied),
+                                    copied, copied)
+                if n == 0: break # end of file
+                copied += n
+            return copied
+        except OSError as e:
+            if not e.errno in COPY_FALLBACK_ERRNO: raise
+    if sendfile != None and sys.platform.startswith('linux'):
+        try:
+            fDst.seek(copied) # sendfile writes at the file position
+            while copied < size:
+                checkCancel()
+                n = sendfile(fdDst, fdSrc, copied, min(COPY_CHUNK, size-copied))
+                if n == 0: break
+                copied += n
+            return copied
+        except OSError as e:
+            if not e.errno in COPY_FALLBACK_ERRNO: raise
+    fSrc.seek(copied)
+    fDst.seek(copied)
+    while copied < size:
+        checkCancel()
+        buf = fSrc.read(min(COPY_BUF, size-copied))
+        if not buf: break
+        fDst.write(buf)
+        copied += len(buf)
+    fDst.flush()
+    return copied
+
+#-----------------------------------------------------------------------
+
+def copyFile(fp, newFP, cancelEvent=None):
+    """ Copy a file with its metadata (permission, timestamps, flags, 
+    extended attributes and owner if permitted), without following 
+    a symbolic link. Data is synced to disk. 
+    The copy is removed when copying failed or was cancelled.
+
+    Args:
+        fp (str): File path.
+        newFP (str): Path of the copy, which must not exist.
+        cancelEvent (threading.Event, optional): Copying stops when
+          it's set.
+
+    Returns:
+        st (os.stat_result): Stat of the file before copying.
+
+    Raises:
+        OSError: When copying failed.
+        Cancelled: When cancelEvent was set.
+    """
+    if DEBUG: print("copyFile()")
+
+    traceOps("copy")
+    st = lstat(fp)
+    created = False
+    try:
+        if S_ISLNK(st.st_mode):
+            symlink(readlink(fp), newFP)
+            created = True
+        else:
+            with open(fp, 'rb') as fSrc, open(newFP, 'xb') as fDst:
+                created = True
+                copyFileData(fSrc, fDst, st.st_size, cancelEvent)
+                fsync(fDst.fileno())
+        copystat(fp, newFP, follow_symlinks=False)
+        if chown != None:
+            try: chown(newFP, st.st_uid, st.st_gid, follow_symlinks=False)
+            except OSError: pass # not permitted; keep the current owner
+    except BaseException:
+        if created and path.lexists(newFP): remove(newFP)
+        raise
+    return st
+
+#-----------------------------------------------------------------------
+
+def moveFile(fp, newFP, runID, cancelEvent=None, srcStat=None, 
+             crossDevice=False):
+    """ Move (rename) a file. 
+    When it's moved across file systems, the file is copied (see 
+    copyFile) to a temporary file next to newFP, which is renamed to 
+    newFP after verifying it, and then the original file is removed. 
+    If the original file can't be removed, the copy is removed.
+
+    Args:
+        fp (str): File path.
+        newFP (str): New file path.
+        runID (str): ID of the run, for the temporary file-name.
+        cancelEvent (threading.Event, optional): Copying stops when
+          it's set.
+        srcStat (os.stat_result, optional): Stat of the file, if it's
+          already copied to the temporary file path (see FileMover).
+        crossDevice (bool, optional): Whether renaming is known to fail
+          across file systems (EXDEV); the file is copied without trying
+          to rename it.
+
+    Returns: None
+
+    Raises:
+        OSError: When moving failed.
+        Cancelled: When cancelEvent was set while copying.
+    """
+    tmpFP = getCopyTmpPath(newFP, runID)
+    if srcStat == None:
+        if not crossDevice:
+            try:
+                traceOps("rename")
+                rename(fp, newFP)
+                return
+            except OSError as e:
+                if e.errno != EXDEV: raise
+        srcStat = copyFile(fp, tmpFP, cancelEvent)
+    try:
+        st = lstat(fp)
+        if (st.st_size, st.st_mtime_ns) != (srcStat.st_size, 
+                                            srcStat.st_mtime_ns) or \
+          lstat(tmpFP).st_size != srcStat.st_size:
+            raise OSError("File changed while copying to another file system")
+        traceOps("rename")
+        rename(tmpFP, newFP)
+    except OSError:
+        if path.lexists(tmpFP): remove(tmpFP)
+        raise
+    try:
+        remove(fp)
+    except OSError as e:
+        remove(newFP)
+        raise OSError("Original file can't be removed after copying; %s"%(e))
+
+#=======================================================================
+
+def splitPath(fp):
+    """ Return folder path and base name of a file path; as path.split,
+    but faster where there's no alternative separator (it's called for
+    every renamed file).
+
+    Args:
+        fp (str): File path.
+
+    Returns:
+        dp (str): Folder path ('' for a relative path without folder).
+        bn (str): Base name.
+    """
+    if path.altsep != None: return path.split(fp)
+    dp, sep, bn = fp.rpartition(path.sep)
+    if dp == '' and sep != '': dp = sep # file in the root folder
+    return dp, bn
+
+#=======================================================================
+
+class DirRenamer(object):
+    """ Renaming files relative to descriptors of their folders 
+    (renameat with base names), so that the kernel doesn't resolve all
+    components of both full paths for every file; it's costly with deep
+    paths, especially on network file systems. Descriptors of the last 
+    DIR_FD_MAX used folders are kept open, so files should be renamed
+    folder by folder (see orderRenames).
+    Files are renamed with full paths, where it's not supported 
+    (DIR_FD_RENAME) or when 'enabled' is False.
+
+    Args:
+        enabled (bool, optional): Whether to use folder descriptors.
+        maxFDs (int, optional): Number of folder descriptors kept open.
+
+    Examples:
+        >>> renamer = DirRenamer()
+        >>> renamer.rename('/data/a/1.jpg', '/data/a/img_1.jpg')
+        >>> renamer.close()
+    """
+    def __init__(self, enabled=True, maxFDs=DIR_FD_MAX):
+        if DEBUG: print("DirRenamer.__init__()")
+
+        self.enabled = enabled and DIR_FD_RENAME
+        self.maxFDs = maxFDs
+        self.fds = {} # descriptor of each folder, in order of last use
+        self.lastDP = None # folder of the last call of getFD
+        self.lastFD = None
+
+    #-------------------------------------------------------------------
+
+    def getFD(self, dp):
+        """ Return descriptor of a folder, opening it if it's not open.
+
+        Args:
+            dp (str): Folder path.
+
+        Returns:
+            (int): File descriptor.
+
+        Raises:
+            OSError: When the folder can't be opened.
+        """
+        if dp == self.lastDP: return self.lastFD # same as the last call
+        fd = self.fds.pop(dp, None)
+        if fd == None:
+            fd = openFD(dp or '.', O_RDONLY|O_DIRECTORY)
+            traceOps("open")
+            if len(self.fds) >= self.maxFDs: # close the least recently used
+                close(self.fds.pop(next(iter(self.fds))))
+        self.fds[dp] = fd
+        self.lastDP = dp
+        self.lastFD = fd
+        return fd
+
+    #-------------------------------------------------------------------
+
+    def rename(self, fp, newFP):
+        """ Rename a file.
+
+        Args:
+            fp (str): File path.
+            newFP (str): New file path.
+
+        Returns: None
+
+        Raises:
+            OSError: When renaming failed.
+        """
+        traceOps("rename")
+        if not self.enabled: 
+            rename(fp, newFP)
+            return
+        dp, bn = splitPath(fp)
+        newDP, newBN = splitPath(newFP)
+        rename(bn, newBN, src_dir_fd=self.getFD(dp), 
+               dst_dir_fd=self.getFD(newDP))
+
+    #-------------------------------------------------------------------
+
+    def close(self):
+        """ Close folder descriptors.
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("DirRenamer.close()")
+
+        for fd in self.fds.values(): close(fd)
+        self.fds = {}
+        self.lastDP = None
+        self.lastFD = None
+
+#=======================================================================
+
+class FileMover(object):
+    """ Moving files (see moveFile), copying files across file systems 
+    concurrently ahead of moving them. A runner calls 'prefetch' for 
+    upcoming files and 'move' in renaming order; prefetched copies 
+    are only renamed to the new file paths (and original files removed) 
+    by 'move', so the order of renaming doesn't change.
+    Data is copied in the kernel where possible, so memory use doesn't 
+    depend on file sizes. Files on the same file system are renamed 
+    with DirRenamer.
+
+    Args:
+        runID (str): ID of the run, for temporary file-names.
+        nWorkers (int, optional): Number of concurrent copies.
+        cancelEvent (threading.Event, optional): Copying stops when
+          it's set.
+        dirFD (bool, optional): Whether to rename files relative to 
+          folder descriptors (see DirRenamer).
+
+    Attributes:
+        renamer (DirRenamer): Renamer of files on the same file system.
+    """
+    def __init__(self, runID, nWorkers=COPY_WORKERS, cancelEvent=None,
+                 dirFD=True):
+        if DEBUG: print("FileMover.__init__()")
+
+        self.runID = runID
+        self.cancelEvent = cancelEvent
+        self.renamer = DirRenamer(dirFD)
+        self.pool = ThreadPoolExecutor(max_workers=nWorkers)
+        self.copies = {} # future of copy of each (file-path, new file-path)
+        self.devs = {} # device of each folder
+
+    #-------------------------------------------------------------------
+
+    def isCrossDevice(self, fp, newFP):
+        """ Whether fp and newFP are on different file systems.
+        It's judged by their folders, which are stat-ed once.
+
+        Args:
+            fp (str): File path.
+            newFP (str): New file path.
+
+        Returns:
+            (bool): True if they are on different file systems.
+        """
+        devs = []
+        for dp in [splitPath(fp)[0], splitPath(newFP)[0]]:
+            if not dp in self.devs:
+                try: self.devs[dp] = stat(dp or '.').st_dev
+                except OSError: self.devs[dp] = None
+            devs.append(self.devs[dp])
+        return None not in devs and devs[0] != devs[1]
+
+    #-------------------------------------------------------------------
+
+    def prefetch(self, fp, newFP):
+        """ Start copying a file in background, if it'll be moved 
+        across file systems.
+
+        Args:
+            fp (str): File path.
+            newFP (str): New file path.
+
+        Returns: None
+        """
+        if (fp, newFP) in self.copies or not self.isCrossDevice(fp, newFP):
+            return
+        self.copies[(fp, newFP)] = self.pool.submit(
+                                            copyFile, 
+                                            fp, 
+                                            getCopyTmpPath(newFP, self.runID),
+                                            self.cancelEvent)
+
+    #-------------------------------------------------------------------
+
+    def move(self, fp, newFP, flagCancel=True):
+        """ Move a file, waiting for its copy if it was prefetched.
+
+        Args:
+            fp (str): File path.
+            newFP (str): New file path.
+            flagCancel (bool, optional): Whether it can be cancelled 
+              while copying (when it's not prefetched).
+
+        Returns: None
+
+        Raises:
+            OSError: When moving failed.
+            Cancelled: When cancelled while copying.
+        """
+        future = self.copies.pop((fp, newFP), None)
+        if future != None:
+            moveFile(fp, newFP, self.runID, srcStat=future.result())
+            return
+        try:
+            self.renamer.rename(fp, newFP)
+            return
+        except OSError as e:
+            if e.errno != EXDEV: raise
+        if flagCancel: cancelEvent = self.cancelEvent
+        else: cancelEvent = None
+        moveFile(fp, newFP, self.runID, cancelEvent, crossDevice=True)
+
+    #-------------------------------------------------------------------
+
+    def close(self):
+        """ Stop copying and remove copies, which were not used.
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("FileMover.close()")
+
+        self.renamer.close()
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        for (fp, newFP), future in self.copies.items():
+            if future.cancelled() or future.exception() != None: continue
+            tmpFP = getCopyTmpPath(newFP, self.runID)
+            if path.lexists(tmpFP): remove(tmpFP)
+        self.copies = {}
+
+#=======================================================================
+
+class RenameJournal(object):
+    """ Write-ahead journal of a renaming run. 
+    All renaming operations (intents) of a run are written and synced 
+    to disk before renaming starts. Their results are buffered and 
+    flushed to OS every JOURNAL_FLUSH_OPS results or JOURNAL_FLUSH_SEC
+    seconds, and synced to disk once per batch, when paused or 
+    cancelled (see RenameRunner.run). Results not flushed are judged 
+    from the files on disk by recoverJournal. 
+    The journal file is removed when the run ends normally, so 
+    an existing journal file means an interrupted run 
+    (see readJournal and recoverJournal).
+    Each line is a JSON list; 
+      ["B", run ID], ["I", op. number, file-path, new file-path], 
+      ["D", op. number], ["F", op. number, error message]
+
+    Args:
+        journalFile (str, optional): Journal file path.
+    """
+    def __init__(self, journalFile=JOURNAL_FILE):
+        if DEBUG: print("RenameJournal.__init__()")
+
+        self.journalFile = journalFile
+        self.f = None
+        self.nOps = 0 # number of recorded operations
+        self.nPending = 0 # number of results not flushed
+        self.flushTime = time() # time of the last flush
+
+    #-------------------------------------------------------------------
+
+    def write(self, rec):
+        """ Write a record (without syncing).
+
+        Args:
+            rec (list): Record to write.
+
+        Returns: None
+        """
+        self.f.write(json.dumps(rec) + "\n")
+
+    #-------------------------------------------------------------------
+
+    def writeResult(self, rec):
+        """ Write a result record, flushing buffered results every 
+        JOURNAL_FLUSH_OPS results or JOURNAL_FLUSH_SEC seconds.
+
+        Args:
+            rec (list): Record to write.
+
+        Returns: None
+        """
+        self.write(rec)
+        self.nPending += 1
+        if self.nPending >= JOURNAL_FLUSH_OPS or \
+          time() - self.flushTime >= JOURNAL_FLUSH_SEC:
+            self.flush()
+
+    #-------------------------------------------------------------------
+
+    def flush(self):
+        """ Flush written records to OS.
+
+        Args: None
+
+        Returns: None
+        """
+        self.f.flush()
+        self.nPending = 0
+        self.flushTime = time()
+
+    #-------------------------------------------------------------------
+
+    def sync(self):
+        """ Flush written records to disk.
+
+        Args: None
+
+        Returns: None
+        """
+        self.flush()
+        fsync(self.f.fileno())
+        traceOps("fsync")
+
+    #-------------------------------------------------------------------
+
+    def begin(self, runID):
+        """ Start a journal of a run.
+
+        Args:
+            runID (str): ID of the run.
+
+        Returns: None
+
+        Raises:
+            FileExistsError: When there's a journal of an interrupted run.
+        """
+        if DEBUG: print("RenameJournal.begin()")
+
+        self.f = open(self.journalFile, 'x', encoding='utf-8')
+        self.write(["B", runID])
+        self.sync()
+
+    #-------------------------------------------------------------------
+
+    def addIntents(self, ops, flagSync=True):
+        """ Record renaming operations to carry out.
+
+        Args:
+            ops (list): (file-path, new file-path) of operations.
+            flagSync (bool, optional): Whether to sync to disk.
+
+        Returns:
+            k (int): Operation number of the first operation.
+        """
+        k = self.nOps
+        for fp, newFP in ops:
+            self.write(["I", self.nOps, fp, newFP])
+            self.nOps += 1
+        if flagSync: self.sync()
+        return k
+
+    #-------------------------------------------------------------------
+
+    def done(self, k):
+        """ Record that an operation was carried out.
+
+        Args:
+            k (int): Operation number.
+
+        Returns: None
+        """
+        self.writeResult(["D", k])
+
+    #-------------------------------------------------------------------
+
+    def failed(self, k, msg):
+        """ Record that an operation failed.
+
+        Args:
+            k (int): Operation number.
+            msg (str): Error message.
+
+        Returns: None
+        """
+        self.writeResult(["F", k, msg])
+
+    #-------------------------------------------------------------------
+
+    def end(self):
+        """ The run ended normally; remove the journal file.
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("RenameJournal.end()")
+
+        self.f.close()
+        self.f = None
+        remove(self.journalFile)
+
+    #-------------------------------------------------------------------
+
+    def close(self):
+        """ Close the journal file, if it's open 
+        (the file is kept for recovery).
+
+        Args: None
+
+        Returns: None
+        """
+        if self.f != None:
+            self.sync()
+            self.f.close()
+            self.f = None
+
+#-----------------------------------------------------------------------
+
+def readJournal(journalFile=JOURNAL_FILE):
+    """ Read the journal of an interrupted run.
+
+    Args:
+        journalFile (str, optional): Journal file path.
+
+    Returns:
+        runID (str): ID of the interrupted run; None if there's no 
+          journal file.
+        ops (list): [file-path, new file-path, state] of recorded 
+          operations. state is 'D' (done), 'F' (failed) or None 
+          (unknown).
+    """
+    if DEBUG: print("readJournal()")
+
+    if not path.isfile(journalFile): return None, []
+    runID = ""
+    ops = []
+    with open(journalFile, 'r', encoding='utf-8') as f:
+        for line in f:
+            try: rec = json.loads(line)
+            except ValueError: break # incomplete last line
+            if rec[0] == "B": runID = rec[1]
+            elif rec[0] == "I": ops.append([rec[2], rec[3], None])
+            elif rec[0] in ["D", "F"]: ops[rec[1]][2] = rec[0]
+    return runID, ops
+
+#-----------------------------------------------------------------------
+
+def recoverJournal(forward=True, journalFile=JOURNAL_FILE, logFile=LOG_FILE):
+    """ Recover files of an interrupted run, by finishing the 
+    renaming of the run (roll forward) or by renaming files back to 
+    their original paths (roll back). Results are flushed in batches 
+    (see RenameJournal), so results of the last operations can be 
+    missing; they are judged from the files on disk, from the last 
+    operation backwards, so that a path used again by a later 
+    operation (chains and cycles) is judged correctly.
+    No file is overwritten. Copies of unfinished moving across 
+    file systems are removed.
+    Rolling forward logs renaming as a part of the interrupted run, 
+    including done operations which the run didn't log before it was 
+    interrupted. Rolling back logs renaming with its own run ID 
+    (the run ID and ROLLBACK_SUFFIX), so that makeUndoRunner doesn't
+    rename back files of the run which were already rolled back.
+    The journal file is removed after recovery.
+
+    Args:
+        forward (bool, optional): Roll forward if True, roll back if False.
+        journalFile (str, optional): Journal file path.
+        logFile (str, optional): Log file path.
+
+    Returns:
+        nRenamed (int): Number of renamed files.
+        errors (list): (file-path, error message) of files, which 
+          couldn't be recovered.
+    """
+    if DEBUG: print("recoverJournal()")
+
+    runID, ops = readJournal(journalFile)
+    if runID == None: return 0, []
+    laterFrom = set() # paths, from which later operations were done
+    laterTo = set() # paths, to which later operations were done
+    for op in reversed(ops): # judge operations without recorded results
+        if op[2] == None:
+            if (path.lexists(op[1]) or op[1] in laterFrom) and \
+              (not path.lexists(op[0]) or op[0] in laterTo):
+                op[2] = "D"
+        if op[2] == "D":
+            laterFrom.add(op[0])
+            laterTo.add(op[1])
+    for op in ops: # remove copies of unfinished moving across file systems
+        tmpFP = getCopyTmpPath(op[1], runID)
+        if op[2] == None and path.lexists(tmpFP): remove(tmpFP)
+    def isTmp(fp): return path.basename(fp).startswith(TMP_PREFIX)
+    nRenamed = 0
+    errors = []
+    if forward:
+        logged = Counter() # renaming logged by the run before interrupted
+        try: logged.update(readRunLog(runID, logFile))
+        except (KeyError, ValueError): pass
+        log = RenameLog(runID, logFile) # log as a part of the interrupted run
+    else:
+        log = RenameLog(runID + ROLLBACK_SUFFIX, logFile)
+    try:
+        if forward:
+            tmpOrig = {} # original path of each temporary path
+            for fp, newFP, state in ops:
+                if isTmp(newFP): tmpOrig[newFP] = fp
+                if state == "F": continue
+                if state == None:
+                    try:
+                        if path.lexists(newFP): 
+                            raise OSError("New file path already exists")
+                        moveFile(fp, newFP, runID)
+                    except OSError as e:
+                        errors.append((fp, str(e)))
+                        continue
+                    if not isTmp(newFP): nRenamed += 1
+                origFP = tmpOrig.get(fp, fp)
+                if isTmp(newFP) or origFP == newFP: continue
+                if logged[(origFP, newFP)] > 0: # already logged
+                    logged[(origFP, newFP)] -= 1
+                else:
+                    log.write(origFP, newFP)
+        else:
+            tmpFrom = {} # path, from which a file moved to temporary path
+            for fp, newFP, state in reversed(ops):
+                if state != "D": continue
+                try:
+                    if path.lexists(fp): 
+                        raise OSError("Original file path already exists")
+                    moveFile(newFP, fp, runID)
+                except OSError as e:
+                    errors.append((newFP, str(e)))
+                    continue
+                if isTmp(fp): 
+                    tmpFrom[fp] = newFP
+                    continue
+                nRenamed += 1
+                log.write(tmpFrom.get(newFP, newFP), fp)
+    finally:
+        log.close()
+    remove(journalFile)
+    return nRenamed, errors
+
+#=======================================================================
+
+class RenameRunner(object):
+    """ Renaming files, which can be paused, resumed or cancelled from 
+    another thread while 'run' is running.
+    Renamed files are logged even when renaming was cancelled or 
+    interrupted, so the log matches with the files on disk.
+    Nothing is renamed when there's a conflict (see findConflicts), and
+    files are renamed in the order of orderRenames. Pausing and 
+    cancelling wait until no file is left with a temporary name.
+    All renaming is recorded in the journal (RenameJournal) before 
+    renaming, so an interrupted run can be recovered with 
+    recoverJournal. The log is written as files are renamed.
+    Files moved to another file system are copied and removed (see 
+    FileMover), several files concurrently ahead of renaming.
+    A duplicate file in linkTo (see findDuplicates) is renamed after 
+    other files; its new path is made a hard link of the renamed file 
+    with the same content, and the duplicate is removed (see linkFile).
+
+    Args:
+        fileList (list): File paths to be renamed.
+        nFileList (list): New file paths.
+        logFile (str, optional): Log file path.
+        journalFile (str, optional): Journal file path.
+        linkTo (dict, optional): Index of the file with the same 
+          content of each duplicate file.
+        dirFD (bool, optional): Whether to rename files relative to 
+          folder descriptors (see DirRenamer).
+
+    Attributes:
+        runID (str): ID of the run; timestamp and process ID.
+        nDone (int): Number of processed files (renamed or failed).
+        renamed (list): Indices of renamed files.
+        linked (list): Indices of renamed files, which were linked.
+        errors (list): (index, error message) of files failed to rename.
+        nUnchanged (int): Number of files, whose new path is the same.
+        conflicts (list): (index, reason) of conflicting files.
+        startTime (float): Time when renaming started.
+        endTime (float): Time when renaming ended.
+        cancelled (bool): Whether renaming was cancelled.
+
+    Examples:
+        >>> runner = RenameRunner(fileList, nFileList)
+        >>> Thread(target=runner.run).start()
+        >>> runner.pause(); runner.resume(); runner.cancel()
+    """
+    def __init__(self, fileList, nFileList, logFile=LOG_FILE,
+                 journalFile=JOURNAL_FILE, linkTo=None, dirFD=True):
+        if DEBUG: print("RenameRunner.__init__()")
+
+        self.fileList = fileList
+        self.nFileList = nFileList
+        self.logFile = logFile
+        self.journalFile = journalFile
+        if linkTo == None: linkTo = {}
+        self.linkTo = linkTo
+        self.dirFD = dirFD
+        self.runID = None
+        self.nDone = 0
+        self.renamed = []
+        self.linked = []
+        self.errors = []
+        self.conflicts = []
+        self.startTime = None
+        self.endTime = None
+        self.cancelled = False
+        self.nUnchanged = 0
+        self.cancelEvent = Event()
+        self.resumeEvent = Event() # cleared while paused
+        self.resumeEvent.set()
+
+    #-------------------------------------------------------------------
+
+    @traced("rename", lambda ret, args: dict(files=len(args[0].fileList),
+                                             renamed=len(args[0].renamed),
+                                             failed=len(args[0].errors)))
+    def run(self, progressFunc=None):
+        """ Rename files.
+
+        Args:
+            progressFunc (function, optional): Function to be called 
+              after each renaming with (index, number of files, 
+              file-path, new file-path).
+
+        Returns:
+            (bool): False if nothing was renamed due to conflicts.
+        """
+        self.conflicts = findConflicts(self.fileList, self.nFileList)
+        if self.conflicts != []: return False
+        steps = orderRenames(self.fileList, self.nFileList)
+
+        fileList = self.fileList
+        nFileList = self.nFileList
+        nFiles = len(fileList)
+        linkTo = self.linkTo
+        toLink = set() # duplicates to be linked
+        if linkTo != {}:
+        # move duplicates to the end, unless another file is renamed 
+        # to their paths (then they're renamed as usual)
+            pL = asPathList(fileList)
+            nPL = asPathList(nFileList, pL)
+            nSet = set(zip(nPL.dirI, nPL.names)) # (prefix index, file-name)
+            toLink = set([i for i in steps if i in linkTo and \
+                          not (pL.dirI[i], pL.names[i]) in nSet])
+            steps = [i for i in steps if not i in toLink] + \
+                    [i for i in steps if i in toLink]
+        self.nUnchanged = nFiles - len(set(steps)) # files with no change
+        blocked = set() # paths still used by files failed to rename
+        tmpOK = False # whether renaming to temporary file-name succeeded
+        inCycle = False # whether a file of a cycle has a temporary name
+        self.runID = "%s_%i"%(get_time_stamp(True), getpid())
+        journal = RenameJournal(self.journalFile)
+        log = RenameLog(self.runID, self.logFile)
+        mover = FileMover(self.runID, cancelEvent=self.cancelEvent, 
+                          dirFD=self.dirFD)
+        self.startTime = time()
+        try:
+            journal.begin(self.runID)
+            for batch in self.iterBatches(steps): # record all renaming
+                journal.addIntents([(op[2], op[3]) for op in batch], False)
+            journal.sync()
+            k = 0 # operation number in the journal
+            for batch in self.iterBatches(steps):
+                nAhead = 0 # operations checked for copying ahead
+                aheadInCycle = False # whether nAhead is in a cycle
+                for p, (i, kind, fp, newFP) in enumerate(batch):
+                    if not inCycle: # cancel/pause only without temporary file
+                        if self.isPaused(): journal.sync()
+                        self.resumeEvent.wait() # wait while paused
+                        if self.cancelEvent.is_set():
+                            self.cancelled = True
+                            break
+                    while nAhead < len(batch) and nAhead <= p + COPY_AHEAD:
+                        op = batch[nAhead]
+                        if op[1] == 1: aheadInCycle = True
+                        elif op[1] == 2: aheadInCycle = False
+                        elif not aheadInCycle and not op[0] in toLink: 
+                        # files in cycles are not copied ahead, as copies
+                        #   are cancelled with cancelEvent
+                            mover.prefetch(op[2], op[3])
+                        nAhead += 1
+                    if kind == 1: # rename to temporary file-name
+                        inCycle = True # until renaming from it (kind 2)
+                        try:
+                            mover.renamer.rename(fp, newFP)
+                            tmpOK = True
+                            journal.done(k)
+                        except OSError as e:
+                            self.errors.append((i, str(e)))
+                            blocked.add(fp)
+                            journal.failed(k, str(e))
+                        k += 1
+                        continue
+                    if kind == 2:
+                        inCycle = False
+                        if not tmpOK: # already failed
+                            journal.failed(k, "Skipped")
+                            k += 1
+                            self.nDone += 1
+                            continue
+                        tmpOK = False
+                    try:
+                        if newFP in blocked:
+                            msg = "New file path is still used by a file"
+                            msg += " failed to rename"
+                            if kind == 2: msg += "; file is at %s"%(fp)
+                            raise OSError(msg)
+                        if i in toLink and \
+                          self.linkFile(fp, newFP, nFileList[linkTo[i]]):
+                            self.linked.append(i)
+                        else:
+                            mover.move(fp, newFP, kind == 0 and not inCycle)
+                    except Cancelled: # while copying across file systems
+                        self.cancelled = True
+                        break
+                    except OSError as e:
+                        msg = str(e)
+                        journal.failed(k, msg)
+                        if kind == 2 and not path.lexists(fileList[i]):
+                        # move file in temporary name back to its original path
+                            kR = journal.addIntents([(fp, fileList[i])])
+                            try:
+                                mover.renamer.rename(fp, fileList[i])
+                                journal.done(kR)
+                                fp = fileList[i]
+                                msg = msg.split("; file is at")[0]
+                            except OSError as e2:
+                                journal.failed(kR, str(e2))
+                        self.errors.append((i, msg))
+                        if fp == fileList[i]: blocked.add(fp)
+                        else: # left with temporary name
+                            log.write(fileList[i], fp)
+                    else:
+                        journal.done(k)
+                        self.renamed.append(i)
+                        log.write(fileList[i], newFP)
+                    k += 1
+                    self.nDone += 1
+                    if progressFunc != None: 
+                        progressFunc(self.nDone-1, nFiles, fileList[i], newFP)
+                journal.sync()
+                log.flush()
+                if self.cancelled: break
+            journal.end()
+        finally:
+            if not self.cancelled: self.nDone += self.nUnchanged
+            self.endTime = time()
+            mover.close()
+            journal.close()
+            log.close()
+        return True
+
+    #-------------------------------------------------------------------
+
+    def linkFile(self, fp, newFP, targetFP):
+        """ Instead of renaming a duplicate file, make its new path a 
+        hard link of the renamed file with the same content and remove 
+        the duplicate. Contents are compared again right before, as 
+        files could have changed since duplicates were found. 
+        If the link is made, but not the removal, the new path has the 
+        same content as the duplicate, so the journal can be recovered.
+
+        Args:
+            fp (str): File path of the duplicate.
+            newFP (str): New file path of the duplicate.
+            targetFP (str): Renamed file with the same content.
+
+        Returns:
+            (bool): False, when the file should be renamed as usual 
+              (such as the target is not renamed or the file system 
+              doesn't support hard links).
+
+        Raises:
+            OSError: When the duplicate couldn't be removed.
+        """
+        try:
+            if not path.samefile(fp, targetFP) and \
+              not compareFiles(fp, targetFP, shallow=False):
+                return False
+            link(targetFP, newFP)
+        except OSError as e:
+            if DEBUG: print(e)
+            return False
+        traceOps("link")
+        try:
+            remove(fp)
+        except OSError:
+            remove(newFP)
+            raise
+        return True
+
+    #-------------------------------------------------------------------
+
+    def iterBatches(self, steps):
+        """ Yield renaming operations of steps from orderRenames, 
+        in batches for the journal. A batch always includes both 
+        renaming to and from a temporary file-name of a file in a cycle.
+
+        Args:
+            steps (list): Renaming order from orderRenames.
+
+        Yields:
+            batch (list): (index, kind, file-path, new file-path) of 
+              renaming operations. kind is 0 for a normal renaming, 
+              1 for renaming to a temporary file-name and 2 for renaming 
+              from it.
+        """
+        if DEBUG: print("RenameRunner.iterBatches()")
+
+        batch = []
+        tmpFP = None
+        for step in steps:
+            if step >= 0:
+                batch.append((step, 0, self.fileList[step], self.nFileList[step]))
+            elif tmpFP == None:
+                i = -step - 1
+                tmpFP = path.join(path.dirname(self.fileList[i]), 
+                                  "%s%s_%i"%(TMP_PREFIX, self.runID, i))
+                batch.append((i, 1, self.fileList[i], tmpFP))
+            else:
+                i = -step - 1
+                batch.append((i, 2, tmpFP, self.nFileList[i]))
+                tmpFP = None
+            if tmpFP == None and len(batch) >= JOURNAL_BATCH:
+                yield batch
+                batch = []
+        if batch != []: yield batch
+
+    #-------------------------------------------------------------------
+
+    def pause(self):
+        """ Pause renaming after the current file.
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("RenameRunner.pause()")
+        self.resumeEvent.clear()
+
+    #-------------------------------------------------------------------
+
+    def resume(self):
+        """ Resume paused renaming.
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("RenameRunner.resume()")
+        self.resumeEvent.set()
+
+    #-------------------------------------------------------------------
+
+    def isPaused(self):
+        """ Return whether renaming is paused.
+
+        Args: None
+
+        Returns:
+            (bool): True if paused.
+        """
+        return not self.resumeEvent.is_set()
+
+    #-------------------------------------------------------------------
+
+    def cancel(self):
+        """ Cancel renaming after the current file 
+        (even when it's paused).
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("RenameRunner.cancel()")
+        self.cancelEvent.set()
+        self.resumeEvent.set()
+
+    #-------------------------------------------------------------------
+
+    def getSpeed(self):
+        """ Return renaming speed and estimated remaining time.
+
+        Args: None
+
+        Returns:
+            fps (float): Files per second.
+            eta (float): Estimated remaining time in seconds. 
+              None, when it can't be estimated yet.
+        """
+        if self.startTime == None: return 0.0, None
+        if self.endTime == None: elapsed = time() - self.startTime
+        else: elapsed = self.endTime - self.startTime
+        if elapsed <= 0 or self.nDone == 0: return 0.0, None
+        fps = self.nDone / elapsed
+        eta = (len(self.fileList) - self.nDone) / fps
+        return fps, eta
+
+    #-------------------------------------------------------------------
+
+    def getSummary(self):
+        """ Return summary of the run.
+
+        Args: None
+
+        Returns:
+            summary (dict): Numbers of files ('nFiles', 'nRenamed', 
+              'nFailed', 'nUnchanged' and 'nNotDone'; not processed due
+              to cancelling), 'elapsed' time in seconds and 'fps' 
+              (files per second).
+        """
+        nFiles = len(self.fileList)
+        nRenamed = len(self.renamed)
+        nFailed = len(self.errors)
+        nUnchanged = self.nUnchanged
+        if self.startTime == None: elapsed = 0.0
+        elif self.endTime == None: elapsed = time() - self.startTime
+        else: elapsed = self.endTime - self.startTime
+        return dict(nFiles=nFiles,
+                    nRenamed=nRenamed,
+                    nFailed=nFailed,
+                    nUnchanged=nUnchanged,
+                    nNotDone=nFiles - nRenamed - nFailed - nUnchanged,
+                    elapsed=elapsed,
+                    fps=self.getSpeed()[0])
+
+    #-------------------------------------------------------------------
+
+    def writeReport(self, reportFile):
+        """ Write result of each file to a report file; tab-separated 
+        status ('renamed', 'linked', 'failed', 'unchanged' or 
+        'not done'), file path, new file path and message.
+
+        Args:
+            reportFile (str): Report file path.
+
+        Returns: None
+        """
+        if DEBUG: print("RenameRunner.writeReport()")
+
+        errors = dict(self.errors)
+        renamed = set(self.renamed)
+        linked = set(self.linked)
+        with open(reportFile, 'w', encoding='utf-8', 
+                  errors='surrogateescape') as f:
+            f.write("Status\tFile\tNew file\tMessage\n")
+            for i, fp in enumerate(self.fileList):
+                newFP = self.nFileList[i]
+                msg = ""
+                if i in linked: 
+                    status = "linked"
+                    msg = "Same content as %s"%(self.fileList[self.linkTo[i]])
+                elif i in renamed: status = "renamed"
+                elif i in errors: 
+                    status = "failed"
+                    msg = errors[i]
+                elif fp == newFP: status = "unchanged"
+                else: status = "not done"
+                f.write("%s\t%s\t%s\t%s\n"%(status, fp, newFP, msg))
+
+#=======================================================================
+
+def runRenaming(fileList, nFileList, logFile=LOG_FILE, 
+                journalFile=JOURNAL_FILE, progressFunc=None, linkTo=None):
+    """ Rename files and write the results in the log file.
+
+    Args:
+        fileList (list): File paths to be renamed.
+        nFileList (list): New file paths.
+        logFile (str, optional): Log file path.
+        journalFile (str, optional): Journal file path.
+        progressFunc (function, optional): Function to be called after
+          each renaming with (index, number of files, file-path,
+          new file-path).
+        linkTo (dict, optional): See RenameRunner.
+
+    Returns:
+        runner (RenameRunner): Finished runner with results.
+    """
+    if DEBUG: print("runRenaming()")
+
+    runner = RenameRunner(fileList, nFileList, logFile, journalFile, linkTo)
+    runner.run(progressFunc)
+    return runner
+
+#-----------------------------------------------------------------------
+
+def makeUndoRunner(runID, logFile=LOG_FILE, journalFile=JOURNAL_FILE):
+    """ Make a runner to undo renaming of a past run, renaming its 
+    files back in reverse order. It's a normal run, so it's checked for
+    conflicts, journaled and logged with a new run ID.
+    Files of an interrupted run, which were rolled back 
+    (see recoverJournal), are not included.
+
+    Args:
+        runID (str): ID of the run to undo.
+        logFile (str, optional): Log file path.
+        journalFile (str, optional): Journal file path.
+
+    Returns:
+        runner (RenameRunner): Runner to undo the run.
+
+    Raises:
+        KeyError: When there's no run with the ID.
+        ValueError: When a log line can't be parsed unambiguously.
+    """
+    if DEBUG: print("makeUndoRunner()")
+
+    pairs = readRunLog(runID, logFile)
+    pairs.reverse()
+    if runID + ROLLBACK_SUFFIX in readLogIndex(logFile):
+        back = Counter([(newFP, fp) for fp, newFP in \
+                        readRunLog(runID + ROLLBACK_SUFFIX, logFile)])
+        kept = []
+        for pair in pairs:
+            if back[pair] > 0: back[pair] -= 1 # already rolled back
+            else: kept.append(pair)
+        pairs = kept
+    fileList = [newFP for fp, newFP in pairs]
+    nFileList = [fp for fp, newFP in pairs]
+    return RenameRunner(fileList, nFileList, logFile, journalFile)
+
+#-----------------------------------------------------------------------
+
+def main(argv=None):
+    """ Run renaming without GUI (headless mode).
+
+    Args:
+        argv (list, optional): Command line arguments.
+          sys.argv[1:] is used if it's None.
+
+    Returns:
+        (int): Exit status.
+
+    Examples:
+        $ python pyFileRen.py --headless -f /data/a /data/b -t "*.jpg"
+            -n "[folderN]_[incNum]" -s -m /data/renamed
+    """
+    if DEBUG: print("main()")
+
+    if argv == None: argv = sys.argv[1:]
+    for stream in [sys.stdout, sys.stderr]:
+    # print file paths which are not valid UTF-8 with their bytes
+        if hasattr(stream, 'reconfigure'): 
+            stream.reconfigure(errors='surrogateescape')
+    parser = argparse.ArgumentParser(
+                            prog="pyFileRen.py --headless",
+                            description="Rename a batch of files without GUI.",
+                                    )
+    parser.add_argument("--headless", action="store_true",
+                        help=argparse.SUPPRESS)
+    parser.add_argument("-f", "--folders", nargs="+", default=[],
+                        help="Folders for renaming.")
+    parser.add_argument("-t", "--target", default="*.*",
+                        help="Target files; wildcard patterns separated by "
+                             "';', 're:' for a regular expression "
+                             "(e.g. '*.jpg;*.png;re:IMG_\\d+\\.tif').")
+    parser.add_argument("-n", "--new-name", default="[oFileN]",
+                        help="New file-name format without extension. "
+                             "Options: " + \
+                             ", ".join(["[%s]"%(k) for k in NEW_FFO]))
+    parser.add_argument("-s", "--sub-folders", action="store_true",
+                        help="Include sub-folders.")
+    parser.add_argument("-j", "--workers", type=int, default=SCAN_WORKERS,
+                        help="Number of threads for listing folders.")
+    parser.add_argument("--index", nargs="?", const=SCAN_INDEX_FILE, 
+                        metavar="FILE",
+                        help="Use a persistent index of folders, so that "
+                             "unchanged folders are not listed again.")
+    parser.add_argument("--hash-cache", nargs="?", const=HASH_CACHE_FILE, 
+                        metavar="FILE",
+                        help="Keep hashes of file contents ([hash8], "
+                             "[hash]) in a file, so that unchanged files "
+                             "are not hashed again.")
+    parser.add_argument("--dedup", choices=DEDUP_MODES,
+                        help="Find files with the same content; skip "
+                             "renaming duplicates (skip), make their new "
+                             "paths hard links of the first file (link) "
+                             "or only report them (report).")
+    parser.add_argument("--sort", choices=SORT_MODES, default="existing",
+                        help="Order of numbering ([incNum], "
+                             "[incNumInFolder]); order of scanning "
+                             "(existing), natural order of names "
+                             "(img2 before img10), modification time or "
+                             "size.")
+    parser.add_argument("-m", "--move-to", default="",
+                        help="Folder to move renamed files.")
+    parser.add_argument("-l", "--log", default=LOG_FILE,
+                        help="Log file path.")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Print new file paths without renaming.")
+    parser.add_argument("--recover", choices=["forward", "back"],
+                        help="Recover an interrupted run by finishing it "
+                             "(forward) or by renaming files back (back).")
+    parser.add_argument("--journal", default=JOURNAL_FILE,
+                        help="Journal file path.")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="Write timing of stages to a trace file "
+                             "(Chrome trace format).")
+    parser.add_argument("--report", metavar="FILE",
+                        help="Write result of each file to a report file.")
+    parser.add_argument("--list-runs", action="store_true",
+                        help="List past runs in the log.")
+    parser.add_argument("--undo", metavar="RUN_ID",
+                        help="Undo renaming of a past run "
+                             "('last' for the last run).")
+    args = parser.parse_args(argv)
+    if args.trace != None: enableTrace(args.trace)
+
+    runID, ops = readJournal(args.journal)
+    if args.recover != None:
+        if runID == None:
+            print("There's no interrupted run.")
+            return 0
+        nRenamed, errors = recoverJournal(args.recover == "forward",
+                                          args.journal,
+                                          args.log)
+        for fp, msg in errors:
+            print("Failed: %s; %s"%(fp, msg), file=sys.stderr)
+        print("Recovered run %s; renamed %i files."%(runID, nRenamed))
+        if errors != []: return 1
+        return 0
+    elif runID != None:
+        msg = "Run %s was interrupted (%i renaming operations recorded)."%(
+                                                            runID, len(ops))
+        msg += " Please run again with '--recover forward' or"
+        msg += " '--recover back'."
+        print(msg, file=sys.stderr)
+        return 1
+
+    if args.list_runs:
+        for runID, sections in readLogIndex(args.log).items():
+            print("%s\t%i files"%(runID, sum([s[2] for s in sections])))
+        return 0
+
+    def progress(i, nFiles, fp, newFP):
+        print("[%i/%i] %s --->> %s"%(i+1, nFiles, fp, newFP), flush=True)
+
+    def printConflicts(fileList, nFileList, conflicts):
+        for i, msg in conflicts:
+            print("Conflict: %s --->> %s; %s"%(fileList[i], nFileList[i], msg),
+                  file=sys.stderr)
+        print("Nothing renamed due to %i conflicts."%(len(conflicts)), 
+              file=sys.stderr)
+
+    def report(runner):
+        if runner.conflicts != []:
+            printConflicts(runner.fileList, runner.nFileList, runner.conflicts)
+            return 1
+        for i, msg in runner.errors:
+            print("Failed: %s; %s"%(runner.fileList[i], msg), file=sys.stderr)
+        if args.report != None: runner.writeReport(args.report)
+        s = runner.getSummary()
+        print("Renamed %i files."%(s["nRenamed"]), flush=True)
+        if runner.linked != []:
+            print("%i duplicate files were linked."%(len(runner.linked)))
+        print("Failed %i, unchanged %i, not done %i; %.1f s, %.1f files/s"%(
+                    s["nFailed"], s["nUnchanged"], s["nNotDone"], 
+                    s["elapsed"], s["fps"]), flush=True)
+        if runner.errors != []: return 1
+        return 0
+
+    if args.undo != None:
+        runID = args.undo
+        if runID == "last":
+            runIDs = list(readLogIndex(args.log).keys())
+            if runIDs == []:
+                print("There's no run in the log.", file=sys.stderr)
+                return 1
+            runID = runIDs[-1]
+        try:
+            runner = makeUndoRunner(runID, args.log, args.journal)
+        except KeyError:
+            print("There's no run %s in the log."%(runID), file=sys.stderr)
+            return 1
+        except (ValueError, OSError) as e:
+            print(e, file=sys.stderr)
+            return 1
+        print("Undo run %s; %i files"%(runID, len(runner.fileList)), 
+              flush=True)
+        runner.run(progress)
+        return report(runner)
+
+    if args.folders == []: 
+        parser.error("the following arguments are required: -f/--folders")
+    ### absolute paths are logged, so that the run can be undone 
+    ###   from any working folder
+    args.folders = [path.abspath(dp) for dp in args.folders]
+    if args.move_to != "": args.move_to = path.abspath(args.move_to)
+    for dp in args.folders + [args.move_to]:
+        if dp != "" and not path.isdir(dp):
+            print("Folder doesn't exist: %s"%(dp), file=sys.stderr)
+            return 1
+
+    try:
+        getNameMatcher(args.target) # validate target file-name
+        tmpl = NewNameTemplate(args.new_name)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    index = None
+    if args.index != None: index = ScanIndex(args.index)
+    try:
+        folders, fileList = scanFolders(args.folders, 
+                                        args.target, 
+                                        args.sub_folders,
+                                        args.workers,
+                                        index=index)
+    finally:
+        if index != None: index.close()
+    print("%i folders, %i files"%(len(folders), len(fileList)), flush=True)
+    meta = MetaCache(args.hash_cache)
+    dupOf = {}
+    try:
+        if args.dedup != None: 
+        # duplicates are found (and skipped) before numbering files
+            dupOf = findDuplicates(fileList, meta, sortBy=args.sort)
+            print("%i duplicate files"%(len(dupOf)), flush=True)
+            if args.dedup == "report" or args.dry_run:
+                for i in sorted(dupOf):
+                    print("Duplicate: %s == %s"%(fileList[i], 
+                                                 fileList[dupOf[i]]))
+            if args.dedup == "skip":
+                keep = [i for i in range(len(fileList)) if not i in dupOf]
+                fileList = fileList.select(keep)
+            if args.dedup != "link": dupOf = {}
+        nFileList = planNewPaths(fileList, tmpl, args.move_to, meta=meta,
+                                 sortBy=args.sort)
+    finally:
+        meta.close()
+
+    if args.dry_run:
+        for i, fp in enumerate(fileList):
+            print("%s --->> %s"%(fp, nFileList[i]))
+        conflicts = findConflicts(fileList, nFileList)
+        if conflicts != []:
+            printConflicts(fileList, nFileList, conflicts)
+            return 1
+        return 0
+
+    runner = runRenaming(fileList, nFileList, args.log, args.journal, progress,
+                         dupOf)
+    return report(runner)
+
+#-----------------------------------------------------------------------
+
+if __name__ == "__main__":
+    sys.exit(main())
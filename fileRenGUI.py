@@ -0,0 +1,1739 @@
+# coding: UTF-8
+
+"""
+fileRenGUI
+wxPython GUI of pyFileRenamer. 
+This module is imported by 'pyFileRen.py' only when a window is 
+opened, so that wx is not loaded for other entry points.
+
+Jinook Oh, Cognitive Biology department, University of Vienna
+September 2019.
+
+Dependency:
+    wxPython (4.0)
+
+------------------------------------------------------------------------
+Copyright (C) 2019 Jinook Oh, W. Tecumseh Fitch 
+- Contact: jinook.oh@univie.ac.at, tecumseh.fitch@univie.ac.at
+
+This program is free software: you can redistribute it and/or modify it 
+under the terms of the GNU General Public License as published by the 
+Free Software Foundation, either version 3 of the License, or (at your 
+option) any later version.
+
+This program is distributed in the hope that it will be useful, but 
+WITHOUT ANY WARRANTY; without even the implied warranty of 
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU 
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License along 
+with this program.  If not, see <http://www.gnu.org/licenses/>.
+------------------------------------------------------------------------
+"""
+
+import sys
+from os import path, getcwd
+from time import time
+from threading import Thread, Event
+
+import wx
+import wx.lib.scrolledpanel as SPanel 
+
+from fileRenEngine import NEW_FFO, NEW_FFOD, LOG_FILE, JOURNAL_FILE
+from fileRenEngine import SCAN_WORKERS, HASH_CACHE_FILE, DEDUP_MODES
+from fileRenEngine import SORT_MODES
+from fileRenEngine import Cancelled, ScanCache, ScanIndex, getNameMatcher
+from fileRenEngine import NewNameTemplate, planNewPaths, findConflicts
+from fileRenEngine import findDuplicates
+from fileRenEngine import RenameRunner, readJournal, recoverJournal
+from fileRenEngine import readLogIndex, makeUndoRunner
+from fileRenTrace import traceSpan
+
+DEBUG = False 
+CWD = getcwd()
+ICON_FILE = path.join(path.dirname(path.abspath(__file__)), "icon.ico")
+
+#-----------------------------------------------------------------------
+
+def getWXFonts(initFontSz=8, numFonts=5, fSzInc=2, fontFaceName=""):
+    """ For setting up several fonts (wx.Font) with increasing size.
+
+    Args:
+        initFontSz (int): Initial (the smallest) font size.
+        numFonts (int): Number of fonts to return.
+        fSzInc (int): Increment of font size.
+        fontFaceName (str, optional): Font face name.
+
+    Returns:
+        fonts (list): List of several fonts (wx.Font)
+
+    Examples:
+        >>> fonts = getWXFonts(8, 3, fSzInc=2)
+    """
+    if DEBUG: print("getWXFonts()")
+
+    if fontFaceName == "":
+        if 'darwin' in sys.platform: fontFaceName = "Monaco"
+        else: fontFaceName = "Courier"
+    fontSz = initFontSz 
+    fonts = []  # larger fonts as index gets larger 
+    for i in range(numFonts):
+        fonts.append(
+                        wx.Font(
+                                fontSz, 
+                                wx.FONTFAMILY_SWISS, 
+                                wx.FONTSTYLE_NORMAL, 
+                                wx.FONTWEIGHT_BOLD,
+                                False, 
+                                faceName=fontFaceName,
+                               )
+                    )
+        fontSz += fSzInc 
+    return fonts
+
+#-----------------------------------------------------------------------
+
+def setupStaticText(panel, label, name=None, size=None, 
+                    wrapWidth=None, font=None, fgColor=None, bgColor=None):
+    """ Initialize wx.StatcText widget with more options
+    
+    Args:
+        panel (wx.Panel): Panel to display wx.StaticText.
+        label (str): String to show in wx.StaticText.
+        name (str, optional): Name of the widget.
+        size (tuple, optional): Size of the widget.
+        wrapWidth (int, optional): Width for text wrapping.
+        font (wx.Font, optional): Font for wx.StaticText.
+        fgColor (wx.Colour, optional): Foreground color 
+        bgColor (wx.Colour, optional): Background color 
+
+    Returns:
+        wx.StaticText: Created wx.StaticText object.
+
+    Examples:
+        >>> self.sTxt1 = setupStaticText(self.panel, 'Test')
+    """ 
+    if DEBUG: print("setupStaticText()")
+
+    sTxt = wx.StaticText(panel, -1, label)
+    if name != None: sTxt.SetName(name)
+    if size != None: sTxt.SetSize(size)
+    if wrapWidth != None: sTxt.Wrap(wrapWidth)
+    if font != None: sTxt.SetFont(font)
+    if fgColor != None: sTxt.SetForegroundColour(fgColor) 
+    if bgColor != None: sTxt.SetBackgroundColour(bgColor)
+    return sTxt
+
+#-----------------------------------------------------------------------
+
+def updateFrameSize(wxFrame, w_sz):
+    """ Set window size exactly to a user-defined window size (w_sz)
+    , excluding counting menubar/border/etc.
+
+    Args:
+        wxFrame (wx.Frame): Frame to resize.
+        w_sz (tuple): Client size. 
+
+    Returns:
+        None
+
+    Examples:
+        >>> updateFrameSize(self, (800,600))
+    """
+    if DEBUG: print("updateFrameSize()")
+
+    ### set window size to w_sz, excluding counting menubar/border/etc.
+    _diff = (wxFrame.GetSize()[0]-wxFrame.GetClientSize()[0], 
+             wxFrame.GetSize()[1]-wxFrame.GetClientSize()[1])
+    _sz = (w_sz[0]+_diff[0], w_sz[1]+_diff[1])
+    wxFrame.SetSize(_sz) 
+    wxFrame.Refresh()
+
+#-----------------------------------------------------------------------
+
+#=======================================================================
+
+class FileListCtrl(wx.ListCtrl):
+    """ Virtual list to show files to be renamed and their new file 
+    paths. Only rows on screen are drawn, taking texts from the lists 
+    on demand, so it's fast regardless of the number of files.
+
+    Args:
+        parent (wx.Window): Parent window.
+        name (str): Name of the widget.
+        size (tuple): Size of the widget.
+
+    Attributes:
+        fileList (list): File paths to be renamed.
+        nFileList (list): New file paths.
+    """
+    def __init__(self, parent, name, size):
+        if DEBUG: print("FileListCtrl.__init__()")
+
+        wx.ListCtrl.__init__(
+                        self,
+                        parent,
+                        -1,
+                        name=name,
+                        size=size,
+                        style=wx.LC_REPORT|wx.LC_VIRTUAL|wx.LC_HRULES,
+                            )
+        self.fileList = []
+        self.nFileList = []
+        self.conflicts = {} # reason of conflict of each conflicting row
+        self.conflictAttr = wx.ItemAttr()
+        self.conflictAttr.SetTextColour('#aa0000')
+        self.dupOf = {} # row with the same content of each duplicate row
+        self.dupAttr = wx.ItemAttr()
+        self.dupAttr.SetTextColour('#0000aa')
+        colW = int(size[0]/2)-10 # column width
+        self.InsertColumn(0, "File", width=colW)
+        self.InsertColumn(1, "--->> New file", width=colW)
+        self.SetItemCount(0)
+
+    #-------------------------------------------------------------------
+
+    def setLists(self, fileList, nFileList, conflicts=[], dupOf={}):
+        """ Set lists of file paths to show.
+
+        Args:
+            fileList (list): File paths to be renamed.
+            nFileList (list): New file paths.
+            conflicts (list, optional): (index, reason) of conflicting 
+              files.
+            dupOf (dict, optional): Index of the file with the same 
+              content of each duplicate file (see findDuplicates).
+
+        Returns: None
+        """
+        if DEBUG: print("FileListCtrl.setLists()")
+
+        self.fileList = fileList
+        self.nFileList = nFileList
+        self.conflicts = dict(conflicts)
+        self.dupOf = dupOf
+        self.SetItemCount(len(fileList))
+        self.Refresh()
+
+    #-------------------------------------------------------------------
+
+    def OnGetItemText(self, item, col):
+        """ Return text of a cell; called by wx only for visible rows.
+
+        Args:
+            item (int): Row index.
+            col (int): Column index.
+
+        Returns:
+            (str): Text of the cell.
+        """
+        if col == 0: return self.fileList[item]
+        elif item >= len(self.nFileList): return "" # not made yet
+        elif item in self.conflicts:
+            return "%s  <<< %s"%(self.nFileList[item], self.conflicts[item])
+        elif item in self.dupOf:
+            return "%s  <<< Same content as %s"%(self.nFileList[item], 
+                                            self.fileList[self.dupOf[item]])
+        else: return self.nFileList[item]
+
+    #-------------------------------------------------------------------
+
+    def OnGetItemAttr(self, item):
+        """ Return attributes of a row; conflicting rows in red and
+        duplicate files in blue.
+
+        Args:
+            item (int): Row index.
+
+        Returns:
+            (wx.ItemAttr): Attributes of the row or None.
+        """
+        if item in self.conflicts: return self.conflictAttr
+        if item in self.dupOf: return self.dupAttr
+        return None
+
+#=======================================================================
+
+class ResultListCtrl(wx.ListCtrl):
+    """ Virtual list to show results of a run; failed files first 
+    (in red), then renamed files. Texts are taken from the runner on 
+    demand, as in FileListCtrl.
+
+    Args:
+        parent (wx.Window): Parent window.
+        name (str): Name of the widget.
+        size (tuple): Size of the widget.
+        runner (RenameRunner): Finished runner.
+    """
+    def __init__(self, parent, name, size, runner):
+        if DEBUG: print("ResultListCtrl.__init__()")
+
+        wx.ListCtrl.__init__(
+                        self,
+                        parent,
+                        -1,
+                        name=name,
+                        size=size,
+                        style=wx.LC_REPORT|wx.LC_VIRTUAL|wx.LC_HRULES,
+                            )
+        self.runner = runner
+        self.failedAttr = wx.ItemAttr()
+        self.failedAttr.SetTextColour('#aa0000')
+        colW = int((size[0]-80)/2)-10 # column width
+        self.InsertColumn(0, "Result", width=70)
+        self.InsertColumn(1, "File", width=colW)
+        self.InsertColumn(2, "--->> New file", width=colW)
+        self.SetItemCount(len(runner.errors) + len(runner.renamed))
+
+    #-------------------------------------------------------------------
+
+    def OnGetItemText(self, item, col):
+        """ Return text of a cell; called by wx only for visible rows.
+
+        Args:
+            item (int): Row index.
+            col (int): Column index.
+
+        Returns:
+            (str): Text of the cell.
+        """
+        nFailed = len(self.runner.errors)
+        if item < nFailed:
+            i, msg = self.runner.errors[item]
+            if col == 0: return "Failed"
+            elif col == 1: return self.runner.fileList[i]
+            else: return "%s  <<< %s"%(self.runner.nFileList[i], msg)
+        i = self.runner.renamed[item-nFailed]
+        if col == 0: return "Renamed"
+        elif col == 1: return self.runner.fileList[i]
+        else: return self.runner.nFileList[i]
+
+    #-------------------------------------------------------------------
+
+    def OnGetItemAttr(self, item):
+        """ Return attributes of a row; failed rows in red.
+
+        Args:
+            item (int): Row index.
+
+        Returns:
+            (wx.ItemAttr): Attributes of the row or None.
+        """
+        if item < len(self.runner.errors): return self.failedAttr
+        return None
+
+#=======================================================================
+
+class RunSummaryDialog(wx.Dialog):
+    """ Dialog to show summary of a run; numbers of files, elapsed time
+    and speed, with a list of results (ResultListCtrl), which can be 
+    exported to a report file.
+
+    Args:
+        parent (wx.Window): Parent window.
+        runner (RenameRunner): Finished runner.
+    """
+    def __init__(self, parent, runner):
+        if DEBUG: print("RunSummaryDialog.__init__()")
+
+        wx.Dialog.__init__(self, 
+                           parent, 
+                           -1, 
+                           "Results", 
+                           style=wx.DEFAULT_DIALOG_STYLE|wx.RESIZE_BORDER)
+        self.runner = runner
+        s = runner.getSummary()
+        msg = ""
+        if runner.cancelled: msg = "Cancelled.\n"
+        msg += "Renamed: %i / %i files\n"%(s["nRenamed"], s["nFiles"])
+        if runner.linked != []:
+            msg += "Duplicates linked: %i files\n"%(len(runner.linked))
+        msg += "Failed: %i, Unchanged: %i, Not done: %i\n"%(s["nFailed"], 
+                                                            s["nUnchanged"],
+                                                            s["nNotDone"])
+        msg += "Elapsed time: %.1f s, %.1f files/s"%(s["elapsed"], s["fps"])
+
+        sizer = wx.BoxSizer(wx.VERTICAL)
+        sTxt = wx.StaticText(self, -1, label=msg, name="summary_sTxt")
+        sizer.Add(sTxt, 0, wx.ALL, 10)
+        lst = ResultListCtrl(self, "result_lst", (800, 400), runner)
+        sizer.Add(lst, 1, wx.EXPAND|wx.LEFT|wx.RIGHT, 10)
+        btnSizer = wx.BoxSizer(wx.HORIZONTAL)
+        btn = wx.Button(self, -1, label="Export report...", 
+                        name="exportReport_btn")
+        btn.Bind(wx.EVT_BUTTON, self.onExport)
+        btnSizer.Add(btn, 0, wx.RIGHT, 10)
+        btnSizer.Add(wx.Button(self, wx.ID_OK), 0)
+        sizer.Add(btnSizer, 0, wx.ALIGN_RIGHT|wx.ALL, 10)
+        self.SetSizerAndFit(sizer)
+
+    #-------------------------------------------------------------------
+
+    def onExport(self, event):
+        """ Export result of each file to a report file.
+
+        Args: event (wx.Event)
+
+        Returns: None
+        """
+        if DEBUG: print("RunSummaryDialog.onExport()")
+
+        dlg = wx.FileDialog(self, 
+                            "Export report", 
+                            CWD, 
+                            "report_%s.tsv"%(self.runner.runID),
+                            "Tab-separated values (*.tsv)|*.tsv",
+                            wx.FD_SAVE|wx.FD_OVERWRITE_PROMPT)
+        if dlg.ShowModal() == wx.ID_OK:
+            try:
+                self.runner.writeReport(dlg.GetPath())
+            except OSError as e:
+                wx.MessageBox(str(e), 'Export report', wx.OK|wx.ICON_ERROR)
+        dlg.Destroy()
+
+#=======================================================================
+
+class FileRenamerFrame(wx.Frame):
+    """ Frame for FileRenamer
+
+    Attributes:
+        Each attribute is commented in 'setting up attributes' section.
+    """
+
+    def __init__(self, title):
+        if DEBUG: print("FileRenamerFrame.__init__()")
+
+        ### init frame
+        w_pos = [0, 25]
+        wg = wx.Display(0).GetGeometry()
+        w_sz = (wg[2], int(wg[3]*0.9))
+        wx.Frame.__init__(
+              self, 
+              None, 
+              -1, 
+              title, 
+              pos = tuple(w_pos), 
+              size = tuple(w_sz),
+              style=wx.DEFAULT_FRAME_STYLE^(wx.RESIZE_BORDER|wx.MAXIMIZE_BOX),
+                         ) 
+        self.SetBackgroundColour('#333333')
+
+        self.tbIcon = None # set after the frame is shown (setIcon)
+
+        ##### beginning of setting up attributes ----- 
+        self.w_pos = w_pos
+        self.w_sz = w_sz
+        self.fonts = getWXFonts(initFontSz=8, numFonts=3)
+        pi = self.setPanelInfo()
+        self.pi = pi # pnael information
+        self.gbs = {} # for GridBagSizer
+        self.panel = {} # panels
+        self.selectedFolders = [] # list of selected folders
+        self.inclSubFolders = False # whether to include sub-folders
+        self.nScanWorkers = SCAN_WORKERS # number of threads for scanning
+        self.scanCache = ScanCache(HASH_CACHE_FILE) # scanned folders, files
+        self.scanIndex = None # ScanIndex, while 'Use scan index' is checked
+        self.previewJobID = 0 # ID of the latest preview computation
+        self.previewCancel = None # cancel event of the running preview
+        self.conflicts = [] # (index, reason) of conflicting files
+        self.dedupMode = "" # handling of duplicate files; '' or DEDUP_MODES
+        self.dupOf = {} # index of the file with the same content
+        self.sortBy = "existing" # order of numbering; one of SORT_MODES
+        self.runner = None # RenameRunner, while renaming is running
+        self.runThread = None # thread running self.runner
+        self.folder2moveRenFile = "" # folder to move renamed files
+        self.fileList = [] # file list to be renamed
+        self.nFileList = [] # file list with new file names
+        self.newFFO = NEW_FFO # new file format options 
+        self.newFFOD = NEW_FFOD # new file format options - description
+        self.logFile = LOG_FILE
+        self.journalFile = JOURNAL_FILE
+        ##### end of setting up attributes -----  
+
+        ### create panels
+        for pk in pi.keys():
+            self.panel[pk] = SPanel.ScrolledPanel(
+                                                  self, 
+                                                  name="%s_panel"%(pk), 
+                                                  pos=pi[pk]["pos"], 
+                                                  size=pi[pk]["sz"], 
+                                                  style=pi[pk]["style"],
+                                                 )
+            self.panel[pk].SetBackgroundColour(pi[pk]["bgCol"]) 
+
+        ##### beginning of setting up top UI panel interface -----
+        bw = 5 # border width for GridBagSizer
+        vlSz = (-1, 20) # size of vertical line seprator
+        self.gbs["tUI"] = wx.GridBagSizer(0,0)
+        row = 0
+        col = 0
+        btn = wx.Button(
+                            self.panel["tUI"],
+                            -1,
+                            label="Select folders",
+                            name="selFolders_btn",
+                       )
+        btn.Bind(wx.EVT_LEFT_DOWN, self.onButtonPressDown)
+        self.gbs["tUI"].Add(
+                            btn, 
+                            pos=(row,col), 
+                            flag=wx.ALIGN_CENTER_VERTICAL|wx.ALL, 
+                            border=bw,
+                           )
+        col += 1
+        chk = wx.CheckBox(
+                            self.panel["tUI"],
+                            -1,
+                            label="Include sub-folders",
+                            name="subFolders_chk",
+                         )
+        chk.SetValue(False)
+        chk.Bind(wx.EVT_CHECKBOX, self.onCheckBox)
+        self.gbs["tUI"].Add(
+                            chk, 
+                            pos=(row,col), 
+                            flag=wx.ALIGN_CENTER_VERTICAL|wx.ALL, 
+                            border=bw,
+                           )
+        col += 1
+        chk = wx.CheckBox(
+                            self.panel["tUI"],
+                            -1,
+                            label="Watch folders",
+                            name="watch_chk",
+                         )
+        chk.SetValue(False)
+        chk.Bind(wx.EVT_CHECKBOX, self.onCheckBox)
+        self.gbs["tUI"].Add(
+                            chk, 
+                            pos=(row,col), 
+                            flag=wx.ALIGN_CENTER_VERTICAL|wx.ALL, 
+                            border=bw,
+                           )
+        col += 1
+        self.gbs["tUI"].Add(
+                            wx.StaticLine(
+                                            self.panel["tUI"],
+                                            -1,
+                                            size=vlSz,
+                                            style=wx.LI_VERTICAL,
+                                         ),
+                            pos=(row,col), 
+                            flag=wx.ALIGN_CENTER_VERTICAL|wx.ALL, 
+                            border=bw,
+                           ) # vertical line separator
+        col += 1
+        chk = wx.CheckBox(
+                            self.panel["tUI"],
+                            -1,
+                            label="Move renamed files to a folder",
+                            name="moveRenFiles_chk",
+                         )
+        chk.SetValue(False)
+        chk.Bind(wx.EVT_CHECKBOX, self.onCheckBox)
+        self.gbs["tUI"].Add(
+                            chk, 
+                            pos=(row,col), 
+                            flag=wx.ALIGN_CENTER_VERTICAL|wx.ALL, 
+                            border=bw,
+                           )
+        col += 1
+        btn = wx.Button(
+                            self.panel["tUI"],
+                            -1,
+                            label="Select folder to move renamed Files",
+                            name="selFolder2move_btn",
+                       )
+        btn.Disable()
+        btn.Bind(wx.EVT_LEFT_DOWN, self.onButtonPressDown)
+        self.gbs["tUI"].Add(
+                            btn, 
+                            pos=(row,col), 
+                            flag=wx.ALIGN_CENTER_VERTICAL|wx.ALL, 
+                            border=bw,
+                           )
+        col += 1
+        txt = wx.TextCtrl(
+                            self.panel["tUI"], 
+                            -1, 
+                            value="",
+                            name="selFolder2move_txt",
+                            size=(200,-1),
+                            style=wx.TE_READONLY,
+                         )
+        txt.Disable()
+        txt.SetBackgroundColour('#999999')
+        self.gbs["tUI"].Add(
+                            txt, 
+                            pos=(row,col), 
+                            flag=wx.ALIGN_CENTER_VERTICAL|wx.ALL, 
+                            border=bw,
+                           )
+        col += 1
+        cho = wx.Choice(
+                            self.panel["tUI"], 
+                            -1,
+                            name="dedup_cho",
+                            choices=["Rename duplicates",
+                                     "Skip duplicates",
+                                     "Hard-link duplicates",
+                                     "Report duplicates"],
+                       ) # in the order of ['']+DEDUP_MODES
+        cho.SetSelection(0)
+        cho.Bind(wx.EVT_CHOICE, self.onChoice)
+        self.gbs["tUI"].Add(
+                            cho, 
+                            pos=(row,col), 
+                            flag=wx.ALIGN_CENTER_VERTICAL|wx.ALL, 
+                            border=bw,
+                           )
+        col += 1
+        cho = wx.Choice(
+                            self.panel["tUI"], 
+                            -1,
+                            name="sort_cho",
+                            choices=["Number in scanned order",
+                                     "Number in natural name order",
+                                     "Number by modification time",
+                                     "Number by size"],
+                       ) # in the order of SORT_MODES
+        cho.SetSelection(0)
+        cho.Bind(wx.EVT_CHOICE, self.onChoice)
+        self.gbs["tUI"].Add(
+                            cho, 
+                            pos=(row,col), 
+                            flag=wx.ALIGN_CENTER_VERTICAL|wx.ALL, 
+                            border=bw,
+                           )
+        col += 1
+        self.gbs["tUI"].Add(
+                            wx.StaticLine(
+                                            self.panel["tUI"],
+                                            -1,
+                                            size=vlSz,
+                                            style=wx.LI_VERTICAL,
+                                         ),
+                            pos=(row,col), 
+                            flag=wx.ALIGN_CENTER_VERTICAL|wx.ALL, 
+                            border=bw,
+                           ) # vertical line separator
+        col += 1
+        btn = wx.Button(
+                            self.panel["tUI"],
+                            -1,
+                            label="Run renaming",
+                            name="run_btn",
+                       )
+        btn.Bind(wx.EVT_LEFT_DOWN, self.onButtonPressDown)
+        self.gbs["tUI"].Add(
+                            btn, 
+                            pos=(row,col), 
+                            flag=wx.ALIGN_CENTER_VERTICAL|wx.ALL, 
+                            border=bw,
+                           )
+        col += 1
+        btn = wx.Button(
+                            self.panel["tUI"],
+                            -1,
+                            label="Cancel",
+                            name="cancel_btn",
+                       )
+        btn.Disable()
+        btn.Bind(wx.EVT_LEFT_DOWN, self.onButtonPressDown)
+        self.gbs["tUI"].Add(
+                            btn, 
+                            pos=(row,col), 
+                            flag=wx.ALIGN_CENTER_VERTICAL|wx.ALL, 
+                            border=bw,
+                           )
+        col += 1
+        btn = wx.Button(
+                            self.panel["tUI"],
+                            -1,
+                            label="Pause",
+                            name="pause_btn",
+                       )
+        btn.Disable()
+        btn.Bind(wx.EVT_LEFT_DOWN, self.onButtonPressDown)
+        self.gbs["tUI"].Add(
+                            btn, 
+                            pos=(row,col), 
+                            flag=wx.ALIGN_CENTER_VERTICAL|wx.ALL, 
+                            border=bw,
+                           )
+        col += 1
+        gauge = wx.Gauge(
+                            self.panel["tUI"],
+                            -1,
+                            range=100,
+                            name="prog_gauge",
+                            size=(150, -1),
+                        ) # progress of renaming
+        self.gbs["tUI"].Add(
+                            gauge, 
+                            pos=(row,col), 
+                            flag=wx.ALIGN_CENTER_VERTICAL|wx.ALL, 
+                            border=bw,
+                           )
+        col += 1
+        sTxt = setupStaticText(
+                            self.panel["tUI"], 
+                            "", 
+                            name="status_sTxt",
+                            size=(300, -1),
+                              )
+        self.gbs["tUI"].Add(
+                            sTxt, 
+                            pos=(row,col), 
+                            flag=wx.ALIGN_CENTER_VERTICAL|wx.ALL, 
+                            border=bw,
+                           )
+        self.panel["tUI"].SetSizer(self.gbs["tUI"])
+        self.gbs["tUI"].Layout()
+        self.panel["tUI"].SetupScrolling()
+        ##### end of setting up top UI panel interface -----
+
+        ##### beginning of setting up renaming parameter panel interface -----
+        mw = bw*6 # margin in width
+        mpSz = pi["mp"]["sz"]
+        hlSz = (mpSz[0]-mw, -1) # size of horizontal line separator
+        self.gbs["mp"] = wx.GridBagSizer(0,0)
+        row = 0
+        col = 0
+        sTxt = setupStaticText(
+                            self.panel["mp"], 
+                            "Selected folders for renaming", 
+                            font=self.fonts[2],
+                              )
+        self.gbs["mp"].Add(
+                            sTxt, 
+                            pos=(row,col), 
+                            flag=wx.ALIGN_CENTER_VERTICAL|wx.ALL, 
+                            border=bw,
+                           )
+        row += 1
+        txt = wx.TextCtrl(
+                            self.panel["mp"], 
+                            -1, 
+                            value="[EMPTY]; Please select folders",
+                            name="selDir_txt",
+                            size=(int(mpSz[0]*0.95), int(mpSz[1]*0.2)),
+                            style=wx.TE_MULTILINE|wx.TE_READONLY,
+                         )
+        txt.SetBackgroundColour('#999999')
+        self.gbs["mp"].Add(
+                            txt, 
+                            pos=(row,col), 
+                            flag=wx.ALIGN_CENTER_VERTICAL|wx.ALL, 
+                            border=bw,
+                           ) 
+        row += 1
+        self.gbs["mp"].Add(
+                            wx.StaticLine(
+                                            self.panel["mp"],
+                                            -1,
+                                            size=hlSz,
+                                            style=wx.LI_HORIZONTAL,
+                                         ),
+                            pos=(row,col), 
+                            flag=wx.ALIGN_CENTER_VERTICAL|wx.ALL, 
+                            border=bw,
+                          ) # horizontal line separator
+        row += 1
+        lbl = "Target files (you can use wildcard characters;"
+        lbl += " separate patterns with ';', 're:' for a regular expression)"
+        sTxt = setupStaticText(
+                            self.panel["mp"], 
+                            lbl, 
+                            font=self.fonts[2],
+                              )
+        self.gbs["mp"].Add(
+                            sTxt, 
+                            pos=(row,col), 
+                            flag=wx.ALIGN_CENTER_VERTICAL|wx.ALL, 
+                            border=bw,
+                           )
+        row += 1
+        txt = wx.TextCtrl(
+                            self.panel["mp"], 
+                            -1, 
+                            value="*.*",
+                            name="targetFN_txt",
+                            size=(int(mpSz[0]*0.95), -1),
+                            style=wx.TE_PROCESS_ENTER,
+                         )
+        txt.Bind(wx.EVT_TEXT_ENTER, self.onEnteredInTC)
+        self.gbs["mp"].Add(
+                            txt, 
+                            pos=(row,col), 
+                            flag=wx.ALIGN_CENTER_VERTICAL|wx.ALL, 
+                            border=bw,
+                          )
+        row += 1
+        col = 0
+        self.gbs["mp"].Add(
+                            wx.StaticLine(
+                                            self.panel["mp"],
+                                            -1,
+                                            size=hlSz,
+                                            style=wx.LI_HORIZONTAL,
+                                         ),
+                            pos=(row,col), 
+                            flag=wx.ALIGN_CENTER_VERTICAL|wx.ALL, 
+                            border=bw,
+                          ) # horizontal line separator
+        row += 1
+        sTxt = setupStaticText(
+                            self.panel["mp"], 
+                            "List of files to be renamed", 
+                            font=self.fonts[2],
+                              )
+        self.gbs["mp"].Add(
+                            sTxt, 
+                            pos=(row,col), 
+                            flag=wx.ALIGN_CENTER_VERTICAL|wx.ALL, 
+                            border=bw,
+                           )
+        row += 1
+        lst = FileListCtrl(
+                            self.panel["mp"], 
+                            name="selFile_lst",
+                            size=(int(mpSz[0]*0.95), int(mpSz[1]*0.4)),
+                          ) # selected files to be renamed
+        lst.SetBackgroundColour('#999999')
+        self.gbs["mp"].Add(
+                            lst, 
+                            pos=(row,col), 
+                            flag=wx.ALIGN_CENTER_VERTICAL|wx.ALL, 
+                            border=bw,
+                           )
+        row += 1
+        self.gbs["mp"].Add(
+                            wx.StaticLine(
+                                            self.panel["mp"],
+                                            -1,
+                                            size=hlSz,
+                                            style=wx.LI_HORIZONTAL,
+                                         ),
+                            pos=(row,col), 
+                            flag=wx.ALIGN_CENTER_VERTICAL|wx.ALL, 
+                            border=bw,
+                          ) # horizontal line separator
+        row += 1
+        lbl = "New file-name format (Don't put extension here."
+        lbl += " It will be same as original file extension.)"
+        sTxt = setupStaticText(
+                            self.panel["mp"], 
+                            lbl, 
+                            font=self.fonts[2],
+                            wrapWidth=int(mpSz[0]*0.95),
+                              )
+        self.gbs["mp"].Add(
+                            sTxt, 
+                            pos=(row,col), 
+                            flag=wx.ALIGN_CENTER_VERTICAL|wx.ALL, 
+                            border=bw,
+                           )
+        row += 1
+        txt = wx.TextCtrl(
+                            self.panel["mp"], 
+                            -1, 
+                            value="[oFileN]",
+                            name="newFN_txt",
+                            size=(int(mpSz[0]*0.95), -1),
+                            style=wx.TE_PROCESS_ENTER,
+                         )
+        txt.Bind(wx.EVT_TEXT_ENTER, self.onEnteredInTC)
+        self.gbs["mp"].Add(
+                            txt, 
+                            pos=(row,col), 
+                            flag=wx.ALIGN_CENTER_VERTICAL|wx.ALL, 
+                            border=bw,
+                           )
+        row += 1
+        _choices = ['']
+        for i in range(len(self.newFFO)):
+            k = self.newFFO[i]
+            _choices.append("[%s], %s"%(k, self.newFFOD[k]))
+        cho = wx.Choice(
+                            self.panel["mp"], 
+                            -1,
+                            name="newFNOption_cho",
+                            choices=_choices,
+                            size=(int(mpSz[0]*0.333), -1),
+                       )
+        cho.Bind(wx.EVT_CHOICE, self.onChoice)
+        self.gbs["mp"].Add(
+                            cho, 
+                            pos=(row,col), 
+                            flag=wx.ALIGN_CENTER_VERTICAL|wx.ALL, 
+                            border=bw,
+                           )
+        self.panel["mp"].SetSizer(self.gbs["mp"])
+        self.gbs["mp"].Layout()
+        self.panel["mp"].SetupScrolling()
+        ##### end of setting up renaming parameter panel interface -----
+
+        ### set up menu
+        menuBar = wx.MenuBar()
+        fileRenMenu = wx.Menu()
+        selectFolders = fileRenMenu.Append(
+                            wx.Window.NewControlId(), 
+                            item="Select folders\tCTRL+O",
+                                        )
+        self.Bind(wx.EVT_MENU,
+                  lambda event: self.onButtonPressDown(event, 'selectFolders'),
+                  selectFolders)
+        undoRun = fileRenMenu.Append(
+                            wx.Window.NewControlId(), 
+                            item="Undo a run...",
+                                    )
+        self.Bind(wx.EVT_MENU,
+                  lambda event: self.onButtonPressDown(event, 'undoRun'),
+                  undoRun)
+        useIndex = fileRenMenu.AppendCheckItem(
+                            wx.Window.NewControlId(), 
+                            item="Use scan index",
+                                              )
+        self.Bind(wx.EVT_MENU, self.onUseIndex, useIndex)
+        quit = fileRenMenu.Append(
+                            wx.Window.NewControlId(), 
+                            item="Quit\tCTRL+Q",
+                                 )
+        menuBar.Append(fileRenMenu, "&FileRenamer")
+        self.SetMenuBar(menuBar)
+        
+        ### set up hot keys
+        idSelFolders = wx.Window.NewControlId()
+        idQuit = wx.Window.NewControlId()
+        self.Bind(wx.EVT_MENU,
+                  lambda event: self.onButtonPressDown(event, 'selectFolders'),
+                  id=idSelFolders)
+        self.Bind(wx.EVT_MENU, self.onClose, id=idQuit)
+        accel_tbl = wx.AcceleratorTable([ 
+                                    (wx.ACCEL_CMD,  ord('O'), idSelFolders), 
+                                    (wx.ACCEL_CMD,  ord('Q'), idQuit), 
+                                        ]) 
+        self.SetAcceleratorTable(accel_tbl)
+
+        updateFrameSize(self, w_sz)
+
+        self.Bind(wx.EVT_CLOSE, self.onClose)
+
+        wx.CallAfter(self.setIcon) # after the frame is shown
+        wx.CallAfter(self.checkJournal) # check for an interrupted run
+
+    #-------------------------------------------------------------------
+
+    def setIcon(self):
+        """ Set app icon (in the dock); deferred until the frame is 
+        shown, as it's not needed for the first frame.
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("FileRenamerFrame.setIcon()")
+
+        import wx.adv
+        if not path.isfile(ICON_FILE): return
+        self.tbIcon = wx.adv.TaskBarIcon(iconType=wx.adv.TBI_DOCK)
+        self.tbIcon.SetIcon(wx.Icon(ICON_FILE))
+
+    #-------------------------------------------------------------------
+
+    def checkJournal(self):
+        """ If there's a journal of an interrupted run, ask the user 
+        whether to roll it forward or back.
+
+        Args: None
+
+        Returns:
+            (bool): True if there's no interrupted run (any more).
+        """
+        if DEBUG: print("FileRenamerFrame.checkJournal()")
+
+        runID, ops = readJournal(self.journalFile)
+        if runID == None: return True
+        msg = "Renaming (run %s) was interrupted."%(runID)
+        msg += " %i renaming operations were recorded.\n\n"%(len(ops))
+        msg += "Roll forward: finish renaming of the run.\n"
+        msg += "Roll back: rename files back to their original paths."
+        dlg = wx.MessageDialog(self, msg, "Interrupted renaming",
+                               wx.YES_NO|wx.CANCEL|wx.ICON_WARNING)
+        dlg.SetYesNoCancelLabels("Roll forward", "Roll back", "Later")
+        ret = dlg.ShowModal()
+        dlg.Destroy()
+        if ret == wx.ID_CANCEL: return False
+        nRenamed, errors = recoverJournal(ret == wx.ID_YES, 
+                                          self.journalFile,
+                                          self.logFile)
+        msg = "%i files were renamed.\n\n"%(nRenamed)
+        if errors != []:
+            msg += "Failed files -----\n\n"
+            msg += "".join(["%s; %s\n"%(fp, _msg) for fp, _msg in errors[:20]])
+            if len(errors) > 20: msg += "... and %i more"%(len(errors)-20)
+        wx.MessageBox(msg, 'Recovery', wx.OK)
+        return True
+
+    #-------------------------------------------------------------------
+
+    def setPanelInfo(self):
+        """ Set panel information.
+
+        Args: None
+
+        Returns:
+            pi (dict): Panel information.
+        """
+        if DEBUG: print("FileRenamerFrame.setPanelInfo()")
+
+        w_sz = self.GetSize() # window size
+        
+        pi = {} # panel information 
+        # top panel for UI 
+        pi["tUI"] = dict(pos=(0, 0), 
+                         sz=(w_sz[0], 40), 
+                         bgCol="#cccccc", 
+                         style=wx.TAB_TRAVERSAL|wx.SUNKEN_BORDER)
+        tUISz = pi["tUI"]["sz"]
+        # panel for setting parameters 
+        pi["mp"] = dict(pos=(0, tUISz[1]),
+                         sz=(w_sz[0], int(w_sz[1]-tUISz[1])),
+                         bgCol="#cccccc",
+                         style=wx.TAB_TRAVERSAL|wx.SUNKEN_BORDER)
+        return pi
+    
+    #-------------------------------------------------------------------
+   
+    def onButtonPressDown(self, event, flag=''):
+        """ wx.Butotn was pressed.
+
+        Args:
+            event (wx.Event)
+            flag (str, optional): Specifying intended operation of 
+              the function call.
+
+        Returns: None
+        """
+        if DEBUG: print("FileRenamerFrame.onButtonPressDown()")
+
+        objName = ''
+        if flag == '':
+            obj = event.GetEventObject()
+            objName = obj.GetName()
+
+        if flag == "selectFolders" or objName == "selFolders_btn":
+        # select folders to rename
+            import wx.lib.agw.multidirdialog as MDD # loaded when needed
+            dlg = MDD.MultiDirDialog(
+                         None, 
+                         title="Select folders to apply renaming operations.",
+                         defaultPath=CWD,
+                         agwStyle=MDD.DD_MULTIPLE|MDD.DD_DIR_MUST_EXIST,
+                                    ) # select multiple folders
+            if dlg.ShowModal() == wx.ID_OK:
+                self.selectedFolders = dlg.GetPaths()
+                if sys.platform == 'darwin': # OS X
+                    ### remove root string
+                    for i, fp in enumerate(self.selectedFolders):
+                        si = fp.find("/")
+                        if si != -1:
+                            fp = fp[fp.index("/"):] # cut off the fisrt directory name,
+                              # MultiDirDialog returns with disk name as root
+                              # Instead of '/tmp', 
+                              # it returns 'Macintosh HD/tmp'.
+                        self.selectedFolders[i] = fp 
+
+                ### include sub folder, if "including sub folder" option was checked.
+                sfChk = wx.FindWindowByName("subFolders_chk", self.panel["tUI"])
+                self.inclSubFolders = sfChk.GetValue()
+
+                self.scanCache.invalidate() # scan again, even if same folders
+                self.updateFileList() # update files to be renamed
+            dlg.Destroy()
+
+        elif objName == "selFolder2move_btn":
+        # select folder to move renamed files
+            dlg = wx.DirDialog(self, 
+                               "Select a folder to move renamed files.", 
+                               CWD) # select folder
+            if dlg.ShowModal() == wx.ID_OK:
+                self.folder2moveRenFile = dlg.GetPath() # get folder path
+                tc = wx.FindWindowByName("selFolder2move_txt", self.panel["tUI"])
+                tc.SetValue(self.folder2moveRenFile) # show it on UI
+                self.updateFileList() # update files to be renamed
+            dlg.Destroy()
+        
+        elif objName == "cancel_btn":
+            if self.runner != None: # renaming is running
+                self.runner.cancel()
+                self.setStatus("Cancelling...")
+            elif self.previewCancel != None: # preview is being computed
+                self.cancelPreview()
+                self.setStatus("Cancelled.")
+
+        elif objName == "pause_btn":
+            if self.runner == None: return
+            if self.runner.isPaused():
+                self.runner.resume()
+                obj.SetLabel("Pause")
+            else:
+                self.runner.pause()
+                obj.SetLabel("Resume")
+                self.setStatus("Paused. %i/%i"%(self.runner.nDone, 
+                                                len(self.fileList)))
+
+        elif objName == "run_btn":
+            if self.runner != None or len(self.fileList) == 0: return
+            if self.conflicts != []:
+                msg = "There are %i conflicts"%(len(self.conflicts))
+                msg += " (shown in red in the file list)."
+                msg += " Please change new file-name format."
+                wx.MessageBox(msg, 'Conflicts', wx.OK|wx.ICON_ERROR)
+                return
+            if not self.checkJournal(): return
+            if self.dedupMode == "link": linkTo = self.dupOf
+            else: linkTo = None
+            self.startRun(RenameRunner(self.fileList, 
+                                       self.nFileList, 
+                                       self.logFile,
+                                       self.journalFile,
+                                       linkTo))
+
+        elif flag == "undoRun":
+            if self.runner != None: return
+            if not self.checkJournal(): return
+            runs = list(readLogIndex(self.logFile).items())
+            if runs == []:
+                wx.MessageBox("There's no run in the log.", 'Undo', wx.OK)
+                return
+            runs.reverse() # latest run first
+            choices = ["%s (%i files)"%(runID, sum([s[2] for s in sections])) \
+                                                for runID, sections in runs]
+            dlg = wx.SingleChoiceDialog(self, 
+                                        "Choose a run to undo.", 
+                                        "Undo a run", 
+                                        choices)
+            ret = dlg.ShowModal()
+            runID = runs[dlg.GetSelection()][0]
+            dlg.Destroy()
+            if ret != wx.ID_OK: return
+            try:
+                runner = makeUndoRunner(runID, self.logFile, self.journalFile)
+            except (ValueError, OSError) as e:
+                wx.MessageBox(str(e), 'Undo', wx.OK|wx.ICON_ERROR)
+                return
+            if len(runner.fileList) == 0: # such as a cancelled run
+                wx.MessageBox("Run %s renamed no files."%(runID), 'Undo', 
+                              wx.OK)
+                return
+            msg = "Rename %i files of run %s back?"%(len(runner.fileList), 
+                                                     runID)
+            ret = wx.MessageBox(msg, 'Undo', wx.YES_NO|wx.ICON_QUESTION)
+            if ret != wx.YES: return
+            self.cancelPreview()
+            self.startRun(runner)
+
+    #-------------------------------------------------------------------
+    
+    def onCheckBox(self, event):
+        """ wx.CheckBox was checked/unchecked.
+        
+        Args: event (wx.Event)
+
+        Returns: None
+        """
+        obj = event.GetEventObject()
+        objName = obj.GetName()
+
+        if objName == "moveRenFiles_chk":
+            chk = wx.FindWindowByName(objName, self.panel["tUI"])
+            btn = wx.FindWindowByName("selFolder2move_btn", self.panel["tUI"])
+            txt = wx.FindWindowByName("selFolder2move_txt", self.panel["tUI"])
+            if chk.GetValue() == True:
+                btn.Enable()
+                txt.Enable()
+                txt.SetBackgroundColour('#ffffff')
+            else:
+                btn.Disable()
+                txt.SetValue('')
+                txt.Disable()
+                txt.SetBackgroundColour('#999999')
+                self.folder2moveRenFile = ""
+                self.updateFileList() # update new file paths
+
+        elif objName == "subFolders_chk":
+            self.inclSubFolders = obj.GetValue()
+            if self.selectedFolders != []: self.updateFileList()
+
+        elif objName == "watch_chk":
+            if obj.GetValue() == True: self.startWatching()
+            else: self.scanCache.stopWatching()
+    
+    #-------------------------------------------------------------------
+
+    def onChoice(self, event):
+        """ wx.Choice was changed.
+
+        Args: event (wx.Event)
+
+        Returns: None
+        """
+        if DEBUG: print("FileRenamerFrame.onChoice()")
+        
+        obj = event.GetEventObject()
+        objName = obj.GetName()
+
+        ### update newFN_txt with option choice.
+        if objName == 'newFNOption_cho':
+            chosenOStr = obj.GetString(obj.GetSelection()) # chosen option 
+            if chosenOStr == '': return
+            chosenOStr = chosenOStr.split(',')[0].strip()
+            txtCtrlName = objName.replace("Option","").replace("_cho","_txt")
+            txtCtrl = wx.FindWindowByName(txtCtrlName, self.panel["mp"])
+            ### add option string to its textctrl value
+            _txt = txtCtrl.GetValue()
+            _txt += "%s"%(chosenOStr)
+            txtCtrl.SetValue(_txt)
+            self.updateFileList()
+
+        elif objName == 'dedup_cho':
+            self.dedupMode = ([""] + DEDUP_MODES)[obj.GetSelection()]
+            if self.selectedFolders != []: self.updateFileList()
+
+        elif objName == 'sort_cho':
+            self.sortBy = SORT_MODES[obj.GetSelection()]
+            if self.selectedFolders != []: self.updateFileList()
+                    
+    #-------------------------------------------------------------------
+
+    def onEnteredInTC(self, event):
+        """ 'Enter' was pressed in wx.TextCtrl.
+
+        Args: event (wx.Event)
+
+        Returns: None
+        """
+        if DEBUG: print("FileRenamerFrame.onEnteredInTC()")
+        
+        obj = event.GetEventObject()
+        objName = obj.GetName()
+        
+        if objName in ['targetFN_txt', 'newFN_txt']:
+        # target file format or new file format has changed
+            self.updateFileList()
+    
+    #-------------------------------------------------------------------
+    
+    def updateFileList(self):
+        """ This function is called when selected folders or target file 
+        name or extension has changed. 
+        This function updates file list, which will be renamed.
+        Folders are scanned again only when selected folders, sub-folder
+        option or target file-name has changed (see ScanCache).
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("FileRenamerFrame.updateFileList()")
+
+        if self.runner != None: return # renaming is running
+
+        tcFN = wx.FindWindowByName("targetFN_txt", self.panel["mp"])
+        fileForm = "%s"%(tcFN.GetValue()) 
+
+        tcNew = wx.FindWindowByName("newFN_txt", self.panel["mp"])
+        try:
+            getNameMatcher(fileForm) # validate target file-name
+            tmpl = NewNameTemplate(tcNew.GetValue()) # new file format
+        except ValueError as e:
+            wx.MessageBox(str(e), 'Error', wx.OK|wx.ICON_ERROR)
+            return
+
+        ### compute file lists in a worker thread
+        self.cancelPreview() # cancel the previous computation, if running
+        self.previewJobID += 1
+        self.previewCancel = Event()
+        self.fileList = [] 
+        self.nFileList = []
+        self.conflicts = []
+        self.dupOf = {}
+        wx.FindWindowByName("run_btn", self.panel["tUI"]).Disable()
+        wx.FindWindowByName("cancel_btn", self.panel["tUI"]).Enable()
+        self.setStatus("Scanning...")
+        args = (
+                self.previewJobID,
+                self.previewCancel,
+                list(self.selectedFolders),
+                fileForm,
+                self.inclSubFolders,
+                tmpl,
+                self.folder2moveRenFile,
+                self.dedupMode,
+                self.sortBy,
+               )
+        Thread(target=self.previewWorker, args=args, daemon=True).start()
+    
+    #-------------------------------------------------------------------
+
+    def previewWorker(self, jobID, cancelEvent, folders, fileForm, 
+                      inclSubFolders, tmpl, folder2move, dedupMode, sortBy):
+        """ Scan folders and make new file paths in a worker thread.
+        Progress and results are passed to the main thread with
+        wx.CallAfter.
+
+        Args:
+            jobID (int): ID of this preview computation.
+            cancelEvent (threading.Event): Event to cancel this job.
+            folders (list): Selected folders.
+            fileForm (str): Target file-name.
+            inclSubFolders (bool): Whether to include sub-folders.
+            tmpl (NewNameTemplate): New file-name format.
+            folder2move (str): Folder to move renamed files.
+            dedupMode (str): Handling of duplicate files; '' (rename 
+              them as other files) or one of DEDUP_MODES.
+            sortBy (str): Order of numbering; one of SORT_MODES.
+
+        Returns: None
+        """
+        if DEBUG: print("FileRenamerFrame.previewWorker()")
+
+        lastT = [0] # last time when progress was posted
+        def progress(folderL, fL):
+            t = time()
+            if t - lastT[0] < 0.2: return
+            lastT[0] = t
+            wx.CallAfter(self.onPreviewProgress, jobID, len(folderL), fL)
+
+        try:
+            folderL, fileList = self.scanCache.get(folders,
+                                                   fileForm,
+                                                   inclSubFolders,
+                                                   self.nScanWorkers,
+                                                   progress,
+                                                   cancelEvent,
+                                                   self.scanIndex)
+            dupOf = {}
+            if dedupMode != "":
+            # duplicates are found (and skipped) before numbering files
+                wx.CallAfter(self.onPreviewProgress, jobID, len(folderL), 
+                             fileList, "Finding duplicate files...")
+                dupOf = findDuplicates(fileList, 
+                                       self.scanCache.meta, 
+                                       cancelEvent,
+                                       sortBy=sortBy)
+            nDup = len(dupOf)
+            if dedupMode == "skip": # duplicates are not renamed
+                keep = [i for i in range(len(fileList)) if not i in dupOf]
+                fileList = fileList.select(keep)
+                dupOf = {}
+            wx.CallAfter(self.onPreviewProgress, jobID, len(folderL), 
+                         fileList, "Making new file names...")
+            nFileList = planNewPaths(fileList, 
+                                     tmpl, 
+                                     folder2move, 
+                                     cancelEvent,
+                                     self.scanCache.meta,
+                                     sortBy)
+            conflicts = findConflicts(fileList, 
+                                      nFileList, 
+                                      cancelEvent,
+                                      self.scanCache.existsCache)
+        except Cancelled:
+            return
+        except Exception as e: # such as OSError, sqlite3.Error or 
+                               #   BrokenProcessPool (hashing)
+            wx.CallAfter(self.onPreviewError, jobID, 
+                         "%s: %s"%(type(e).__name__, e))
+            return
+        wx.CallAfter(self.onPreviewDone, jobID, folderL, fileList, nFileList,
+                     conflicts, dupOf, nDup)
+
+    #-------------------------------------------------------------------
+
+    def onUseIndex(self, event):
+        """ Open or close the scan index (ScanIndex), with which folders
+        unchanged since the last scan are not listed again.
+
+        Args: event (wx.Event)
+
+        Returns: None
+        """
+        if DEBUG: print("FileRenamerFrame.onUseIndex()")
+
+        self.cancelPreview() # the index is not used by a running preview
+        if event.IsChecked():
+            try:
+                self.scanIndex = ScanIndex()
+            except Exception as e: # sqlite3.Error or OSError
+                wx.MessageBox(str(e), 'Scan index', wx.OK|wx.ICON_ERROR)
+                event.GetEventObject().Check(event.GetId(), False)
+        elif self.scanIndex != None:
+            self.scanIndex.close()
+            self.scanIndex = None
+
+    #-------------------------------------------------------------------
+
+    def onPreviewProgress(self, jobID, nFolders, fL, msg=""):
+        """ Show files found so far, while preview is being computed.
+
+        Args:
+            jobID (int): ID of the preview computation.
+            nFolders (int): Number of folders scanned so far.
+            fL (list): Files found so far.
+            msg (str, optional): Message to show with the numbers.
+
+        Returns: None
+        """
+        if jobID != self.previewJobID or self.previewCancel == None: 
+            return # outdated
+        lst = wx.FindWindowByName("selFile_lst", self.panel["mp"])
+        lst.setLists(fL, [])
+        if msg == "": msg = "Scanning..."
+        self.setStatus("%s %i folders, %i files"%(msg, nFolders, len(fL)))
+
+    #-------------------------------------------------------------------
+
+    def onPreviewDone(self, jobID, folderL, fileList, nFileList, conflicts,
+                      dupOf={}, nDup=0):
+        """ Preview computation finished; show results.
+
+        Args:
+            jobID (int): ID of the preview computation.
+            folderL (list): Scanned folders.
+            fileList (list): File paths to be renamed.
+            nFileList (list): New file paths.
+            conflicts (list): (index, reason) of conflicting files.
+            dupOf (dict, optional): Index of the file with the same 
+              content of each duplicate file.
+            nDup (int, optional): Number of duplicate files found
+              (including skipped files).
+
+        Returns: None
+        """
+        if jobID != self.previewJobID or self.previewCancel == None: 
+            return # outdated
+        self.previewCancel = None
+        self.fileList = fileList
+        self.nFileList = nFileList
+        self.conflicts = conflicts
+        self.dupOf = dupOf
+
+        ### show folder list in UI
+        selDir_txt = wx.FindWindowByName("selDir_txt", self.panel["mp"])
+        selDir_txt.SetValue("\n\n".join(folderL))
+
+        ### update list to show files to be renamed
+        lst = wx.FindWindowByName("selFile_lst", self.panel["mp"])
+        with traceSpan("preview.draw") as sp:
+            lst.setLists(self.fileList, self.nFileList, self.conflicts, 
+                         self.dupOf)
+            if sp.enabled: 
+                lst.Update() # draw now to include drawing in the span
+                sp.add(files=len(fileList), 
+                       rows=lst.GetCountPerPage())
+
+        wx.FindWindowByName("run_btn", self.panel["tUI"]).Enable()
+        wx.FindWindowByName("cancel_btn", self.panel["tUI"]).Disable()
+        msg = "%i folders, %i files"%(len(folderL), len(fileList))
+        if conflicts != []: msg += ", %i conflicts"%(len(conflicts))
+        if self.dedupMode == "skip": 
+            msg += ", %i duplicates skipped"%(nDup)
+        elif self.dedupMode != "": 
+            msg += ", %i duplicates"%(nDup)
+        chk = wx.FindWindowByName("watch_chk", self.panel["tUI"])
+        if chk.GetValue() == True: 
+            msg += "; watching (%s)"%(self.startWatching())
+        self.setStatus(msg)
+
+    #-------------------------------------------------------------------
+
+    def onPreviewError(self, jobID, msg):
+        """ Preview computation failed; show the error and reset buttons.
+
+        Args:
+            jobID (int): ID of the preview computation.
+            msg (str): Error message.
+
+        Returns: None
+        """
+        if DEBUG: print("FileRenamerFrame.onPreviewError()")
+
+        if jobID != self.previewJobID or self.previewCancel == None: 
+            return # outdated
+        self.previewCancel = None
+        wx.FindWindowByName("run_btn", self.panel["tUI"]).Enable()
+        wx.FindWindowByName("cancel_btn", self.panel["tUI"]).Disable()
+        lst = wx.FindWindowByName("selFile_lst", self.panel["mp"])
+        lst.setLists([], [])
+        self.setStatus("Failed to make the file list; %s"%(msg))
+        wx.MessageBox(msg, 'Error', wx.OK|wx.ICON_ERROR)
+
+    #-------------------------------------------------------------------
+
+    def startWatching(self):
+        """ Keep the scanned file list up to date (see 
+        ScanCache.startWatching); new file paths are made again 
+        after changes.
+
+        Args: None
+
+        Returns:
+            (str): Backend of watching ('inotify' or 'poll') or None.
+        """
+        if DEBUG: print("FileRenamerFrame.startWatching()")
+
+        if self.runner != None: return None
+        return self.scanCache.startWatching(
+                                lambda: wx.CallAfter(self.onWatchChange))
+
+    #-------------------------------------------------------------------
+
+    def onWatchChange(self):
+        """ Files in watched folders changed; update the file list from
+        the updated scan result.
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("FileRenamerFrame.onWatchChange()")
+
+        if self.runner != None or self.selectedFolders == []: return
+        self.updateFileList()
+
+    #-------------------------------------------------------------------
+
+    def startRun(self, runner):
+        """ Start renaming in a worker thread.
+
+        Args:
+            runner (RenameRunner): Runner to run.
+
+        Returns: None
+        """
+        if DEBUG: print("FileRenamerFrame.startRun()")
+
+        self.runner = runner
+        self.scanCache.stopWatching() # files are changed by renaming
+        for objName in ["run_btn", "selFolders_btn", "subFolders_chk",
+                        "watch_chk", "moveRenFiles_chk", 
+                        "selFolder2move_btn", "dedup_cho", "sort_cho"]:
+            wx.FindWindowByName(objName, self.panel["tUI"]).Disable()
+        for objName in ["cancel_btn", "pause_btn"]:
+            wx.FindWindowByName(objName, self.panel["tUI"]).Enable()
+        wx.FindWindowByName("prog_gauge", self.panel["tUI"]).SetValue(0)
+        self.runThread = Thread(target=self.runWorker, 
+                                args=(self.runner,), 
+                                daemon=True)
+        self.runThread.start()
+
+    #-------------------------------------------------------------------
+
+    def runWorker(self, runner):
+        """ Run renaming in a worker thread. 
+        Progress and results are passed to the main thread with
+        wx.CallAfter.
+
+        Args:
+            runner (RenameRunner): Runner to run.
+
+        Returns: None
+        """
+        if DEBUG: print("FileRenamerFrame.runWorker()")
+
+        lastT = [0] # last time when progress was posted
+        def progress(i, nFiles, fp, newFP):
+            t = time()
+            if t - lastT[0] < 0.2: return
+            lastT[0] = t
+            wx.CallAfter(self.onRunProgress, runner)
+
+        try:
+            runner.run(progress)
+        finally:
+            wx.CallAfter(self.onRunDone, runner)
+
+    #-------------------------------------------------------------------
+
+    def onRunProgress(self, runner):
+        """ Show progress of renaming.
+
+        Args:
+            runner (RenameRunner): Running runner.
+
+        Returns: None
+        """
+        if runner != self.runner or runner.isPaused(): return
+        nFiles = len(runner.fileList)
+        gauge = wx.FindWindowByName("prog_gauge", self.panel["tUI"])
+        gauge.SetValue(int(runner.nDone / max(1, nFiles) * 100))
+        fps, eta = runner.getSpeed()
+        msg = "Renaming... %i/%i, %.1f files/s"%(runner.nDone, nFiles, fps)
+        if eta != None: msg += ", ETA %i s"%(eta)
+        self.setStatus(msg)
+
+    #-------------------------------------------------------------------
+
+    def onRunDone(self, runner):
+        """ Renaming finished or cancelled; show results.
+
+        Args:
+            runner (RenameRunner): Finished runner.
+
+        Returns: None
+        """
+        if DEBUG: print("FileRenamerFrame.onRunDone()")
+
+        if runner != self.runner: return # frame is closing
+        self.runner = None
+        self.runThread = None
+        for objName in ["run_btn", "selFolders_btn", "subFolders_chk",
+                        "watch_chk", "moveRenFiles_chk", "dedup_cho",
+                        "sort_cho"]:
+            wx.FindWindowByName(objName, self.panel["tUI"]).Enable()
+        chk = wx.FindWindowByName("moveRenFiles_chk", self.panel["tUI"])
+        if chk.GetValue() == True:
+            wx.FindWindowByName("selFolder2move_btn", self.panel["tUI"]).Enable()
+        for objName in ["cancel_btn", "pause_btn"]:
+            wx.FindWindowByName(objName, self.panel["tUI"]).Disable()
+        wx.FindWindowByName("pause_btn", self.panel["tUI"]).SetLabel("Pause")
+        gauge = wx.FindWindowByName("prog_gauge", self.panel["tUI"])
+        gauge.SetValue(int(runner.nDone / max(1, len(runner.fileList)) * 100))
+
+        if runner.conflicts != []: # files changed after preview
+            self.scanCache.invalidate()
+            self.updateFileList()
+            msg = "Nothing was renamed due to %i conflicts."%(
+                                                        len(runner.conflicts))
+            wx.MessageBox(msg, 'Conflicts', wx.OK|wx.ICON_ERROR)
+            return
+        fps, eta = runner.getSpeed()
+        self.setStatus("Renamed %i/%i files, %.1f files/s"%(
+                            len(runner.renamed), len(runner.fileList), fps))
+        self.initList() # clear all file lists
+        dlg = RunSummaryDialog(self, runner)
+        dlg.ShowModal()
+        dlg.Destroy()
+
+    #-------------------------------------------------------------------
+
+    def cancelPreview(self):
+        """ Cancel preview computation, if it's running.
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("FileRenamerFrame.cancelPreview()")
+
+        if self.previewCancel == None: return
+        self.previewCancel.set()
+        self.previewCancel = None
+        wx.FindWindowByName("run_btn", self.panel["tUI"]).Enable()
+        wx.FindWindowByName("cancel_btn", self.panel["tUI"]).Disable()
+        lst = wx.FindWindowByName("selFile_lst", self.panel["mp"])
+        lst.setLists([], [])
+
+    #-------------------------------------------------------------------
+
+    def setStatus(self, msg):
+        """ Show a status message in the top panel.
+
+        Args:
+            msg (str): Message to show.
+
+        Returns: None
+        """
+        sTxt = wx.FindWindowByName("status_sTxt", self.panel["tUI"])
+        sTxt.SetLabel(msg)
+    
+    #-------------------------------------------------------------------
+   
+    def initList(self):
+        """ Clear all the lists (after renaming)
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("FileRenamerFrame.initList()")
+        self.cancelPreview()
+        self.selectedFolders = [] # list of selected folders
+        self.scanCache.invalidate()
+        self.fileList = [] # file list to be renamed
+        self.nFileList = [] # file list with new file names
+        self.conflicts = []
+        self.dupOf = {}
+        txt = wx.FindWindowByName("selDir_txt", self.panel["mp"])
+        txt.SetValue("")
+        txt = wx.FindWindowByName("targetFN_txt", self.panel["mp"])
+        txt.SetValue("*.*")
+        lst = wx.FindWindowByName("selFile_lst", self.panel["mp"])
+        lst.setLists([], [])
+        txt = wx.FindWindowByName("newFN_txt", self.panel["mp"])
+        txt.SetValue("[oFileN]")
+    
+    #-------------------------------------------------------------------
+
+    def onClose(self, event):
+        """ Close this frame.
+
+        Args: event (wx.Event)
+
+        Returns: None
+        """
+        if DEBUG: print("FileRenamerFrame.onClose()")
+        
+        if self.runner != None: 
+            msg = "Renaming is running. Cancel renaming and quit?"
+            ret = wx.MessageBox(msg, 'Quit', wx.YES_NO|wx.ICON_QUESTION)
+            if ret != wx.YES: return
+            self.runner.cancel() # cancelled after the current file
+            self.runThread.join() # wait until the log is written
+            self.runner = None
+        self.cancelPreview()
+        self.scanCache.stopWatching()
+        if self.scanIndex != None: self.scanIndex.close()
+        self.scanCache.meta.close()
+        if self.tbIcon != None: self.tbIcon.Destroy()
+        self.Destroy()
+
+    #-------------------------------------------------------------------
+
+#=======================================================================
+
+class FileRenamerApp(wx.App):
+    """ Initializing FileRenamer app with FileRenamerFrame.
+
+    Args:
+        title (str): Title of the frame.
+        startTime (float, optional): Time when the program started. 
+          If given, startup time (until the frame is shown and 
+          the event loop is running) is printed.
+        **kwargs: Arguments of wx.App.
+
+    Attributes:
+        frame (wx.Frame): FileRenamerFrame.
+    """
+    def __init__(self, title, startTime=None, **kwargs):
+        self.title = title
+        self.startTime = startTime
+        wx.App.__init__(self, **kwargs)
+
+    #-------------------------------------------------------------------
+
+    def OnInit(self):
+        if DEBUG: print("FileRenamerApp.OnInit()")
+        self.frame = FileRenamerFrame(self.title)
+        self.frame.Show()
+        self.SetTopWindow(self.frame)
+        if self.startTime != None:
+            wx.CallAfter(lambda: print("Startup time: %.3f s"%(
+                                                    time()-self.startTime)))
+        return True
+
+#=======================================================================
+
@@ -0,0 +1,264 @@
+# coding: UTF-8
+
+"""
+fileRenTrace
+Lightweight instrumentation of stages of pyFileRenamer (scanning,
+pattern matching, rendering new file-names, preview drawing and
+renaming). Wall time, item counts and counts of OS calls of each stage
+are recorded as spans and exported as a Chrome trace (JSON), which can
+be opened in chrome://tracing or https://ui.perfetto.dev.
+
+Tracing is disabled by default; then a span costs only a function call
+returning a shared object. It's enabled with enableTrace, '--trace FILE'
+in headless mode or the environment variable PYFILEREN_TRACE=FILE.
+
+Jinook Oh, Cognitive Biology department, University of Vienna
+September 2019.
+
+------------------------------------------------------------------------
+Copyright (C) 2019 Jinook Oh, W. Tecumseh Fitch
+- Contact: jinook.oh@univie.ac.at, tecumseh.fitch@univie.ac.at
+
+This program is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by the
+Free Software Foundation, either version 3 of the License, or (at your
+option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program.  If not, see <http://www.gnu.org/licenses/>.
+------------------------------------------------------------------------
+"""
+
+import json
+import atexit
+from os import getpid, environ
+from time import perf_counter
+from threading import Lock, get_ident
+from functools import wraps
+
+TRACE_ENV = "PYFILEREN_TRACE" # environment variable of trace file path
+
+#=======================================================================
+
+class NullSpan(object):
+    """ Span which records nothing; used while tracing is disabled.
+
+    Attributes:
+        enabled (bool): Always False.
+    """
+    enabled = False
+
+    def __enter__(self): return self
+
+    def __exit__(self, *exc): return False
+
+    def add(self, **counts): pass
+
+NULL_SPAN = NullSpan()
+
+#=======================================================================
+
+class Span(object):
+    """ Span of a stage, recording its wall time, item counts (added
+    with 'add') and counts of OS calls (see traceOps) made while it's
+    open, in any thread.
+
+    Args:
+        tracer (Tracer): Tracer to record the span.
+        name (str): Name of the stage.
+        cat (str): Category of the stage.
+
+    Attributes:
+        enabled (bool): Always True.
+        args (dict): Counts of the span.
+    """
+    enabled = True
+
+    def __init__(self, tracer, name, cat):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = {}
+
+    #-------------------------------------------------------------------
+
+    def __enter__(self):
+        self.ops = dict(self.tracer.ops)
+        self.t0 = perf_counter()
+        return self
+
+    #-------------------------------------------------------------------
+
+    def __exit__(self, *exc):
+        t1 = perf_counter()
+        for k, n in self.tracer.ops.items():
+            d = n - self.ops.get(k, 0)
+            if d > 0: self.args["os.%s"%(k)] = d
+        self.tracer.record(self.name, self.cat, self.t0, t1, self.args)
+        return False
+
+    #-------------------------------------------------------------------
+
+    def add(self, **counts):
+        """ Add item counts (or durations) to the span.
+
+        Args:
+            **counts: Count of each item.
+
+        Returns: None
+        """
+        for k, n in counts.items(): self.args[k] = self.args.get(k, 0) + n
+
+#=======================================================================
+
+class Tracer(object):
+    """ Collecting spans as Chrome trace events.
+
+    Attributes:
+        events (list): Trace events.
+        ops (dict): Number of calls of each OS call so far.
+    """
+    def __init__(self):
+        self.events = []
+        self.ops = {}
+        self.lock = Lock()
+        self.t0 = perf_counter()
+
+    #-------------------------------------------------------------------
+
+    def record(self, name, cat, t0, t1, args):
+        """ Record a complete event.
+
+        Args:
+            name (str): Name of the event.
+            cat (str): Category of the event.
+            t0 (float): Start time (perf_counter).
+            t1 (float): End time (perf_counter).
+            args (dict): Arguments of the event.
+
+        Returns: None
+        """
+        ev = dict(name=name,
+                  cat=cat,
+                  ph="X",
+                  ts=round((t0-self.t0)*1e6, 1),
+                  dur=round((t1-t0)*1e6, 1),
+                  pid=getpid(),
+                  tid=get_ident(),
+                  args=args)
+        with self.lock: self.events.append(ev)
+
+    #-------------------------------------------------------------------
+
+    def addOps(self, name, n):
+        """ Add number of calls of an OS call.
+
+        Args:
+            name (str): Name of the OS call.
+            n (int): Number of calls.
+
+        Returns: None
+        """
+        with self.lock: self.ops[name] = self.ops.get(name, 0) + n
+
+    #-------------------------------------------------------------------
+
+    def export(self, traceFile):
+        """ Write events to a file in Chrome trace format.
+
+        Args:
+            traceFile (str): Trace file path.
+
+        Returns: None
+        """
+        with self.lock: events = list(self.events)
+        with open(traceFile, 'w') as f:
+            json.dump(dict(traceEvents=events, displayTimeUnit="ms"), f)
+
+#=======================================================================
+
+tracer = None # Tracer while tracing is enabled
+
+def traceSpan(name, cat="stage"):
+    """ Return a span of a stage to be used in a 'with' statement.
+
+    Args:
+        name (str): Name of the stage.
+        cat (str, optional): Category of the stage.
+
+    Returns:
+        (Span/ NullSpan): Span; NullSpan when tracing is disabled.
+
+    Examples:
+        >>> with traceSpan("scan") as sp:
+        ...     sp.add(files=len(fL))
+    """
+    if tracer == None: return NULL_SPAN
+    return Span(tracer, name, cat)
+
+#-----------------------------------------------------------------------
+
+def traced(name, countsFunc=None):
+    """ Decorator to trace each call of a function as a span.
+
+    Args:
+        name (str): Name of the stage.
+        countsFunc (function, optional): Function returning item counts
+          (dict) of a call with (returned value, arguments of the call).
+
+    Returns:
+        (function): Decorator.
+
+    Examples:
+        >>> @traced("plan", lambda ret, args: dict(files=len(ret)))
+        ... def planNewPaths(fileList, newForm): ...
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if tracer == None: return func(*args, **kwargs)
+            with Span(tracer, name, "stage") as sp:
+                ret = func(*args, **kwargs)
+                if countsFunc != None: sp.add(**countsFunc(ret, args))
+            return ret
+        return wrapper
+    return decorator
+
+#-----------------------------------------------------------------------
+
+def traceOps(name, n=1):
+    """ Count calls of an OS call (such as 'rename') for spans.
+
+    Args:
+        name (str): Name of the OS call.
+        n (int, optional): Number of calls.
+
+    Returns: None
+    """
+    if tracer != None: tracer.addOps(name, n)
+
+#-----------------------------------------------------------------------
+
+def enableTrace(traceFile=None):
+    """ Enable tracing.
+
+    Args:
+        traceFile (str, optional): Trace file path, to which events are
+          written when the program exits.
+
+    Returns:
+        (Tracer): Tracer.
+    """
+    global tracer
+    if tracer == None: tracer = Tracer()
+    if traceFile != None: atexit.register(tracer.export, traceFile)
+    return tracer
+
+#-----------------------------------------------------------------------
+
+if environ.get(TRACE_ENV, "") != "": enableTrace(environ[TRACE_ENV])
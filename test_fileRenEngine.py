@@ -0,0 +1,622 @@
+# coding: UTF-8
+
+"""
+test_fileRenEngine
+Tests of fileRenEngine (no wx needed).
+
+Usage:
+    python -m unittest test_fileRenEngine
+"""
+
+import io
+import unittest
+import tempfile
+from os import path, listdir, mkdir, fsencode, fsdecode, symlink, close
+from os import getcwd, chdir, rename, remove, strerror, utime
+from errno import EXDEV, EACCES
+from unittest import mock
+from shutil import rmtree
+from contextlib import redirect_stdout
+from threading import Event
+from time import sleep, time_ns
+from types import SimpleNamespace
+
+from fileRenEngine import RenameRunner, readRunLog, main, TMP_PREFIX
+from fileRenEngine import recoverJournal, makeUndoRunner, RenameJournal
+from fileRenEngine import scanFolders, FolderWatcher
+from fileRenEngine import findConflicts, orderRenames
+from fileRenEngine import FileMover, moveFile, PathList, ScanIndex
+from fileRenEngine import asPathList
+from fileRenEngine import getNameMatcher, DirRenamer, DIR_FD_RENAME
+
+#=======================================================================
+
+class TestRenameRunner(unittest.TestCase):
+    def setUp(self):
+        self.dp = tempfile.mkdtemp()
+        self.logFile = path.join(self.dp, "log.txt")
+        self.journalFile = path.join(self.dp, "journal.txt")
+        self.folder = path.join(self.dp, "files")
+        mkdir(self.folder)
+
+    def tearDown(self):
+        rmtree(self.dp)
+
+    def makeFiles(self, names):
+        fpL = []
+        for fn in names:
+            fp = path.join(self.folder, fn)
+            with open(fp, 'w') as f: f.write(fn)
+            fpL.append(fp)
+        return fpL
+
+    #-------------------------------------------------------------------
+
+    def test_cancelInCycle(self):
+        """ Cancelling in the middle of a cycle (1->2->3->1) finishes
+        the cycle; no file is left with a temporary name.
+        """
+        fL = self.makeFiles(["1", "2", "3"])
+        nFL = [fL[1], fL[2], fL[0]]
+        runner = RenameRunner(fL, nFL, self.logFile, self.journalFile)
+        def progress(i, nFiles, fp, newFP):
+            runner.cancel() # right after the first renaming in the cycle
+        runner.run(progress)
+        self.assertEqual(runner.errors, [])
+        self.assertFalse(path.exists(self.journalFile))
+        names = listdir(self.folder)
+        self.assertEqual([fn for fn in names if fn.startswith(TMP_PREFIX)],
+                         [])
+        self.assertEqual(sorted(names), ["1", "2", "3"])
+        for fp, newFP in zip(fL, nFL):
+            with open(newFP) as f:
+                self.assertEqual(f.read(), path.basename(fp))
+        self.assertEqual(sorted(readRunLog(runner.runID, self.logFile)),
+                         sorted(zip(fL, nFL)))
+
+    #-------------------------------------------------------------------
+
+    def crashRun(self, fL, nFL, nRenamed):
+        """ Run renaming, which is interrupted (an exception) after 
+        renaming nRenamed files, leaving the journal.
+        """
+        runner = RenameRunner(fL, nFL, self.logFile, self.journalFile)
+        def progress(i, nFiles, fp, newFP):
+            if i+1 == nRenamed: raise KeyboardInterrupt
+        with self.assertRaises(KeyboardInterrupt): runner.run(progress)
+        self.assertTrue(path.exists(self.journalFile))
+        return runner.runID
+
+    def test_recoverBackUndo(self):
+        """ Files rolled back after an interruption are not renamed 
+        again by undoing the run.
+        """
+        fL = self.makeFiles(["a", "b", "c"])
+        nFL = [fp + "_new" for fp in fL]
+        runID = self.crashRun(fL, nFL, 2)
+        self.assertEqual(recoverJournal(False, self.journalFile, 
+                                        self.logFile), (2, []))
+        self.assertEqual(sorted(listdir(self.folder)), ["a", "b", "c"])
+        runner = makeUndoRunner(runID, self.logFile, self.journalFile)
+        self.assertEqual(runner.fileList, [])
+
+    def test_recoverForward(self):
+        """ Rolling forward logs each renaming of the run once. """
+        fL = self.makeFiles(["a", "b", "c"])
+        nFL = [fp + "_new" for fp in fL]
+        runID = self.crashRun(fL, nFL, 2)
+        self.assertEqual(recoverJournal(True, self.journalFile, 
+                                        self.logFile), (1, []))
+        self.assertEqual(sorted(readRunLog(runID, self.logFile)), 
+                         sorted(zip(fL, nFL)))
+        runner = makeUndoRunner(runID, self.logFile, self.journalFile)
+        runner.run()
+        self.assertEqual(runner.errors, [])
+        self.assertEqual(sorted(listdir(self.folder)), ["a", "b", "c"])
+
+    #-------------------------------------------------------------------
+
+    def test_recoverUnflushed(self):
+        """ Results lost from the journal buffer are judged from the 
+        files on disk, with a chain (b->c, a->b) and a cycle (x->y->x).
+        """
+        fL = self.makeFiles(["a", "b", "x", "y"])
+        a, b, x, y = fL
+        c = path.join(self.folder, "c")
+        tmp = path.join(self.folder, TMP_PREFIX + "x")
+        ops = [(b, c), (a, b), (x, tmp), (y, x), (tmp, y)]
+        journal = RenameJournal(self.journalFile)
+        journal.begin("run1")
+        journal.addIntents(ops)
+        for fp, newFP in ops: rename(fp, newFP) # results not flushed
+        journal.f.close()
+        self.assertEqual(recoverJournal(False, self.journalFile, 
+                                        self.logFile), (4, []))
+        for fp in fL:
+            with open(fp) as f: self.assertEqual(f.read(), path.basename(fp))
+        self.assertEqual(sorted(listdir(self.folder)), ["a", "b", "x", "y"])
+
+    #-------------------------------------------------------------------
+
+    def test_nonUTF8Name(self):
+        """ A file-name which is not valid UTF-8 is renamed, logged and 
+        read back from the log as it is.
+        """
+        fp = fsdecode(path.join(fsencode(self.folder), b"caf\xe9.txt"))
+        with open(fp, 'w') as f: f.write("x")
+        newFP = path.join(self.folder, "cafe.txt")
+        runner = RenameRunner([fp], [newFP], self.logFile, self.journalFile)
+        runner.run()
+        runner.writeReport(path.join(self.dp, "report.txt"))
+        self.assertEqual(runner.errors, [])
+        self.assertTrue(path.exists(newFP))
+        self.assertEqual(readRunLog(runner.runID, self.logFile), 
+                         [(fp, newFP)])
+
+    #-------------------------------------------------------------------
+
+    def test_dedupSkipNumbering(self):
+        """ With '--dedup skip', duplicates are skipped before numbering;
+        numbers have no gaps and the first file in the order of 
+        numbering is kept.
+        """
+        for fn, content in [("a10.jpg", "same"), ("a2.jpg", "same"), 
+                            ("a1.jpg", "other")]:
+            with open(path.join(self.folder, fn), 'w') as f: f.write(content)
+        argv = ["--headless", "-f", self.folder, "-t", "*.jpg", 
+                "-n", "f_[incNum]", "--sort", "natural", "--dedup", "skip",
+                "-l", self.logFile, "--journal", self.journalFile]
+        with redirect_stdout(io.StringIO()): 
+            self.assertEqual(main(argv), 0)
+        self.assertEqual(sorted(listdir(self.folder)), 
+                         ["a10.jpg", "f_1.jpg", "f_2.jpg"])
+        with open(path.join(self.folder, "f_2.jpg")) as f:
+            self.assertEqual(f.read(), "same") # a2.jpg, before a10.jpg
+
+    #-------------------------------------------------------------------
+
+    def test_linkDuplicates(self):
+        """ A duplicate is linked to the renamed file with the same 
+        content, unless another file is renamed to its path.
+        """
+        fL = PathList(self.makeFiles(["a", "b", "c"]))
+        with open(fL[1], 'w') as f: f.write("a")
+        with open(fL[2], 'w') as f: f.write("a")
+        nFL = PathList([path.join(self.folder, fn) for fn in ["x", "y", "b"]], 
+                       fL)
+        runner = RenameRunner(fL, nFL, self.logFile, self.journalFile, 
+                              linkTo={1: 0, 2: 0})
+        runner.run()
+        self.assertEqual(runner.errors, [])
+        self.assertEqual(runner.linked, [2])
+        self.assertEqual(sorted(listdir(self.folder)), ["b", "x", "y"])
+        self.assertTrue(path.samefile(nFL[0], nFL[2]))
+        self.assertFalse(path.samefile(nFL[0], nFL[1]))
+
+    #-------------------------------------------------------------------
+
+    def test_relativeFolder(self):
+        """ A relative folder given with -f is logged as absolute paths,
+        so that the run can be undone from another working folder.
+        """
+        fp, = self.makeFiles(["a.txt"])
+        argv = ["-l", self.logFile, "--journal", self.journalFile]
+        cwd = getcwd()
+        chdir(self.dp)
+        try:
+            with redirect_stdout(io.StringIO()): 
+                self.assertEqual(main(["--headless", "-f", "files", 
+                                       "-t", "*.txt", "-n", "b"] + argv), 0)
+        finally:
+            chdir(cwd)
+        newFP = path.join(self.folder, "b.txt")
+        self.assertTrue(path.exists(newFP))
+        with redirect_stdout(io.StringIO()): 
+            self.assertEqual(main(["--headless", "--undo", "last"] + argv), 0)
+        self.assertEqual(listdir(self.folder), ["a.txt"])
+
+#=======================================================================
+
+class TestConflicts(unittest.TestCase):
+    def setUp(self):
+        self.dp = tempfile.mkdtemp()
+        self.logFile = path.join(self.dp, "log.txt")
+        self.journalFile = path.join(self.dp, "journal.txt")
+
+    def tearDown(self):
+        rmtree(self.dp)
+
+    def makeFiles(self, names):
+        fpL = []
+        for fn in names:
+            fp = path.join(self.dp, fn)
+            if not path.isdir(path.dirname(fp)): mkdir(path.dirname(fp))
+            with open(fp, 'w') as f: f.write(fn)
+            fpL.append(fp)
+        return fpL
+
+    def runRenaming(self, fL, nFL):
+        """ Rename and check that each file has its content at its new 
+        path, and no file is left with a temporary name.
+        """
+        runner = RenameRunner(fL, nFL, self.logFile, self.journalFile)
+        runner.run()
+        self.assertEqual((runner.conflicts, runner.errors), ([], []))
+        for fp, newFP in zip(fL, nFL):
+            with open(newFP) as f: 
+                self.assertEqual(f.read(), path.relpath(fp, self.dp))
+        for dp in set([path.dirname(fp) for fp in fL]):
+            self.assertEqual([fn for fn in listdir(dp) \
+                              if fn.startswith(TMP_PREFIX)], [])
+
+    #-------------------------------------------------------------------
+
+    def test_duplicateTarget(self):
+        """ Files with the same new file path conflict. """
+        fL = self.makeFiles(["a", "b", "c"])
+        nFL = [path.join(self.dp, fn) for fn in ["x", "d", "x"]]
+        self.assertEqual(findConflicts(fL, nFL), 
+                         [(0, "Same new file path as another file"), 
+                          (2, "Same new file path as another file")])
+
+    def test_targetExists(self):
+        """ A new file path of a file not being renamed conflicts, 
+        and nothing is renamed.
+        """
+        fL = self.makeFiles(["a", "b", "other"])[:2]
+        nFL = [path.join(self.dp, fn) for fn in ["other", "c"]]
+        self.assertEqual(findConflicts(fL, nFL), 
+                         [(0, "New file path already exists")])
+        runner = RenameRunner(fL, nFL, self.logFile, self.journalFile)
+        runner.run()
+        self.assertEqual(len(runner.conflicts), 1)
+        self.assertEqual(sorted(listdir(self.dp)), ["a", "b", "other"])
+
+    def test_targetExistsListed(self):
+        """ Each folder of new file paths is listed once, instead of 
+        checking each new file path on disk.
+        """
+        fL = self.makeFiles(["a", "b", "c", path.join("to", "b2")])[:3]
+        nFL = [path.join(self.dp, "to", fn) for fn in ["a2", "b2", "c2"]]
+        nFL.append(path.join(self.dp, "none", "d2")) # no folder yet
+        fL.append(path.join(self.dp, "d"))
+        with mock.patch("os.path.lexists", side_effect=AssertionError):
+            self.assertEqual(findConflicts(fL, nFL), 
+                             [(1, "New file path already exists")])
+
+    #-------------------------------------------------------------------
+
+    def test_chain(self):
+        """ A chain a->b->c is renamed from its end, without conflicts. """
+        fL = self.makeFiles(["a", "b"])
+        nFL = [fL[1], path.join(self.dp, "c")]
+        self.assertEqual(findConflicts(fL, nFL), [])
+        self.assertEqual(orderRenames(fL, nFL), [1, 0])
+        self.runRenaming(fL, nFL)
+
+    def test_cycle2(self):
+        """ A swap (a->b, b->a) goes through a temporary file-name. """
+        fL = self.makeFiles(["a", "b"])
+        nFL = [fL[1], fL[0]]
+        self.assertEqual(findConflicts(fL, nFL), [])
+        self.assertEqual(orderRenames(fL, nFL), [-1, 1, -1])
+        self.runRenaming(fL, nFL)
+
+    def test_cycle3(self):
+        """ A cycle a->b->c->a goes through a temporary file-name. """
+        fL = self.makeFiles(["a", "b", "c"])
+        nFL = [fL[1], fL[2], fL[0]]
+        self.assertEqual(orderRenames(fL, nFL), [-1, 2, 1, -1])
+        self.runRenaming(fL, nFL)
+
+    def test_cycleTwoFolders(self):
+        """ A cycle over two folders (d1/a->d2/b, d2/b->d1/a), with an 
+        independent file.
+        """
+        fL = self.makeFiles([path.join("d1", "a"), path.join("d2", "b"), 
+                             path.join("d1", "c")])
+        nFL = [fL[1], fL[0], path.join(self.dp, "d2", "c")]
+        self.assertEqual(findConflicts(fL, nFL), [])
+        self.assertEqual(orderRenames(fL, nFL), [2, -1, 1, -1])
+        self.runRenaming(fL, nFL)
+
+#=======================================================================
+
+class TestCrossDevice(unittest.TestCase):
+    """ Moving across file systems; renaming between the folders 'a' 
+    and 'b' fails with EXDEV (os.rename is mocked).
+    """
+    def setUp(self):
+        self.dp = tempfile.mkdtemp()
+        self.fp = path.join(self.dp, "a", "1.txt")
+        self.newFP = path.join(self.dp, "b", "1.txt")
+        mkdir(path.dirname(self.fp))
+        mkdir(path.dirname(self.newFP))
+        with open(self.fp, 'w') as f: f.write("data")
+        self.nEXDEV = 0 # number of renaming failed with EXDEV
+        def crossRename(fp, newFP, **kwargs):
+            if path.dirname(fp) != path.dirname(newFP):
+                self.nEXDEV += 1
+                raise OSError(EXDEV, strerror(EXDEV))
+            rename(fp, newFP, **kwargs)
+        self.patcher = mock.patch("fileRenEngine.rename", crossRename)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        rmtree(self.dp)
+
+    #-------------------------------------------------------------------
+
+    def test_move(self):
+        """ A file is copied, verified and its original is removed, 
+        trying renaming only once.
+        """
+        mover = FileMover("run1", dirFD=False)
+        try: mover.move(self.fp, self.newFP)
+        finally: mover.close()
+        self.assertEqual(self.nEXDEV, 1)
+        self.assertFalse(path.exists(self.fp))
+        self.assertEqual(listdir(path.dirname(self.newFP)), ["1.txt"])
+        with open(self.newFP) as f: self.assertEqual(f.read(), "data")
+
+    def test_removeFailed(self):
+        """ The copy is removed, when the original file can't be removed. 
+        """
+        def failRemove(fp):
+            if fp == self.fp: raise PermissionError(EACCES, strerror(EACCES))
+            remove(fp)
+        with mock.patch("fileRenEngine.remove", failRemove):
+            with self.assertRaises(OSError): 
+                moveFile(self.fp, self.newFP, "run1")
+        self.assertTrue(path.exists(self.fp))
+        self.assertEqual(listdir(path.dirname(self.newFP)), [])
+
+#=======================================================================
+
+class TestPathList(unittest.TestCase):
+    def setUp(self):
+        self.paths = [path.join(dp, fn) for dp, fn in [
+                        ("/data/a", "1.jpg"), ("/data/b", "2.jpg"), 
+                        ("/data/a", "3.jpg"), ("/data", "x, y.jpg")]]
+
+    #-------------------------------------------------------------------
+
+    def test_roundTrip(self):
+        """ Paths read back as they were appended; each folder is kept 
+        once.
+        """
+        fL = PathList(self.paths)
+        self.assertEqual(len(fL), 4)
+        self.assertEqual(list(fL), self.paths)
+        self.assertEqual(fL[2], self.paths[2])
+        self.assertEqual(fL[1:3], self.paths[1:3])
+        self.assertEqual(fL[-1], self.paths[-1])
+        self.assertEqual(len(fL.prefixes), 3)
+        self.assertEqual(list(fL.dirI), [0, 1, 0, 2])
+        newFP = path.join("/data/a", "4.jpg")
+        fL.setPath(1, newFP)
+        self.assertEqual((fL[1], fL.dirI[1]), (newFP, 0))
+        self.assertEqual(list(fL.select([3, 0])), 
+                         [self.paths[3], self.paths[0]])
+
+    def test_addFolder(self):
+        """ Files of a folder are appended with one prefix; an empty 
+        folder adds no prefix.
+        """
+        fL = PathList()
+        fL.addFolder("/data/a", ["1.jpg", "2.jpg"])
+        fL.addFolder("/data/b", [])
+        self.assertEqual(list(fL), [path.join("/data/a", "1.jpg"), 
+                                    path.join("/data/a", "2.jpg")])
+        self.assertEqual(fL.prefixes, [path.join("/data/a", "")])
+
+    def test_asPathList(self):
+        """ A list is converted; a PathList is returned as it is, unless
+        it doesn't share prefixes with shareWith.
+        """
+        fL = asPathList(self.paths)
+        self.assertIsInstance(fL, PathList)
+        self.assertEqual(list(fL), self.paths)
+        self.assertIs(asPathList(fL), fL)
+        nFL = asPathList([fp + ".new" for fp in self.paths], fL)
+        self.assertIs(nFL.prefixes, fL.prefixes)
+        self.assertIs(asPathList(nFL, fL), nFL)
+        other = PathList(self.paths)
+        shared = asPathList(other, fL)
+        self.assertIsNot(shared, other)
+        self.assertIs(shared.prefixes, fL.prefixes)
+        self.assertEqual(list(shared), self.paths)
+        self.assertEqual(len(fL.prefixes), 3)
+
+#=======================================================================
+
+class TestNameMatcher(unittest.TestCase):
+    def assertMatches(self, fileForm, names, expected):
+        match = getNameMatcher(fileForm)
+        self.assertEqual([fn for fn in names if match(fn)], expected)
+
+    #-------------------------------------------------------------------
+
+    def test_patterns(self):
+        """ Patterns separated with ';' (spaces around them ignored); 
+        wildcards don't match a leading dot.
+        """
+        names = ["a.jpg", "b.png", "c.gif", ".d.jpg", "e.jpg.bak"]
+        self.assertMatches("*.jpg; *.png", names, ["a.jpg", "b.png"])
+        self.assertMatches(".*", names, [".d.jpg"])
+        self.assertMatches(" ; ", names, [])
+
+    def test_regex(self):
+        """ A 're:' pattern should match the whole file-name, even with
+        alternation in it.
+        """
+        names = ["IMG_0001.tif", "IMG_01.tif", "IMG_0001.tif.bak", "x"]
+        self.assertMatches("re:IMG_\\d{4}\\.tif", names, ["IMG_0001.tif"])
+        self.assertMatches("re:x|IMG_01.tif", names, ["IMG_01.tif", "x"])
+        self.assertMatches("*.bak;re:x", names, ["IMG_0001.tif.bak", "x"])
+        with self.assertRaises(ValueError): getNameMatcher("re:(")
+
+    def test_escape(self):
+        """ '[*]' and '[?]' match the characters themselves. """
+        names = ["a*.txt", "ab.txt", "a?.txt"]
+        self.assertMatches("a[*].txt", names, ["a*.txt"])
+        self.assertMatches("a[?].txt", names, ["a?.txt"])
+        self.assertMatches("a?.txt", names, names)
+
+#=======================================================================
+
+class TestScanIndex(unittest.TestCase):
+    def setUp(self):
+        self.dp = tempfile.mkdtemp()
+        self.index = ScanIndex(path.join(self.dp, "index.db"))
+
+    def tearDown(self):
+        self.index.close()
+        rmtree(self.dp)
+
+    #-------------------------------------------------------------------
+
+    def test_lookup(self):
+        """ Stored names are served only while the device, inode and 
+        modification time of the folder are same.
+        """
+        mtime = time_ns() - 10**10
+        st = SimpleNamespace(st_dev=1, st_ino=2, st_mtime_ns=mtime)
+        self.index.store("/data", st, ["a.jpg", "b.jpg"], ["sub"])
+        self.index.flush()
+        self.assertEqual(self.index.lookup("/data", st), 
+                         (["a.jpg", "b.jpg"], ["sub"]))
+        for changed in [dict(st_dev=3), dict(st_ino=3), 
+                        dict(st_mtime_ns=mtime+1)]:
+            st2 = SimpleNamespace(**dict(vars(st), **changed))
+            self.assertEqual(self.index.lookup("/data", st2), None)
+        self.assertEqual(self.index.lookup("/other", st), None)
+        self.assertEqual((self.index.nHits, self.index.nMisses), (1, 4))
+
+    def test_racy(self):
+        """ A folder modified right before listing is not stored. """
+        st = SimpleNamespace(st_dev=1, st_ino=2, st_mtime_ns=time_ns())
+        self.index.store("/data", st, ["a.jpg"], [])
+        self.index.flush()
+        self.assertEqual(self.index.lookup("/data", st), None)
+
+    def test_scanFolders(self):
+        """ An unchanged folder is served from the index; a changed one
+        is listed again.
+        """
+        folder = path.join(self.dp, "files")
+        mkdir(folder)
+        open(path.join(folder, "a.jpg"), 'w').close()
+        t = time_ns() - 10**10
+        utime(folder, ns=(t, t))
+        fL = scanFolders([folder], "*.jpg", index=self.index)[1]
+        self.index.flush()
+        self.assertEqual(list(fL), [path.join(folder, "a.jpg")])
+        fL = scanFolders([folder], "*.jpg", index=self.index)[1]
+        self.assertEqual((self.index.nHits, len(fL)), (1, 1))
+        open(path.join(folder, "b.jpg"), 'w').close()
+        utime(folder, ns=(t, t+1))
+        fL = scanFolders([folder], "*.jpg", index=self.index)[1]
+        self.assertEqual(self.index.nHits, 1)
+        self.assertEqual(sorted(fL), [path.join(folder, "a.jpg"), 
+                                      path.join(folder, "b.jpg")])
+
+#=======================================================================
+
+class TestDirRenamer(unittest.TestCase):
+    def setUp(self):
+        self.dp = tempfile.mkdtemp()
+        self.folders = []
+        for fn in ["d1", "d2", "d3"]:
+            dp = path.join(self.dp, fn)
+            mkdir(dp)
+            open(path.join(dp, "a"), 'w').close()
+            self.folders.append(dp)
+
+    def tearDown(self):
+        rmtree(self.dp)
+
+    #-------------------------------------------------------------------
+
+    @unittest.skipUnless(DIR_FD_RENAME, "renameat isn't supported")
+    def test_lru(self):
+        """ Descriptors of the last maxFDs used folders are kept open;
+        the least recently used one is closed.
+        """
+        d1, d2, d3 = self.folders
+        renamer = DirRenamer(maxFDs=2)
+        try:
+            renamer.rename(path.join(d1, "a"), path.join(d1, "b"))
+            renamer.rename(path.join(d2, "a"), path.join(d2, "b"))
+            renamer.rename(path.join(d1, "b"), path.join(d1, "c"))
+            self.assertEqual(list(renamer.fds), [d2, d1])
+            renamer.rename(path.join(d3, "a"), path.join(d1, "d"))
+            self.assertEqual(list(renamer.fds), [d3, d1])
+        finally:
+            renamer.close()
+        self.assertEqual(renamer.fds, {})
+        self.assertEqual(sorted(listdir(d1)), ["c", "d"])
+        self.assertEqual((listdir(d2), listdir(d3)), (["b"], []))
+
+    def test_fallback(self):
+        """ Files are renamed with full paths without opening folders, 
+        when it's disabled or renameat isn't supported.
+        """
+        d1, d2, d3 = self.folders
+        with mock.patch("fileRenEngine.DIR_FD_RENAME", False):
+            renamers = [DirRenamer(), DirRenamer(enabled=False)]
+        for renamer, dp in zip(renamers, [d1, d2]):
+            renamer.rename(path.join(dp, "a"), path.join(d3, dp[-1]))
+            self.assertEqual(renamer.fds, {})
+            renamer.close()
+        self.assertEqual(sorted(listdir(d3)), ["1", "2", "a"])
+
+#=======================================================================
+
+class TestFolderWatcher(unittest.TestCase):
+    def setUp(self):
+        self.dp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.dp)
+
+    #-------------------------------------------------------------------
+
+    def test_symlinkLoop(self):
+        """ A symbolic link to a parent folder doesn't add folders or 
+        aliases of files, while polling (as in scanFolders).
+        """
+        sub = path.join(self.dp, "sub")
+        mkdir(sub)
+        open(path.join(sub, "a.jpg"), 'w').close()
+        symlink("..", path.join(sub, "up"))
+        folderL, fileL = scanFolders([self.dp], "*.jpg", True)
+        self.assertEqual((len(folderL), len(fileL)), (2, 1))
+        changes = []
+        changed = Event()
+        def onChange(folderL, fileL, touched):
+            changes.append((folderL, list(fileL), touched))
+            changed.set()
+        watcher = FolderWatcher([self.dp], "*.jpg", True, folderL, fileL, 
+                                onChange)
+        if watcher.fd != None: # use polling
+            close(watcher.fd)
+            watcher.fd = None
+            watcher.backend = "poll"
+        watcher.start()
+        try:
+            sleep(0.1) # modification time of the folder changes
+            newFP = path.join(sub, "b.jpg")
+            open(newFP, 'w').close()
+            self.assertTrue(changed.wait(10))
+        finally:
+            watcher.stop()
+        folderL, fileL, touched = changes[-1]
+        self.assertEqual(len(folderL), 2)
+        self.assertEqual(sorted(fileL), [path.join(sub, "a.jpg"), newFP])
+        self.assertEqual(touched, set([newFP]))
+
+#=======================================================================
+
+if __name__ == "__main__": unittest.main()